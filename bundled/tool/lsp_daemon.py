@@ -0,0 +1,746 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Shares one language server between several LSP clients over a Unix domain socket.
+
+The extension starts it in daemon mode, one per project root and configuration:
+    python lsp_daemon.py --socket PATH --idle-timeout 300 -- python -m tach server
+
+The server is initialized by the first client; later clients get the same result.
+Request ids are rewritten so clients can't collide, documents are reference
+counted so the server sees one open and one close per document, and diagnostics
+go to the clients that have the document open. The daemon exits once no client
+has been connected for the idle timeout, or when the server exits.
+
+Clients may also pull diagnostics (`textDocument/diagnostic`, `workspace/diagnostic`),
+which the daemon answers from what the server published. Result ids hash the
+diagnostics, so a recheck that finds nothing new is reported as unchanged.
+
+tach reads its configuration when it starts, so when a client reports a changed
+config file (`workspace/didChangeWatchedFiles`) the daemon reloads it in place: it
+starts a new server behind the socket, initializes it with the same parameters and
+reopens the open documents, which rechecks them. Clients stay connected.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sys
+
+CONTENT_LENGTH = re.compile(rb"Content-Length:\s*(\d+)", re.IGNORECASE)
+
+# Largest message buffered from the server or a client.
+READ_LIMIT = 16 * 1024 * 1024
+
+# Measured in seconds
+DEFAULT_IDLE_TIMEOUT = 300
+SERVER_EXIT_TIMEOUT = 5
+# How long a pull waits for the server to finish checking the document.
+PULL_TIMEOUT = 10
+# How long a workspace pull with nothing new to report is held open.
+WORKSPACE_PULL_TIMEOUT = 60
+# Changes within this window are announced to a client with a single refresh.
+REFRESH_DELAY = 0.05
+
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+REQUEST_CANCELLED = -32800
+CONTENT_MODIFIED = -32801
+PUBLISH_DIAGNOSTICS = "textDocument/publishDiagnostics"
+
+# Files whose changes the server only picks up when it starts.
+CONFIG_FILES = ("tach.toml", "tach.domain.toml", "pyproject.toml", "requirements.txt")
+
+# Marks the daemon's own requests in the table of pending requests.
+DAEMON = object()
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict | None:
+    """Reads one message; None once the stream is closed."""
+    while True:
+        try:
+            header = await reader.readuntil(b"\r\n\r\n")
+            # The server may print plain text before a header; only the length matters.
+            match = CONTENT_LENGTH.search(header)
+            if match is None:
+                continue
+            return json.loads(await reader.readexactly(int(match.group(1))))
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ConnectionError,
+        ):
+            return None
+
+
+def result_id(diagnostics: list) -> str:
+    """Identifies diagnostics by their content."""
+    body = json.dumps(diagnostics, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+
+
+def with_daemon_capabilities(result: dict) -> dict:
+    """Advertises the diagnostic requests and config reloads the daemon handles."""
+    capabilities = dict(result.get("capabilities") or {})
+    provider = capabilities.get("diagnosticProvider") or {}
+    capabilities["diagnosticProvider"] = dict(
+        provider, interFileDependencies=False, workspaceDiagnostics=True
+    )
+    capabilities["experimental"] = dict(
+        capabilities.get("experimental") or {}, pullDiagnostics=True, configReload=True
+    )
+    return dict(result, capabilities=capabilities)
+
+
+def encode(message: dict) -> bytes:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+class Client:
+    """A connected LSP client."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        # Uris of the documents this client has open.
+        self.open_documents: set[str] = set()
+        # Client request id -> daemon request id.
+        self.requests: dict = {}
+        # Client request id -> task answering a diagnostic pull.
+        self.pulls: dict = {}
+        # Uris the client pulls diagnostics for; they are no longer pushed to it.
+        self.pulled: set[str] = set()
+        # Uris with a document pull in progress.
+        self.pulling: set[str] = set()
+        self.workspace_pulls = 0
+        self.refresh_support = False
+        self.refresh_timer: asyncio.TimerHandle | None = None
+        self.closed = False
+
+    async def send(self, message: dict) -> None:
+        if self.closed:
+            return
+        try:
+            self.writer.write(encode(message))
+            await self.writer.drain()
+        except ConnectionError:
+            self.closed = True
+
+    def close(self) -> None:
+        self.closed = True
+        self.writer.close()
+        if self.refresh_timer is not None:
+            self.refresh_timer.cancel()
+        for task in self.pulls.values():
+            task.cancel()
+
+
+class Daemon:
+    def __init__(self, command: list[str], socket_path: str, idle_timeout: float):
+        self.command = command
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.clients: list[Client] = []
+        self.server: asyncio.subprocess.Process | None = None
+        self.next_id = 0
+        # Daemon request id -> (client, client request id), or DAEMON for its own.
+        self.pending: dict = {}
+        self.daemon_requests: dict[int, asyncio.Future] = {}
+        # Server request id -> client that was asked to answer it.
+        self.server_requests: dict = {}
+        self.open_counts: dict[str, int] = {}
+        # Latest text of each open document, to reopen it in a reloaded server.
+        self.documents: dict[str, dict] = {}
+        # Publishes still due for documents closed in the server for a client that
+        # left: the clearing, after the result of a check still running.
+        self.closing: dict[str, int] = {}
+        # Last diagnostics published for each uri, replayed to clients opening it later.
+        self.diagnostics: dict[str, dict] = {}
+        # Result id of the last diagnostics published for each uri, empty ones included.
+        self.result_ids: dict[str, str] = {}
+        # Uris the server is checking; pulls for them wait for the next publish.
+        self.checking: set[str] = set()
+        self.waiters: dict[str, list[asyncio.Future]] = {}
+        # Set, then replaced, whenever a result id changes; wakes held workspace pulls.
+        self.changed: asyncio.Event | None = None
+        self.initialize_params: dict | None = None
+        self.initialize_result: asyncio.Future | None = None
+        # Cleared while a reloaded server is initialized; messages for it wait.
+        self.server_ready: asyncio.Event | None = None
+        self.reload_lock: asyncio.Lock | None = None
+        self.log = None
+        self.idle_timer: asyncio.TimerHandle | None = None
+        self.done: asyncio.Event | None = None
+
+    async def run(self) -> None:
+        self.done = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.server_ready = asyncio.Event()
+        self.server_ready.set()
+        self.reload_lock = asyncio.Lock()
+        self.log = open(self.socket_path + ".log", "ab")
+        self.server = await self.start_server()
+        # Only the user who started the daemon may connect to it.
+        umask = os.umask(0o177)
+        try:
+            listener = await asyncio.start_unix_server(
+                self.on_connect, path=self.socket_path, limit=READ_LIMIT
+            )
+        finally:
+            os.umask(umask)
+        server_task = asyncio.ensure_future(self.read_server(self.server))
+        self.schedule_idle_shutdown()
+        await self.done.wait()  # type: ignore
+        listener.close()
+        server_task.cancel()
+        for client in self.clients:
+            client.close()
+        self.log.close()
+
+    # Server side
+
+    async def start_server(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=self.log,
+            limit=READ_LIMIT,
+        )
+
+    async def send_server(self, message: dict, reloading: bool = False) -> None:
+        if not reloading:
+            await self.server_ready.wait()  # type: ignore
+        stdin = self.server.stdin  # type: ignore
+        try:
+            stdin.write(encode(message))
+            await stdin.drain()
+        except ConnectionError:
+            # The server exited; read_server stops the daemon.
+            pass
+
+    async def request_server(
+        self, method: str, params=None, reloading: bool = False
+    ) -> asyncio.Future:
+        request_id = self.new_id()
+        self.pending[request_id] = DAEMON
+        future = asyncio.get_event_loop().create_future()
+        self.daemon_requests[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        await self.send_server(message, reloading)
+        return future
+
+    def new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    async def read_server(self, server: asyncio.subprocess.Process) -> None:
+        while True:
+            message = await read_message(server.stdout)  # type: ignore
+            if server is not self.server:
+                # Replaced by a reload; what it still says is out of date.
+                return
+            if message is None:
+                # The server exited; clients reconnect to a new daemon.
+                self.done.set()  # type: ignore
+                return
+            await self.on_server_message(message)
+
+    async def reload_server(self) -> None:
+        """Replaces the server with one that reads the configuration again."""
+        async with self.reload_lock:  # type: ignore
+            self.server_ready.clear()  # type: ignore
+            previous = self.server
+            try:
+                self.server = await self.start_server()
+                asyncio.ensure_future(self.read_server(self.server))
+                await self.fail_pending()
+                self.closing.clear()
+                if self.initialize_params is not None:
+                    await (
+                        await self.request_server(
+                            "initialize", self.initialize_params, reloading=True
+                        )
+                    )
+                    await self.send_server(
+                        {"jsonrpc": "2.0", "method": "initialized", "params": {}},
+                        reloading=True,
+                    )
+                # Reopening a document rechecks it; pulls wait for the new results.
+                for uri, document in self.documents.items():
+                    self.checking.add(uri)
+                    await self.send_server(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "textDocument/didOpen",
+                            "params": {"textDocument": document},
+                        },
+                        reloading=True,
+                    )
+            finally:
+                self.server_ready.set()  # type: ignore
+            await self.stop_server(previous)  # type: ignore
+
+    async def fail_pending(self) -> None:
+        """Answers the requests the replaced server will never answer."""
+        pending, self.pending = self.pending, {}
+        for request_id, entry in pending.items():
+            if entry is DAEMON:
+                self.daemon_requests.pop(request_id).set_exception(
+                    RuntimeError({"code": CONTENT_MODIFIED, "message": "reloaded"})
+                )
+                continue
+            client, client_id = entry
+            client.requests.pop(client_id, None)
+            await client.send(
+                {
+                    "jsonrpc": "2.0",
+                    "id": client_id,
+                    "error": {"code": CONTENT_MODIFIED, "message": "server reloaded"},
+                }
+            )
+        # Answers to the replaced server's requests have nowhere to go.
+        self.server_requests.clear()
+
+    async def stop_server(self, server: asyncio.subprocess.Process) -> None:
+        # The server exits when its input closes.
+        server.stdin.close()  # type: ignore
+        try:
+            await asyncio.wait_for(server.wait(), SERVER_EXIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            server.kill()
+            await server.wait()
+
+    async def on_server_message(self, message: dict) -> None:
+        method = message.get("method")
+        if method is None:
+            entry = self.pending.pop(message.get("id"), None)
+            if entry is DAEMON:
+                future = self.daemon_requests.pop(message["id"])
+                if "error" in message:
+                    future.set_exception(RuntimeError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+            elif entry is not None:
+                client, client_id = entry
+                client.requests.pop(client_id, None)
+                await client.send(dict(message, id=client_id))
+        elif "id" in message:
+            # Requests from the server are answered by the longest connected client.
+            if not self.clients:
+                await self.send_server(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": message["id"],
+                        "error": {"code": METHOD_NOT_FOUND, "message": method},
+                    }
+                )
+                return
+            self.server_requests[message["id"]] = self.clients[0]
+            await self.clients[0].send(message)
+        elif method == PUBLISH_DIAGNOSTICS:
+            uri = message["params"]["uri"]
+            # The clearing of a document closed for a client that left. Nobody waits
+            # for it, and a client reopening the document, e.g. after reconnecting,
+            # gets the reopen's diagnostics next.
+            left = uri in self.closing
+            if left:
+                self.closing[uri] -= 1
+                if self.closing[uri] == 0:
+                    del self.closing[uri]
+            if left and uri in self.open_counts:
+                return
+            if message["params"].get("diagnostics"):
+                self.diagnostics[uri] = message["params"]
+            else:
+                self.diagnostics.pop(uri, None)
+            changed = self.update_result(uri, message["params"].get("diagnostics", []))
+            targets = [c for c in self.clients if uri in c.open_documents]
+            # Diagnostics for documents nobody has open answer a diagnostic request.
+            for client in targets or self.clients:
+                if uri in client.pulled and client.refresh_support:
+                    if changed and uri not in client.pulling:
+                        self.schedule_refresh(client)
+                elif not left:
+                    await client.send(message)
+        else:
+            for client in self.clients:
+                await client.send(message)
+
+    async def initialize(self, params: dict) -> dict:
+        """Initializes the server once, with the first client's parameters."""
+        if self.initialize_result is None:
+            self.initialize_params = params
+            self.initialize_result = asyncio.ensure_future(
+                self.initialize_server(params)
+            )
+        return await asyncio.shield(self.initialize_result)
+
+    async def initialize_server(self, params: dict) -> dict:
+        result = await (await self.request_server("initialize", params))
+        await self.send_server(
+            {"jsonrpc": "2.0", "method": "initialized", "params": {}}
+        )
+        return result
+
+    # Client side
+
+    async def on_connect(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client = Client(reader, writer)
+        self.clients.append(client)
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+        try:
+            while not client.closed:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                await self.on_client_message(client, message)
+        finally:
+            await self.disconnect(client)
+
+    async def on_client_message(self, client: Client, message: dict) -> None:
+        method = message.get("method")
+        if method is None:
+            if self.server_requests.get(message.get("id")) is client:
+                del self.server_requests[message["id"]]
+                await self.send_server(message)
+        elif method == "initialize":
+            params = message.get("params") or {}
+            workspace = (params.get("capabilities") or {}).get("workspace") or {}
+            client.refresh_support = bool(
+                (workspace.get("diagnostics") or {}).get("refreshSupport")
+            )
+            try:
+                result = with_daemon_capabilities(await self.initialize(params))
+                await client.send(
+                    {"jsonrpc": "2.0", "id": message["id"], "result": result}
+                )
+            except RuntimeError as ex:
+                error = ex.args[0] if ex.args else {"code": -32603, "message": str(ex)}
+                await client.send(
+                    {"jsonrpc": "2.0", "id": message["id"], "error": error}
+                )
+        elif method == "initialized":
+            # Sent once, by the daemon.
+            pass
+        elif method == "shutdown":
+            # The server outlives each client; only this client's session ends.
+            await client.send({"jsonrpc": "2.0", "id": message["id"], "result": None})
+        elif method == "exit":
+            client.close()
+        elif method == "$/cancelRequest":
+            pull = client.pulls.get(message["params"]["id"])
+            if pull is not None:
+                pull.cancel()
+                return
+            request_id = client.requests.get(message["params"]["id"])
+            if request_id is not None:
+                await self.send_server(
+                    dict(message, params=dict(message["params"], id=request_id))
+                )
+        elif method == "textDocument/didOpen":
+            uri = message["params"]["textDocument"]["uri"]
+            if uri in client.open_documents:
+                return
+            client.open_documents.add(uri)
+            self.open_counts[uri] = self.open_counts.get(uri, 0) + 1
+            if self.open_counts[uri] == 1:
+                self.documents[uri] = dict(message["params"]["textDocument"])
+                self.checking.add(uri)
+                await self.send_server(message)
+            elif uri in self.diagnostics:
+                await client.send(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": PUBLISH_DIAGNOSTICS,
+                        "params": self.diagnostics[uri],
+                    }
+                )
+        elif method == "textDocument/didClose":
+            uri = message["params"]["textDocument"]["uri"]
+            if uri in client.open_documents:
+                client.open_documents.discard(uri)
+                client.pulled.discard(uri)
+                await self.close_document(client, uri, message)
+        elif method == "textDocument/didChange":
+            self.update_document(message["params"])
+            await self.send_server(message)
+        elif method == "workspace/didChangeWatchedFiles":
+            changes = message["params"]["changes"]
+            if any(c["uri"].rsplit("/", 1)[-1] in CONFIG_FILES for c in changes):
+                await self.reload_server()
+            else:
+                await self.send_server(message)
+        elif method == "textDocument/didSave":
+            self.checking.add(message["params"]["textDocument"]["uri"])
+            await self.send_server(message)
+        elif method == "textDocument/diagnostic":
+            self.start_pull(client, message, self.document_diagnostic)
+        elif method == "workspace/diagnostic":
+            self.start_pull(client, message, self.workspace_diagnostic)
+        elif "id" in message:
+            request_id = self.new_id()
+            self.pending[request_id] = (client, message["id"])
+            client.requests[message["id"]] = request_id
+            await self.send_server(dict(message, id=request_id))
+        else:
+            await self.send_server(message)
+
+    def update_document(self, params: dict) -> None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return
+        document["version"] = params["textDocument"].get("version")
+        for change in params["contentChanges"]:
+            # Edits of a range can't be replayed without the text they apply to; the
+            # server checks files on disk, so the text only has to be well formed.
+            if "range" not in change:
+                document["text"] = change["text"]
+
+    # Pulled diagnostics
+
+    def update_result(self, uri: str, diagnostics: list) -> bool:
+        """Records published diagnostics; returns whether their result id changed."""
+        previous = self.result_ids.get(uri)
+        self.result_ids[uri] = result_id(diagnostics)
+        self.checking.discard(uri)
+        for future in self.waiters.pop(uri, []):
+            if not future.done():
+                future.set_result(None)
+        if previous == self.result_ids[uri]:
+            return False
+        self.changed.set()  # type: ignore
+        self.changed = asyncio.Event()
+        return True
+
+    def schedule_refresh(self, client: Client) -> None:
+        """Asks a client to pull again once a burst of changes is over."""
+        if client.workspace_pulls or client.refresh_timer is not None:
+            # A held workspace pull already reports the change.
+            return
+
+        def _refresh():
+            client.refresh_timer = None
+            asyncio.ensure_future(
+                client.send(
+                    {
+                        "jsonrpc": "2.0",
+                        # Strings, so they can't collide with the server's request ids.
+                        "id": f"daemon-{self.new_id()}",
+                        "method": "workspace/diagnostic/refresh",
+                    }
+                )
+            )
+
+        client.refresh_timer = asyncio.get_event_loop().call_later(
+            REFRESH_DELAY, _refresh
+        )
+
+    def report(self, uri: str, previous_result_id: str | None) -> dict:
+        diagnostics = self.diagnostics.get(uri, {}).get("diagnostics", [])
+        current = self.result_ids.get(uri) or result_id(diagnostics)
+        if previous_result_id == current:
+            return {"kind": "unchanged", "resultId": current}
+        return {"kind": "full", "resultId": current, "items": diagnostics}
+
+    def start_pull(self, client: Client, message: dict, handler) -> None:
+        async def _answer():
+            try:
+                result = await handler(client, message.get("params") or {})
+                response = {"jsonrpc": "2.0", "id": message["id"], "result": result}
+            except asyncio.CancelledError:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": message["id"],
+                    "error": {"code": REQUEST_CANCELLED, "message": "cancelled"},
+                }
+            except (KeyError, TypeError) as ex:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": message["id"],
+                    "error": {"code": INVALID_PARAMS, "message": repr(ex)},
+                }
+            finally:
+                client.pulls.pop(message["id"], None)
+            await client.send(response)
+
+        client.pulls[message["id"]] = asyncio.ensure_future(_answer())
+
+    async def document_diagnostic(self, client: Client, params: dict) -> dict:
+        uri = params["textDocument"]["uri"]
+        client.pulled.add(uri)
+        client.pulling.add(uri)
+        try:
+            # Open documents are rechecked by the server when opened and saved; any
+            # other file may have changed on disk since it was last checked.
+            if uri not in self.checking and (
+                uri not in self.open_counts or uri not in self.result_ids
+            ):
+                self.checking.add(uri)
+                # The server answers by publishing; its reply, if any, is dropped.
+                await self.send_server(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": self.new_id(),
+                        "method": "textDocument/diagnostic",
+                        "params": {"textDocument": {"uri": uri}},
+                    }
+                )
+            if uri in self.checking:
+                future = asyncio.get_event_loop().create_future()
+                self.waiters.setdefault(uri, []).append(future)
+                try:
+                    await asyncio.wait_for(future, PULL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.checking.discard(uri)
+        finally:
+            client.pulling.discard(uri)
+        return self.report(uri, params.get("previousResultId"))
+
+    async def workspace_diagnostic(self, client: Client, params: dict) -> dict:
+        previous = {p["uri"]: p["value"] for p in params.get("previousResultIds") or []}
+        client.workspace_pulls += 1
+        try:
+            changed = self.changed
+            items = self.workspace_reports(previous)
+            if all(item["kind"] == "unchanged" for item in items):
+                # Nothing new: hold the request until something changes.
+                try:
+                    await asyncio.wait_for(changed.wait(), WORKSPACE_PULL_TIMEOUT)  # type: ignore
+                except asyncio.TimeoutError:
+                    pass
+                items = self.workspace_reports(previous)
+        finally:
+            client.workspace_pulls -= 1
+        return {"items": items}
+
+    def workspace_reports(self, previous: dict) -> list[dict]:
+        return [
+            dict(self.report(uri, previous.get(uri)), uri=uri, version=None)
+            for uri in sorted(self.result_ids)
+        ]
+
+    async def close_document(self, client: Client, uri: str, message: dict) -> None:
+        self.open_counts[uri] -= 1
+        if self.open_counts[uri] == 0:
+            del self.open_counts[uri]
+            self.documents.pop(uri, None)
+            await self.send_server(message)
+        else:
+            # Still open elsewhere; clear it for this client as the server would.
+            await client.send(
+                {
+                    "jsonrpc": "2.0",
+                    "method": PUBLISH_DIAGNOSTICS,
+                    "params": {"uri": uri, "diagnostics": []},
+                }
+            )
+
+    async def disconnect(self, client: Client) -> None:
+        if client in self.clients:
+            self.clients.remove(client)
+        client.close()
+        for uri in list(client.open_documents):
+            self.open_counts[uri] -= 1
+            if self.open_counts[uri] == 0:
+                del self.open_counts[uri]
+                self.documents.pop(uri, None)
+                self.closing[uri] = 2 if uri in self.checking else 1
+                await self.send_server(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "textDocument/didClose",
+                        "params": {"textDocument": {"uri": uri}},
+                    }
+                )
+        client.open_documents.clear()
+        for request_id, owner in list(self.server_requests.items()):
+            if owner is client:
+                del self.server_requests[request_id]
+                await self.send_server(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {"code": METHOD_NOT_FOUND, "message": "client left"},
+                    }
+                )
+        self.schedule_idle_shutdown()
+
+    def schedule_idle_shutdown(self) -> None:
+        if self.clients or self.idle_timer is not None:
+            return
+        self.idle_timer = asyncio.get_event_loop().call_later(
+            self.idle_timeout, lambda: asyncio.ensure_future(self.shutdown())
+        )
+
+    async def shutdown(self) -> None:
+        """Stops the server after the idle timeout."""
+        self.idle_timer = None
+        if self.clients:
+            return
+        try:
+            await asyncio.wait_for(
+                await self.request_server("shutdown"), SERVER_EXIT_TIMEOUT
+            )
+            await self.send_server({"jsonrpc": "2.0", "method": "exit"})
+            await asyncio.wait_for(self.server.wait(), SERVER_EXIT_TIMEOUT)  # type: ignore
+        except (asyncio.TimeoutError, RuntimeError, ConnectionError):
+            if self.server.returncode is None:  # type: ignore
+                self.server.kill()  # type: ignore
+        self.done.set()  # type: ignore
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("missing the server command")
+
+    # Clients trust whatever listens on the socket, so it must live where only this
+    # user can create files.
+    directory = os.path.dirname(os.path.abspath(args.socket))
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        parser.error(
+            f"{directory} must be owned by the current user and not writable by others"
+        )
+    # The lock and log files are only for this user too.
+    os.umask(0o077)
+
+    # Held while the daemon runs, so only one daemon serves a socket.
+    lock = open(args.socket + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return 0
+    try:
+        # Left behind by a daemon that didn't exit cleanly.
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        asyncio.run(Daemon(command, args.socket, args.idle_timeout).run())
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        lock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
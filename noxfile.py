@@ -7,10 +7,97 @@ from __future__ import annotations
 import json
 import os
 import pathlib
+import shutil
+import subprocess
 import urllib.request as url_lib
 
 import nox
 
+BUNDLED_LIBS = pathlib.Path(__file__).parent / "bundled" / "libs"
+# Recorded by the first benchmark run on a machine, see `benchmark`.
+BENCHMARK_BASELINE = (
+    pathlib.Path(__file__).parent / "src/test/python_tests/benchmark_baseline.json"
+)
+
+# Interpreters the bundle is byte-compiled for, when they are on the build machine.
+BUNDLE_PYTHON_VERSIONS = ("3.8", "3.9", "3.10", "3.11", "3.12", "3.13")
+
+# Distributions only the tach commands the extension never runs import: `tach show`
+# draws graphs with pydot and networkx, and uploading reports reads git with
+# gitpython. `tach server` imports the rest at startup or lazily, e.g. pyyaml for
+# legacy tach.yml configs, so they stay.
+BUNDLE_UNUSED = {"networkx", "pydot", "pyparsing", "gitpython", "gitdb", "smmap"}
+
+
+def _runs(python: str) -> bool:
+    """Whether `python` starts, since a stale shim can be on PATH without an interpreter."""
+    result = subprocess.run(
+        [python, "-c", "import sys"], capture_output=True, check=False
+    )
+    return result.returncode == 0
+
+
+def _bundle_interpreters() -> list[str]:
+    found = (shutil.which(f"python{version}") for version in BUNDLE_PYTHON_VERSIONS)
+    return [python for python in found if python and _runs(python)]
+
+
+def _top_level_names(dist_info: pathlib.Path) -> set[str]:
+    """Top-level files and directories a distribution installed into the bundle."""
+    names = set()
+    for line in (dist_info / "RECORD").read_text(encoding="utf-8").splitlines():
+        top = pathlib.PurePosixPath(line.split(",")[0]).parts[0]
+        # Scripts are recorded outside of the target directory.
+        if top != ".." and top != dist_info.name:
+            names.add(top)
+    return names
+
+
+def _prune_bundle() -> None:
+    """Removes test suites and the distributions the server never imports."""
+    for tests in [*BUNDLED_LIBS.glob("*/**/tests"), *BUNDLED_LIBS.glob("*/**/test")]:
+        if tests.is_dir():
+            shutil.rmtree(tests)
+    for dist_info in BUNDLED_LIBS.glob("*.dist-info"):
+        distribution = dist_info.name.split("-")[0].lower()
+        if distribution not in BUNDLE_UNUSED:
+            continue
+        for name in _top_level_names(dist_info):
+            path = BUNDLED_LIBS / name
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        shutil.rmtree(dist_info)
+
+
+def _compile_bundle(session: nox.Session, interpreters: list[str]) -> None:
+    # VSIX extraction doesn't keep mtimes and the extension directory may be
+    # read-only, so the bytecode is checked by hash rather than by timestamp.
+    for python in interpreters:
+        session.run(
+            python,
+            "-m",
+            "compileall",
+            "-q",
+            "-j",
+            "0",
+            "--invalidation-mode",
+            "unchecked-hash",
+            str(BUNDLED_LIBS),
+            external=True,
+        )
+
+
+def _optimize_bundle(session: nox.Session) -> None:
+    interpreters = _bundle_interpreters()
+    if not interpreters:
+        session.error(
+            f"No Python {', '.join(BUNDLE_PYTHON_VERSIONS)} found to compile the bundle for."
+        )
+    _prune_bundle()
+    _compile_bundle(session, interpreters)
+
 
 def _install_bundle(session: nox.Session) -> None:
     session.run(
@@ -31,6 +118,7 @@ def _install_bundle(session: nox.Session) -> None:
         "-r",
         "./requirements.txt",
     )
+    _optimize_bundle(session)
 
 
 def _check_files(names: list[str]) -> None:
@@ -135,6 +223,68 @@ def tests(session: nox.Session) -> None:
     session.run("pytest", "-svv", "src/test/python_tests")
 
 
+@nox.session()
+def benchmark(session: nox.Session) -> None:
+    """Benchmarks diagnostic latency against a stored baseline.
+
+    Latency depends on the machine, so the baseline is not committed: the first
+    run records it, later runs compare against it. Pass `-- --save-baseline` to
+    record a new baseline instead of comparing.
+    """
+    session.install("-r", "src/test/python_tests/requirements.txt")
+    args = list(session.posargs)
+    if not BENCHMARK_BASELINE.exists() and "--save-baseline" not in args:
+        session.log(
+            f"No baseline at {BENCHMARK_BASELINE}, recording one instead of comparing"
+        )
+        args.append("--save-baseline")
+    with session.chdir("src/test"):
+        session.run(
+            "python",
+            "-m",
+            "python_tests.lsp_test_client.benchmark",
+            "--output",
+            "../../benchmark_results.json",
+            "--baseline",
+            str(BENCHMARK_BASELINE),
+            *args,
+        )
+
+
+@nox.session()
+def coldstart(session: nox.Session) -> None:
+    """Compares server cold starts from the bundled libs and from the environment."""
+    session.install("-r", "src/test/python_tests/requirements.txt")
+    session.install("-r", "./requirements.txt")
+    with session.chdir("src/test"):
+        session.run(
+            "python",
+            "-m",
+            "python_tests.lsp_test_client.coldstart",
+            *session.posargs,
+        )
+
+
+@nox.session()
+def loadtest(session: nox.Session) -> None:
+    """Drives many concurrent clients against the server and reports its capacity.
+
+    Pass `-- --capacity --slo-ms 500` to find how many clients fit a latency objective.
+    Each client runs its own server unless `--shared` connects them all to one
+    through the daemon.
+    """
+    session.install("-r", "src/test/python_tests/requirements.txt")
+    with session.chdir("src/test"):
+        session.run(
+            "python",
+            "-m",
+            "python_tests.lsp_test_client.loadtest",
+            "--output",
+            "../../loadtest_results.json",
+            *session.posargs,
+        )
+
+
 @nox.session()
 def lint(session: nox.Session) -> None:
     # check typescript code
@@ -0,0 +1,76 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import * as fs from 'fs-extra';
+import * as path from 'path';
+import { Memento } from 'vscode';
+import { traceVerbose } from './log/logging';
+import { resolveInterpreter } from './python';
+import { VersionInfo } from './version';
+
+const VERSION_CACHE_KEY = 'tach.versionCache';
+
+interface IVersionCacheEntry {
+    // mtime of the tach dist-info directory the version was probed against.
+    mtime: number;
+    version: string;
+}
+
+let _memento: Memento | undefined;
+
+export function initializeCache(memento: Memento): void {
+    _memento = memento;
+}
+
+function getSitePackagesCandidates(sysPrefix: string, major?: number, minor?: number): string[] {
+    const candidates = [path.join(sysPrefix, 'Lib', 'site-packages')];
+    if (major !== undefined && minor !== undefined) {
+        candidates.push(path.join(sysPrefix, 'lib', `python${major}.${minor}`, 'site-packages'));
+    }
+    return candidates;
+}
+
+async function getTachDistInfoMtime(interpreter: string): Promise<number | undefined> {
+    const resolved = await resolveInterpreter([interpreter]);
+    const sysPrefix = resolved?.executable.sysPrefix;
+    if (!sysPrefix) {
+        return undefined;
+    }
+    const candidates = getSitePackagesCandidates(sysPrefix, resolved?.version?.major, resolved?.version?.minor);
+    for (const sitePackages of candidates) {
+        if (!(await fs.pathExists(sitePackages))) {
+            continue;
+        }
+        const distInfo = (await fs.readdir(sitePackages)).find((f) => /^tach-.*\.dist-info$/.test(f));
+        if (distInfo) {
+            return (await fs.stat(path.join(sitePackages, distInfo))).mtimeMs;
+        }
+    }
+    return undefined;
+}
+
+/**
+ * Returns the tach version installed for `interpreter`, only running `probe` when the
+ * interpreter has not been seen before or its tach installation changed since.
+ */
+export async function getCachedTachVersion(
+    interpreter: string,
+    probe: (interpreter: string) => Promise<VersionInfo>,
+): Promise<VersionInfo> {
+    const mtime = await getTachDistInfoMtime(interpreter);
+    const entries = _memento?.get<Record<string, IVersionCacheEntry>>(VERSION_CACHE_KEY) ?? {};
+    const entry = entries[interpreter];
+    if (mtime !== undefined && entry?.mtime === mtime) {
+        traceVerbose(`Using cached tach version ${entry.version} for ${interpreter}`);
+        return VersionInfo.parse(entry.version);
+    }
+
+    const version = await probe(interpreter);
+    if (mtime !== undefined) {
+        await _memento?.update(VERSION_CACHE_KEY, {
+            ...entries,
+            [interpreter]: { mtime, version: version.toString() },
+        });
+    }
+    return version;
+}
@@ -0,0 +1,211 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { createHash } from 'crypto';
+import * as fs from 'fs-extra';
+import * as path from 'path';
+import { Disposable, RelativePattern, Uri, workspace, WorkspaceFolder } from 'vscode';
+import { traceVerbose } from './log/logging';
+import { SKIPPED_DIRS } from './rootIndex';
+
+// Files at the project root that affect the server's results.
+const ROOT_FILES = ['tach.toml', 'pyproject.toml', 'requirements.txt'];
+
+const DOMAIN_FILE = 'tach.domain.toml';
+
+export interface IProjectScope {
+    sourceRoots: string[];
+    exclude: RegExp[];
+}
+
+/** Returns the string items of a `key = [...]` array in a TOML section. */
+function readStringArray(section: string, key: string): string[] | undefined {
+    const match = new RegExp(`^${key}\\s*=\\s*\\[([^\\]]*)\\]`, 'm').exec(section);
+    if (!match) {
+        return undefined;
+    }
+    return [...match[1].matchAll(/"([^"]*)"|'([^']*)'/g)].map((m) => m[1] ?? m[2]);
+}
+
+/** Returns the lines of the TOML tables whose header starts with one of `prefixes`. */
+function selectTables(text: string, prefixes: string[]): string {
+    const lines: string[] = [];
+    let selected = false;
+    for (const line of text.split(/\r?\n/)) {
+        const header = /^\s*\[\[?\s*([^\]\s]+)/.exec(line);
+        if (header) {
+            selected = prefixes.some((prefix) => header[1] === prefix || header[1].startsWith(`${prefix}.`));
+        }
+        if (selected) {
+            lines.push(line);
+        }
+    }
+    return lines.join('\n');
+}
+
+/** Translates an fnmatch-style pattern, as tach uses for `exclude`, to a regular expression. */
+function globToRegExp(pattern: string): RegExp {
+    let source = '';
+    for (let i = 0; i < pattern.length; i += 1) {
+        const c = pattern[i];
+        if (c === '*') {
+            source += '.*';
+        } else if (c === '?') {
+            source += '.';
+        } else if (c === '[' && pattern.indexOf(']', i + 1) > i + 1) {
+            const end = pattern.indexOf(']', i + 1);
+            const body = pattern.slice(i + 1, end).replace(/\\/g, '\\\\');
+            source += body.startsWith('!') ? `[^${body.slice(1)}]` : `[${body}]`;
+            i = end;
+        } else {
+            source += c.replace(/[.+^${}()|\\]/g, '\\$&');
+        }
+    }
+    return new RegExp(`^${source.replace(/\/$/, '')}$`);
+}
+
+/** Whether a project-relative path, or any directory above it, matches an exclude pattern. */
+export function isExcluded(relative: string, exclude: RegExp[]): boolean {
+    const parts = relative.split(/[\\/]/);
+    for (let i = 1; i <= parts.length; i += 1) {
+        const candidate = parts.slice(0, i).join('/');
+        if (exclude.some((pattern) => pattern.test(candidate))) {
+            return true;
+        }
+    }
+    return false;
+}
+
+/** Reads the source roots and exclude patterns of the tach project at `root`. */
+export async function readProjectScope(root: string): Promise<IProjectScope> {
+    let section = '';
+    try {
+        section = await fs.readFile(path.join(root, 'tach.toml'), 'utf-8');
+    } catch {
+        try {
+            const pyproject = await fs.readFile(path.join(root, 'pyproject.toml'), 'utf-8');
+            section = selectTables(pyproject, ['tool.tach']).replace(/^\s*\[tool\.tach\]\s*$/m, '');
+        } catch {
+            // No config yet; watch the defaults.
+        }
+    }
+    // Keys of the top-level table come before the first header.
+    const topLevel = section.split(/^\s*\[/m)[0];
+    return {
+        sourceRoots: readStringArray(topLevel, 'source_roots') ?? ['.'],
+        exclude: (readStringArray(topLevel, 'exclude') ?? []).map(globToRegExp),
+    };
+}
+
+/** Finds the domain files inside the source roots of the project at `folder`, minus excluded paths. */
+export async function findDomainFiles(folder: WorkspaceFolder, scope: IProjectScope): Promise<string[]> {
+    const files: string[] = [];
+    for (const root of new Set(scope.sourceRoots.map((r) => path.normalize(r)))) {
+        const pattern = new RelativePattern(Uri.joinPath(folder.uri, root), `**/${DOMAIN_FILE}`);
+        const uris = await workspace.findFiles(pattern, SKIPPED_DIRS);
+        files.push(...uris.map((uri) => uri.fsPath));
+    }
+    return files.filter((file) => !isExcluded(path.relative(folder.uri.fsPath, file), scope.exclude));
+}
+
+/**
+ * Returns the part of a config file that can change the server's results, so that saves
+ * which only touch comments, whitespace or unrelated pyproject.toml tables are ignored.
+ */
+export function effectiveContent(file: string, text: string): string {
+    const name = path.basename(file);
+    if (name === 'pyproject.toml') {
+        text = selectTables(text, ['project', 'tool.tach']);
+    }
+    const lines = text
+        .split(/\r?\n/)
+        .map((line) => (name === 'requirements.txt' ? line.replace(/(^|\s)#.*$/, '') : line).trim())
+        .filter((line) => line.length > 0 && !line.startsWith('#'));
+    return (name === 'requirements.txt' ? lines.sort() : lines).join('\n');
+}
+
+async function hashFile(file: string): Promise<string | undefined> {
+    try {
+        const text = await fs.readFile(file, 'utf-8');
+        return createHash('sha256').update(effectiveContent(file, text)).digest('hex');
+    } catch {
+        // Deleted.
+        return undefined;
+    }
+}
+
+/**
+ * Watches the config files a tach project actually uses: the files at its root and the
+ * domain files inside its source roots, minus excluded paths. `onChange` is only called
+ * when the effective content of a file changes.
+ */
+export class ConfigWatcher implements Disposable {
+    private readonly hashes = new Map<string, string | undefined>();
+    private readonly disposables: Disposable[] = [];
+    private exclude: RegExp[] = [];
+    private disposed = false;
+
+    constructor(
+        private readonly folder: WorkspaceFolder,
+        private readonly onChange: (uri: Uri) => void,
+    ) {}
+
+    public async start(): Promise<void> {
+        const start = Date.now();
+        const scope = await readProjectScope(this.folder.uri.fsPath);
+        this.exclude = scope.exclude;
+        const sourceRoots = [...new Set(scope.sourceRoots.map((r) => path.normalize(r)))];
+        const patterns = [
+            new RelativePattern(this.folder, `{${ROOT_FILES.join(',')}}`),
+            ...sourceRoots.map((r) => new RelativePattern(Uri.joinPath(this.folder.uri, r), `**/${DOMAIN_FILE}`)),
+        ];
+        const files = ROOT_FILES.map((name) => path.join(this.folder.uri.fsPath, name));
+        files.push(...(await findDomainFiles(this.folder, scope)));
+        for (const file of files) {
+            if (!this.isExcluded(file)) {
+                this.hashes.set(file, await hashFile(file));
+            }
+        }
+        if (this.disposed) {
+            return;
+        }
+        for (const pattern of patterns) {
+            const watcher = workspace.createFileSystemWatcher(pattern);
+            this.disposables.push(
+                watcher,
+                watcher.onDidCreate((uri) => void this.check(uri)),
+                watcher.onDidChange((uri) => void this.check(uri)),
+                watcher.onDidDelete((uri) => void this.check(uri)),
+            );
+        }
+        traceVerbose(
+            `Config watcher: Watching ${this.hashes.size} file(s) under ${sourceRoots.length} source root(s) ` +
+                `in ${Date.now() - start}ms`,
+        );
+    }
+
+    public dispose(): void {
+        this.disposed = true;
+        this.disposables.forEach((d) => d.dispose());
+    }
+
+    private isExcluded(file: string): boolean {
+        return isExcluded(path.relative(this.folder.uri.fsPath, file), this.exclude);
+    }
+
+    private async check(uri: Uri): Promise<void> {
+        if (this.isExcluded(uri.fsPath)) {
+            return;
+        }
+        const hash = await hashFile(uri.fsPath);
+        if (this.disposed) {
+            return;
+        }
+        if (this.hashes.has(uri.fsPath) && this.hashes.get(uri.fsPath) === hash) {
+            traceVerbose(`Config watcher: ${workspace.asRelativePath(uri)} saved without effective changes`);
+            return;
+        }
+        this.hashes.set(uri.fsPath, hash);
+        this.onChange(uri);
+    }
+}
@@ -8,3 +8,4 @@ export const EXTENSION_ROOT_DIR =
     folderName === 'common' ? path.dirname(path.dirname(__dirname)) : path.dirname(__dirname);
 export const BUNDLED_PYTHON_SCRIPTS_DIR = path.join(EXTENSION_ROOT_DIR, 'bundled');
 export const BUNDLED_PYTHON_LIBS_DIR = path.join(BUNDLED_PYTHON_SCRIPTS_DIR, 'libs');
+export const BUNDLED_DAEMON_SCRIPT = path.join(BUNDLED_PYTHON_SCRIPTS_DIR, 'tool', 'lsp_daemon.py');
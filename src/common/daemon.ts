@@ -0,0 +1,116 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { spawn, SpawnOptions } from 'child_process';
+import * as fs from 'fs-extra';
+import * as net from 'net';
+import * as os from 'os';
+import * as path from 'path';
+import { StreamInfo } from 'vscode-languageclient/node';
+import { BUNDLED_DAEMON_SCRIPT } from './constants';
+import { traceInfo } from './log/logging';
+
+// How long a daemon started by this window may take to accept connections.
+const CONNECT_TIMEOUT = 10000;
+const CONNECT_RETRY_DELAY = 100;
+
+/**
+ * Returns the directory holding this user's daemon sockets, creating it if needed. Only the
+ * user may use it, so nobody else can put a socket where a window will connect.
+ */
+async function getDaemonDirectory(): Promise<string> {
+    const uid = os.userInfo().uid;
+    const runtimeDir = process.env.XDG_RUNTIME_DIR;
+    const directory = runtimeDir ? path.join(runtimeDir, 'tach') : path.join(os.tmpdir(), `tach-${uid}`);
+    await fs.mkdir(directory, { mode: 0o700 }).catch((ex) => {
+        if (ex.code !== 'EEXIST') {
+            throw ex;
+        }
+    });
+    const stat = await fs.lstat(directory);
+    if (!stat.isDirectory() || stat.uid !== uid || (stat.mode & 0o077) !== 0) {
+        throw new Error(`${directory} must be a directory only the current user can access`);
+    }
+    return directory;
+}
+
+/** Socket of the daemon serving a project root and configuration, identified by `key`. */
+export async function getDaemonSocket(key: string): Promise<string> {
+    // Unix socket paths are limited to about 100 characters.
+    return path.join(await getDaemonDirectory(), `tach-${key.slice(0, 16)}.sock`);
+}
+
+/** Whether nothing or a socket of the current user is at `socketPath`. */
+async function isOwnSocket(socketPath: string): Promise<boolean> {
+    try {
+        const stat = await fs.lstat(socketPath);
+        return stat.isSocket() && stat.uid === os.userInfo().uid;
+    } catch {
+        return true;
+    }
+}
+
+async function connect(socketPath: string): Promise<net.Socket> {
+    if (!(await isOwnSocket(socketPath))) {
+        throw new Error(`${socketPath} does not belong to the current user`);
+    }
+    return new Promise((resolve, reject) => {
+        const socket = net.createConnection(socketPath);
+        socket.once('error', reject);
+        socket.once('connect', () => {
+            socket.removeListener('error', reject);
+            resolve(socket);
+        });
+    });
+}
+
+/**
+ * Connects to the daemon listening on `socketPath`, starting one with `interpreter` that
+ * runs the server command when there is none. The daemon outlives this window and shuts
+ * down on its own once no window has been connected for `idleTimeout` seconds.
+ */
+export async function connectToDaemon(
+    socketPath: string,
+    interpreter: string[],
+    command: string,
+    args: string[],
+    options: SpawnOptions,
+    idleTimeout: number,
+): Promise<StreamInfo> {
+    try {
+        const socket = await connect(socketPath);
+        traceInfo(`Server: Connected to the shared server at ${socketPath}`);
+        return { reader: socket, writer: socket };
+    } catch {
+        // No daemon yet.
+    }
+    traceInfo(`Server: Starting a shared server at ${socketPath}`);
+    const daemon = spawn(
+        interpreter[0],
+        [
+            ...interpreter.slice(1),
+            BUNDLED_DAEMON_SCRIPT,
+            '--socket',
+            socketPath,
+            '--idle-timeout',
+            String(idleTimeout),
+            '--',
+            command,
+            ...args,
+        ],
+        { ...options, detached: true, stdio: 'ignore' },
+    );
+    daemon.unref();
+    const deadline = Date.now() + CONNECT_TIMEOUT;
+    for (;;) {
+        try {
+            const socket = await connect(socketPath);
+            return { reader: socket, writer: socket };
+        } catch (ex) {
+            if (Date.now() > deadline) {
+                throw new Error(`Shared server did not start within ${CONNECT_TIMEOUT}ms: ${ex}`);
+            }
+            await new Promise((resolve) => setTimeout(resolve, CONNECT_RETRY_DELAY));
+        }
+    }
+}
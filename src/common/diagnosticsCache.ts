@@ -0,0 +1,234 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { createHash } from 'crypto';
+import * as fs from 'fs-extra';
+import * as path from 'path';
+import {
+    Diagnostic,
+    DiagnosticCollection,
+    DiagnosticSeverity,
+    Disposable,
+    languages,
+    Range,
+    Uri,
+    WorkspaceFolder,
+} from 'vscode';
+import { Middleware } from 'vscode-languageclient/node';
+import { findDomainFiles, readProjectScope } from './configWatcher';
+import { traceError, traceVerbose } from './log/logging';
+
+const CACHE_FILE = 'diagnostics.json';
+const CACHE_FORMAT = 1;
+
+// Number of files whose diagnostics are kept; the least recently used are evicted first.
+const MAX_ENTRIES = 5000;
+
+// Config files at the root of a server's folder that affect its diagnostics.
+const CONFIG_FILES = ['tach.toml', 'pyproject.toml'];
+
+// Milliseconds to wait after an update before writing the cache to disk.
+const SAVE_DELAY = 2000;
+
+interface ICachedDiagnostic {
+    range: [number, number, number, number];
+    message: string;
+    severity: DiagnosticSeverity;
+    source?: string;
+    code?: string | number;
+}
+
+interface ICacheFile {
+    format: number;
+    // Ordered from least to most recently used.
+    entries: [string, ICachedDiagnostic[]][];
+}
+
+function hash(...parts: (string | Buffer)[]): string {
+    const digest = createHash('sha256');
+    parts.forEach((part) => digest.update(part).update('\0'));
+    return digest.digest('hex');
+}
+
+function serialize(diagnostic: Diagnostic): ICachedDiagnostic {
+    const { start, end } = diagnostic.range;
+    const code = diagnostic.code;
+    return {
+        range: [start.line, start.character, end.line, end.character],
+        message: diagnostic.message,
+        severity: diagnostic.severity,
+        source: diagnostic.source,
+        code: typeof code === 'string' || typeof code === 'number' ? code : undefined,
+    };
+}
+
+function deserialize(cached: ICachedDiagnostic): Diagnostic {
+    const diagnostic = new Diagnostic(new Range(...cached.range), cached.message, cached.severity);
+    diagnostic.source = cached.source;
+    diagnostic.code = cached.code;
+    return diagnostic;
+}
+
+/** Diagnostics of previous sessions stored in the extension's storage directory, with LRU eviction. */
+class DiagnosticsCache implements Disposable {
+    private readonly entries = new Map<string, ICachedDiagnostic[]>();
+    private loaded: Promise<void> | undefined;
+    private timer: NodeJS.Timeout | undefined;
+
+    constructor(private readonly file: string) {}
+
+    public async get(key: string): Promise<Diagnostic[] | undefined> {
+        await this.load();
+        const entry = this.entries.get(key);
+        if (entry) {
+            this.entries.delete(key);
+            this.entries.set(key, entry);
+        }
+        return entry?.map(deserialize);
+    }
+
+    public async set(key: string, diagnostics: readonly Diagnostic[]): Promise<void> {
+        await this.load();
+        this.entries.delete(key);
+        this.entries.set(key, diagnostics.map(serialize));
+        for (const oldest of this.entries.keys()) {
+            if (this.entries.size <= MAX_ENTRIES) {
+                break;
+            }
+            this.entries.delete(oldest);
+        }
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => void this.save(), SAVE_DELAY);
+    }
+
+    public dispose(): void {
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = undefined;
+            fs.outputFileSync(this.file, this.toJson());
+        }
+    }
+
+    private load(): Promise<void> {
+        if (this.loaded) {
+            return this.loaded;
+        }
+        this.loaded = (async () => {
+            try {
+                if (!(await fs.pathExists(this.file))) {
+                    return;
+                }
+                const contents: ICacheFile = await fs.readJson(this.file);
+                if (contents.format === CACHE_FORMAT) {
+                    contents.entries.forEach(([key, diagnostics]) => this.entries.set(key, diagnostics));
+                }
+                traceVerbose(`Loaded cached diagnostics for ${this.entries.size} files`);
+            } catch (ex) {
+                traceError(`Failed to read diagnostics cache ${this.file}: ${ex}`);
+            }
+        })();
+        return this.loaded;
+    }
+
+    private async save(): Promise<void> {
+        this.timer = undefined;
+        try {
+            await fs.outputFile(this.file, this.toJson());
+        } catch (ex) {
+            traceError(`Failed to write diagnostics cache ${this.file}: ${ex}`);
+        }
+    }
+
+    private toJson(): string {
+        const contents: ICacheFile = { format: CACHE_FORMAT, entries: [...this.entries] };
+        return JSON.stringify(contents);
+    }
+}
+
+let _cache: DiagnosticsCache | undefined;
+
+export function initializeDiagnosticsCache(storageUri: Uri): Disposable {
+    _cache = new DiagnosticsCache(path.join(storageUri.fsPath, CACHE_FILE));
+    return _cache;
+}
+
+/**
+ * Hashes everything besides a file's own contents that its diagnostics depend on: the
+ * tach config files under `folder` and the tach version.
+ */
+export async function getConfigHash(
+    folder: WorkspaceFolder,
+    tachVersion: string,
+    configuration?: string,
+): Promise<string> {
+    const files = CONFIG_FILES.map((name) => path.join(folder.uri.fsPath, name));
+    const domains = await findDomainFiles(folder, await readProjectScope(folder.uri.fsPath));
+    files.push(...domains.sort());
+    if (configuration) {
+        files.push(path.resolve(folder.uri.fsPath, configuration));
+    }
+    const contents = await Promise.all(files.map((file) => fs.readFile(file).catch(() => Buffer.alloc(0))));
+    return hash(tachVersion, ...files.flatMap((file, index) => [file, contents[index]]));
+}
+
+/**
+ * Shows the cached diagnostics of a server's documents until the server publishes its
+ * own, and caches what the server publishes. tach checks files as they are on disk, so
+ * entries are keyed by the file's contents on disk. Nothing is cached while `configHash`
+ * is pending, or at all when it resolves to undefined.
+ */
+export class CachedDiagnostics implements Disposable {
+    private readonly collection: DiagnosticCollection = languages.createDiagnosticCollection('tach-cached');
+    private readonly live = new Set<string>();
+    private disposed = false;
+
+    constructor(private readonly configHash: Promise<string | undefined>) {}
+
+    public readonly middleware: Middleware = {
+        handleDiagnostics: (uri, diagnostics, next) => {
+            this.live.add(uri.toString());
+            this.collection.delete(uri);
+            next(uri, diagnostics);
+            void this.store(uri, diagnostics);
+        },
+    };
+
+    public async publish(uris: Uri[]): Promise<void> {
+        let published = 0;
+        await Promise.all(
+            uris.map(async (uri) => {
+                const key = await this.getKey(uri);
+                const diagnostics = key ? await _cache?.get(key) : undefined;
+                if (diagnostics && !this.disposed && !this.live.has(uri.toString())) {
+                    this.collection.set(uri, diagnostics);
+                    published += 1;
+                }
+            }),
+        );
+        traceVerbose(`Published cached diagnostics for ${published} of ${uris.length} documents`);
+    }
+
+    public dispose(): void {
+        this.disposed = true;
+        this.collection.dispose();
+    }
+
+    private async store(uri: Uri, diagnostics: Diagnostic[]): Promise<void> {
+        const key = await this.getKey(uri);
+        if (key) {
+            await _cache?.set(key, diagnostics);
+        }
+    }
+
+    private async getKey(uri: Uri): Promise<string | undefined> {
+        const configHash = await this.configHash;
+        if (!configHash || uri.scheme !== 'file') {
+            return undefined;
+        }
+        try {
+            return hash(configHash, uri.toString(), await fs.readFile(uri.fsPath));
+        } catch {
+            return undefined;
+        }
+    }
+}
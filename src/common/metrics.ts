@@ -0,0 +1,211 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { Disposable, StatusBarAlignment, StatusBarItem, window, workspace } from 'vscode';
+import { WorkspaceDiagnosticRequest } from 'vscode-languageclient';
+import { Middleware } from 'vscode-languageclient/node';
+
+// Latency percentiles are computed over this many of the most recent samples.
+const MAX_SAMPLES = 1000;
+
+// Milliseconds between status bar refreshes.
+const STATUS_INTERVAL = 1000;
+
+export interface IHistogramSummary {
+    count: number;
+    p50?: number;
+    p95?: number;
+    p99?: number;
+    max?: number;
+}
+
+class Histogram {
+    private readonly samples: number[] = [];
+    private next = 0;
+    private count = 0;
+
+    public record(ms: number): void {
+        if (this.samples.length < MAX_SAMPLES) {
+            this.samples.push(ms);
+        } else {
+            this.samples[this.next] = ms;
+        }
+        this.next = (this.next + 1) % MAX_SAMPLES;
+        this.count += 1;
+    }
+
+    public percentile(pct: number): number | undefined {
+        if (this.samples.length === 0) {
+            return undefined;
+        }
+        const ordered = [...this.samples].sort((a, b) => a - b);
+        return ordered[Math.max(Math.ceil((pct / 100) * ordered.length), 1) - 1];
+    }
+
+    public summarize(): IHistogramSummary {
+        return {
+            count: this.count,
+            p50: this.percentile(50),
+            p95: this.percentile(95),
+            p99: this.percentile(99),
+            max: this.samples.length > 0 ? Math.max(...this.samples) : undefined,
+        };
+    }
+}
+
+function getMethod(type: string | { method: string }): string {
+    return typeof type === 'string' ? type : type.method;
+}
+
+/** Request, notification, diagnostics and restart statistics for every running server. */
+class ServerMetrics {
+    private readonly requests = new Map<string, { errors: number; latency: Histogram }>();
+    private readonly notifications = new Map<string, number>();
+    private readonly diagnostics = new Histogram();
+    private readonly restarts = new Histogram();
+    // Time of the earliest open or save of each document not yet followed by diagnostics. tach
+    // only checks documents when they are opened or saved, so edits in between aren't timed.
+    private readonly awaitingDiagnostics = new Map<string, number>();
+    private inFlight = 0;
+    private readonly diagnosticsUpdates = { applied: 0, suppressed: 0 };
+    private readonly started = Date.now();
+    public changed = false;
+
+    public readonly middleware: Middleware = {
+        sendRequest: async (type, param, token, next) => {
+            const method = getMethod(type);
+            if (method === WorkspaceDiagnosticRequest.method) {
+                // A long poll the server holds open until diagnostics change, so it would show as
+                // always in flight and its duration says nothing about latency.
+                return next(type, param, token);
+            }
+            const stats = this.requests.get(method) ?? { errors: 0, latency: new Histogram() };
+            this.requests.set(method, stats);
+            const start = Date.now();
+            this.inFlight += 1;
+            this.changed = true;
+            try {
+                return await next(type, param, token);
+            } catch (ex) {
+                stats.errors += 1;
+                throw ex;
+            } finally {
+                this.inFlight -= 1;
+                stats.latency.record(Date.now() - start);
+            }
+        },
+        sendNotification: (type, next, params) => {
+            const method = getMethod(type);
+            this.notifications.set(method, (this.notifications.get(method) ?? 0) + 1);
+            return next(type, params);
+        },
+        didOpen: (document, next) => {
+            this.expectDiagnostics(document.uri.toString());
+            return next(document);
+        },
+        didSave: (document, next) => {
+            this.expectDiagnostics(document.uri.toString());
+            return next(document);
+        },
+        didClose: (document, next) => {
+            this.awaitingDiagnostics.delete(document.uri.toString());
+            return next(document);
+        },
+        handleDiagnostics: (uri, diagnostics, next) => {
+            const start = this.awaitingDiagnostics.get(uri.toString());
+            if (start !== undefined) {
+                this.awaitingDiagnostics.delete(uri.toString());
+                this.diagnostics.record(Date.now() - start);
+                this.changed = true;
+            }
+            next(uri, diagnostics);
+        },
+    };
+
+    public get pending(): number {
+        return this.inFlight;
+    }
+
+    public get diagnosticsP95(): number | undefined {
+        return this.diagnostics.percentile(95);
+    }
+
+    public recordRestart(ms: number): void {
+        this.restarts.record(ms);
+        this.changed = true;
+    }
+
+    public countDiagnosticsUpdate(applied: boolean): void {
+        this.diagnosticsUpdates[applied ? 'applied' : 'suppressed'] += 1;
+    }
+
+    public toJSON(): object {
+        return {
+            uptimeMs: Date.now() - this.started,
+            inFlightRequests: this.inFlight,
+            diagnosticsLatencyMs: this.diagnostics.summarize(),
+            diagnosticsUpdates: this.diagnosticsUpdates,
+            restartDurationMs: this.restarts.summarize(),
+            requests: Object.fromEntries(
+                [...this.requests].map(([method, stats]) => [
+                    method,
+                    { errors: stats.errors, latencyMs: stats.latency.summarize() },
+                ]),
+            ),
+            notifications: Object.fromEntries(this.notifications),
+        };
+    }
+
+    private expectDiagnostics(key: string): void {
+        if (!this.awaitingDiagnostics.has(key)) {
+            this.awaitingDiagnostics.set(key, Date.now());
+        }
+    }
+}
+
+const _metrics = new ServerMetrics();
+
+export function getMetricsMiddleware(): Middleware {
+    return _metrics.middleware;
+}
+
+export function recordRestart(ms: number): void {
+    _metrics.recordRestart(ms);
+}
+
+/** Counts a diagnostics update that was applied, or suppressed as a duplicate. */
+export function countDiagnosticsUpdate(applied: boolean): void {
+    _metrics.countDiagnosticsUpdate(applied);
+}
+
+function updateStatusBar(item: StatusBarItem): void {
+    if (!_metrics.changed) {
+        return;
+    }
+    _metrics.changed = false;
+    const p95 = _metrics.diagnosticsP95;
+    item.text = `$(pulse) tach ${p95 === undefined ? '-' : `${p95}ms`}`;
+    if (_metrics.pending > 0) {
+        item.text += ` $(loading~spin) ${_metrics.pending}`;
+    }
+    item.tooltip =
+        `tach: p95 time to diagnostics ${p95 === undefined ? 'not measured yet' : `${p95}ms`}, ` +
+        `${_metrics.pending} request(s) in flight. Click for a performance report.`;
+    item.show();
+}
+
+/** Shows server performance in the status bar once the first request or diagnostics are seen. */
+export function initializeMetrics(serverId: string): Disposable {
+    const item = window.createStatusBarItem(StatusBarAlignment.Right);
+    item.command = `${serverId}.showPerformanceReport`;
+    const timer = setInterval(() => updateStatusBar(item), STATUS_INTERVAL);
+    return Disposable.from(item, { dispose: () => clearInterval(timer) });
+}
+
+export async function showPerformanceReport(): Promise<void> {
+    const document = await workspace.openTextDocument({
+        language: 'json',
+        content: JSON.stringify(_metrics, null, 4),
+    });
+    await window.showTextDocument(document);
+}
@@ -0,0 +1,250 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { createHash } from 'crypto';
+import { Diagnostic, Disposable, Uri, window } from 'vscode';
+import { vsdiag } from 'vscode-languageclient';
+import { HandleDiagnosticsSignature, Middleware } from 'vscode-languageclient/node';
+import { traceVerbose } from './log/logging';
+import { countDiagnosticsUpdate } from './metrics';
+
+type Handler = (...args: unknown[]) => unknown;
+
+function chain(handlers: Handler[]): Handler {
+    return (...args: unknown[]) => {
+        const last = args.pop() as Handler;
+        const invoke = (index: number, params: unknown[]): unknown =>
+            index === handlers.length
+                ? last(...params)
+                : handlers[index](...params, (...nextParams: unknown[]) => invoke(index + 1, nextParams));
+        return invoke(0, args);
+    };
+}
+
+/**
+ * Combines middleware so each layer's `next` calls into the following layer, with the
+ * first layer seeing calls first. Handlers must take `next` as their last argument,
+ * except `sendNotification`, which is adapted to that shape.
+ */
+export function composeMiddleware(...layers: Middleware[]): Middleware {
+    const handlers = new Map<string, Handler[]>();
+    for (const layer of layers) {
+        for (const [key, value] of Object.entries(layer)) {
+            if (typeof value !== 'function') {
+                continue;
+            }
+            const fn = value as Handler;
+            const handler: Handler =
+                key === 'sendNotification' ? (type, params, next) => fn(type, next, params) : fn;
+            handlers.set(key, [...(handlers.get(key) ?? []), handler]);
+        }
+    }
+    const composed: Record<string, Handler> = {};
+    for (const [key, list] of handlers) {
+        const chained = chain(list);
+        composed[key] =
+            key === 'sendNotification' ? (type, next, params) => chained(type, params, next) : chained;
+    }
+    return composed as unknown as Middleware;
+}
+
+/**
+ * Holds back the diagnostics of a replacement server until it takes over from the
+ * server it replaces. `ready` resolves once every expected document has diagnostics.
+ */
+export class DiagnosticsGate {
+    public readonly ready: Promise<void>;
+    private readonly buffered = new Map<string, { uri: Uri; diagnostics: Diagnostic[] }>();
+    private readonly awaiting: Set<string>;
+    private isOpen = false;
+    private next: HandleDiagnosticsSignature | undefined;
+    private resolveReady: () => void = () => undefined;
+
+    constructor(expected: Uri[]) {
+        this.awaiting = new Set(expected.map((uri) => uri.toString()));
+        this.ready = new Promise((resolve) => {
+            this.resolveReady = resolve;
+        });
+        if (this.awaiting.size === 0) {
+            this.resolveReady();
+        }
+    }
+
+    public readonly middleware: Middleware = {
+        handleDiagnostics: (uri, diagnostics, next) => {
+            if (this.isOpen) {
+                next(uri, diagnostics);
+                return;
+            }
+            this.next = next;
+            this.buffered.set(uri.toString(), { uri, diagnostics });
+            this.awaiting.delete(uri.toString());
+            if (this.awaiting.size === 0) {
+                this.resolveReady();
+            }
+        },
+    };
+
+    /** Publishes everything buffered so far and lets later diagnostics through. */
+    public open(): void {
+        this.isOpen = true;
+        this.resolveReady();
+        for (const { uri, diagnostics } of this.buffered.values()) {
+            this.next?.(uri, diagnostics);
+        }
+        this.buffered.clear();
+    }
+}
+
+// Diagnostics arriving within one frame are applied together.
+const FRAME_MS = 16;
+
+export interface ISinkStats {
+    applied: number;
+    // Republishes identical to what is already shown, and updates superseded within a frame.
+    suppressed: number;
+}
+
+/** Returns a fingerprint of a diagnostic set; empty for no diagnostics. */
+function fingerprint(diagnostics: Diagnostic[]): string {
+    if (diagnostics.length === 0) {
+        return '';
+    }
+    const hash = createHash('sha1');
+    for (const d of diagnostics) {
+        const code = typeof d.code === 'object' ? d.code.value : d.code;
+        const { start, end } = d.range;
+        hash.update(
+            JSON.stringify([start.line, start.character, end.line, end.character, d.severity, code, d.source, d.message]),
+        );
+        hash.update(JSON.stringify(d.tags ?? []));
+        hash.update(JSON.stringify(d.relatedInformation?.map((r) => [r.location.uri.toString(), r.message]) ?? []));
+    }
+    return hash.digest('hex');
+}
+
+/**
+ * Drops republished diagnostics that are identical to the ones already shown, and applies
+ * the rest in one batch per frame so bursts don't churn the Problems panel.
+ */
+export class DiagnosticsSink implements Disposable {
+    public readonly stats: ISinkStats = { applied: 0, suppressed: 0 };
+    // Fingerprint of the diagnostics shown for each uri; uris without diagnostics are absent.
+    private readonly shown = new Map<string, string>();
+    private readonly queued = new Map<string, { uri: Uri; diagnostics: Diagnostic[]; fingerprint: string }>();
+    private next: HandleDiagnosticsSignature | undefined;
+    private timer: NodeJS.Timeout | undefined;
+
+    public readonly middleware: Middleware = {
+        handleDiagnostics: (uri, diagnostics, next) => {
+            const key = uri.toString();
+            const print = fingerprint(diagnostics);
+            const latest = this.queued.get(key)?.fingerprint ?? this.shown.get(key) ?? '';
+            if (print === latest) {
+                this.suppress();
+                return;
+            }
+            if (this.queued.has(key)) {
+                this.suppress();
+            }
+            this.next = next;
+            this.queued.set(key, { uri, diagnostics, fingerprint: print });
+            if (!this.timer) {
+                this.timer = setTimeout(() => this.flush(), FRAME_MS);
+            }
+        },
+    };
+
+    /** Forgets what is shown, for when the client has cleared its diagnostics. */
+    public reset(): void {
+        this.shown.clear();
+    }
+
+    public dispose(): void {
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = undefined;
+        }
+        this.queued.clear();
+        traceVerbose(`Diagnostics: ${this.stats.applied} update(s) applied, ${this.stats.suppressed} suppressed`);
+    }
+
+    private suppress(): void {
+        this.stats.suppressed += 1;
+        countDiagnosticsUpdate(false);
+    }
+
+    private flush(): void {
+        this.timer = undefined;
+        const queued = [...this.queued.entries()];
+        this.queued.clear();
+        for (const [key, { uri, diagnostics, fingerprint: print }] of queued) {
+            // An update can be undone within the frame.
+            if (print === (this.shown.get(key) ?? '')) {
+                this.suppress();
+                continue;
+            }
+            if (print) {
+                this.shown.set(key, print);
+            } else {
+                this.shown.delete(key);
+            }
+            this.stats.applied += 1;
+            countDiagnosticsUpdate(true);
+            this.next?.(uri, diagnostics);
+        }
+    }
+}
+
+/**
+ * Sends pulled diagnostics through the same pipeline as published ones, so they are gated,
+ * cached and deduplicated alike, and pulls the documents shown in an editor first.
+ */
+export class DiagnosticsPull {
+    // Pulls for documents shown in an editor that have not been answered yet.
+    private readonly visiblePulls = new Set<Promise<unknown>>();
+
+    constructor(
+        private readonly publish: (uri: Uri, diagnostics: Diagnostic[]) => void,
+        private readonly enabled: () => boolean,
+    ) {}
+
+    public readonly middleware: Middleware = {
+        provideDiagnostics: async (document, previousResultId, token, next) => {
+            if (!this.enabled()) {
+                return next(document, previousResultId, token);
+            }
+            const uri = document instanceof Uri ? document : document.uri;
+            const key = uri.toString();
+            const visible = window.visibleTextEditors.some((e) => e.document.uri.toString() === key);
+            if (!visible && this.visiblePulls.size > 0) {
+                await Promise.allSettled([...this.visiblePulls]);
+            }
+            const pending = Promise.resolve(next(document, previousResultId, token));
+            if (visible) {
+                this.visiblePulls.add(pending);
+                void pending.finally(() => this.visiblePulls.delete(pending)).catch(() => undefined);
+            }
+            const report = await pending;
+            return report ? this.forward(uri, report) : report;
+        },
+        provideWorkspaceDiagnostics: async (resultIds, token, resultReporter, next) => {
+            if (!this.enabled()) {
+                return next(resultIds, token, resultReporter);
+            }
+            const report = await next(resultIds, token, (chunk) =>
+                resultReporter(chunk && { items: chunk.items.map((item) => this.forward(item.uri, item)) }),
+            );
+            return report && { items: report.items.map((item) => this.forward(item.uri, item)) };
+        },
+    };
+
+    /** Publishes the items of a full report, leaving the client its result id and no items of its own. */
+    private forward<T extends vsdiag.DocumentDiagnosticReport>(uri: Uri, report: T): T {
+        if (report.kind !== vsdiag.DocumentDiagnosticReportKind.full) {
+            return report;
+        }
+        this.publish(uri, (report as vsdiag.FullDocumentDiagnosticReport).items);
+        return { ...report, items: [] };
+    }
+}
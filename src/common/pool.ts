@@ -0,0 +1,210 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { Disposable, LogOutputChannel, TextDocument, Uri, workspace, WorkspaceFolder } from 'vscode';
+import { LanguageClient } from 'vscode-languageclient/node';
+import { traceError, traceInfo } from './log/logging';
+import { isInTachProject, isUnder } from './rootIndex';
+import { RestartScheduler } from './scheduler';
+import { IServerRoot, restartServer, stopServer } from './server';
+import { getServerRoots } from './utilities';
+import { getConfiguration, getWorkspaceFolders } from './vscodeapi';
+
+// Seconds a folder's server is kept running after its last Python document closes.
+const DEFAULT_IDLE_TIMEOUT = 300;
+
+function rootKey(root: IServerRoot): string {
+    return root.folder.uri.toString();
+}
+
+function toRoots(folders: WorkspaceFolder[]): IServerRoot[] {
+    // Servers are scoped to their folder whenever there are other folders, tach roots or not.
+    const scoped = getWorkspaceFolders().length > 1;
+    return folders.map((folder) => ({ folder, scoped }));
+}
+
+function findRoot(roots: IServerRoot[], uri: Uri): IServerRoot | undefined {
+    if (roots.length === 1 && !roots[0].scoped) {
+        return roots[0];
+    }
+    if (uri.scheme !== 'file') {
+        return undefined;
+    }
+    // Prefer the innermost root when folders are nested.
+    return roots
+        .filter((root) => isUnder(uri.fsPath, root.folder.uri.fsPath))
+        .sort((a, b) => b.folder.uri.fsPath.length - a.folder.uri.fsPath.length)[0];
+}
+
+function hasOpenDocuments(roots: IServerRoot[], root: IServerRoot): boolean {
+    return workspace.textDocuments.some(
+        (d) => d.languageId === 'python' && !d.isClosed && isInTachProject(d.uri) && findRoot(roots, d.uri) === root,
+    );
+}
+
+/**
+ * Owns one server per project root. Servers start when the first Python document under
+ * their root opens and stop once no document has been open there for `tach.idleTimeout`.
+ */
+export class ServerPool implements Disposable {
+    private readonly clients = new Map<string, { root: IServerRoot; lsClient: LanguageClient }>();
+    private readonly idleTimers = new Map<string, NodeJS.Timeout>();
+    // Per-root chain of start/stop operations, so they never overlap for the same root.
+    private readonly pending = new Map<string, Promise<void>>();
+    // Restarts of a single root, e.g. when its tach.toml changes, leaving the other roots running.
+    private readonly rootSchedulers = new Map<string, RestartScheduler>();
+    private readonly disposables: Disposable[] = [];
+    private roots: IServerRoot[] = [];
+    private ready = false;
+
+    constructor(
+        private readonly serverId: string,
+        private readonly serverName: string,
+        private readonly outputChannel: LogOutputChannel,
+        scheduler: RestartScheduler,
+    ) {
+        this.disposables.push(
+            workspace.onDidOpenTextDocument((d) => this.onDidOpenTextDocument(d)),
+            workspace.onDidCloseTextDocument((d) => this.onDidCloseTextDocument(d)),
+            workspace.onDidChangeWorkspaceFolders(() => scheduler.schedule('workspace folders changed')),
+        );
+    }
+
+    public get running(): LanguageClient[] {
+        return [...this.clients.values()].map((c) => c.lsClient);
+    }
+
+    /**
+     * Restarts the servers that are running or have open documents, and stops servers
+     * whose folder no longer has a tach config.
+     */
+    public async restart(isStale: () => boolean = () => false): Promise<void> {
+        this.ready = true;
+        this.roots = toRoots(await getServerRoots());
+
+        const keys = new Set(this.roots.map(rootKey));
+        for (const key of this.clients.keys()) {
+            if (!keys.has(key)) {
+                await this.enqueue(key, () => this.stop(key));
+            }
+        }
+        await Promise.all(
+            this.roots
+                .filter((root) => this.clients.has(rootKey(root)) || hasOpenDocuments(this.roots, root))
+                .map((root) => this.enqueue(rootKey(root), () => this.start(root, isStale))),
+        );
+    }
+
+    /** Returns the folders whose server starts right away, those with an open tach document. */
+    public async getActiveFolders(): Promise<WorkspaceFolder[]> {
+        const roots = toRoots(await getServerRoots());
+        return roots.filter((root) => hasOpenDocuments(roots, root)).map((root) => root.folder);
+    }
+
+    public async stopAll(): Promise<void> {
+        await Promise.all([...this.clients.keys()].map((key) => this.enqueue(key, () => this.stop(key))));
+    }
+
+    public dispose(): void {
+        this.idleTimers.forEach((timer) => clearTimeout(timer));
+        this.idleTimers.clear();
+        this.rootSchedulers.forEach((scheduler) => scheduler.dispose());
+        this.rootSchedulers.clear();
+        this.disposables.forEach((d) => d.dispose());
+    }
+
+    private onDidOpenTextDocument(document: TextDocument): void {
+        if (!this.ready || document.languageId !== 'python' || !isInTachProject(document.uri)) {
+            return;
+        }
+        const root = findRoot(this.roots, document.uri);
+        if (!root) {
+            return;
+        }
+        const key = rootKey(root);
+        clearTimeout(this.idleTimers.get(key));
+        this.idleTimers.delete(key);
+        if (!this.clients.has(key) && !this.pending.has(key)) {
+            traceInfo(`Server: Starting for ${root.folder.uri.fsPath} on first open document`);
+            void this.enqueue(key, () => this.start(root));
+        }
+    }
+
+    private onDidCloseTextDocument(document: TextDocument): void {
+        const root = findRoot(this.roots, document.uri);
+        if (!root || !this.clients.has(rootKey(root)) || hasOpenDocuments(this.roots, root)) {
+            return;
+        }
+        const timeout = getConfiguration(this.serverId).get<number>('idleTimeout') ?? DEFAULT_IDLE_TIMEOUT;
+        if (timeout <= 0) {
+            return;
+        }
+        const key = rootKey(root);
+        clearTimeout(this.idleTimers.get(key));
+        this.idleTimers.set(
+            key,
+            setTimeout(() => {
+                this.idleTimers.delete(key);
+                if (!hasOpenDocuments(this.roots, root)) {
+                    traceInfo(`Server: Stopping idle server for ${root.folder.uri.fsPath}`);
+                    void this.enqueue(key, () => this.stop(key));
+                }
+            }, timeout * 1000),
+        );
+    }
+
+    private enqueue(key: string, operation: () => Promise<void>): Promise<void> {
+        const next = (this.pending.get(key) ?? Promise.resolve()).then(operation).catch((ex) => {
+            traceError(`Server: Operation for ${key} failed: ${ex}`);
+        });
+        this.pending.set(key, next);
+        return next.finally(() => {
+            if (this.pending.get(key) === next) {
+                this.pending.delete(key);
+            }
+        });
+    }
+
+    private async start(root: IServerRoot, isStale?: () => boolean): Promise<void> {
+        const key = rootKey(root);
+        const lsClient = await restartServer(
+            this.serverId,
+            this.serverName,
+            this.outputChannel,
+            this.rootScheduler(key),
+            root,
+            this.clients.get(key)?.lsClient,
+            isStale,
+        );
+        if (lsClient) {
+            this.clients.set(key, { root, lsClient });
+        } else {
+            this.clients.delete(key);
+        }
+    }
+
+    private rootScheduler(key: string): RestartScheduler {
+        let scheduler = this.rootSchedulers.get(key);
+        if (!scheduler) {
+            scheduler = new RestartScheduler(async (isStale) => {
+                const root = this.roots.find((r) => rootKey(r) === key);
+                // A server stopped in the meantime starts fresh with its next document.
+                if (root && this.clients.has(key)) {
+                    await this.enqueue(key, () => this.start(root, isStale));
+                }
+            });
+            this.rootSchedulers.set(key, scheduler);
+        }
+        return scheduler;
+    }
+
+    private async stop(key: string): Promise<void> {
+        const entry = this.clients.get(key);
+        this.clients.delete(key);
+        this.rootSchedulers.get(key)?.dispose();
+        this.rootSchedulers.delete(key);
+        if (entry) {
+            await stopServer(entry.root, entry.lsClient);
+        }
+    }
+}
@@ -0,0 +1,114 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { ChildProcess, spawn } from 'child_process';
+import { Disposable, Memento, WorkspaceFolder } from 'vscode';
+import { traceInfo, traceVerbose } from './log/logging';
+import { markPhase } from './startup';
+
+const LAUNCH_KEY = 'tach.lastLaunch';
+
+// How long a server started ahead of its settings waits to be claimed before it is stopped.
+const PRELAUNCH_TIMEOUT = 30000;
+
+export interface IServerLaunch {
+    command: string;
+    args: string[];
+    cwd: string;
+    // Variables set on top of the extension host's environment.
+    env: Record<string, string>;
+}
+
+interface IPrelaunched {
+    key: string;
+    child: ChildProcess;
+    timer: NodeJS.Timeout;
+}
+
+let _memento: Memento | undefined;
+
+// Servers started from the last launch that worked, per workspace folder uri.
+const _prelaunched = new Map<string, IPrelaunched>();
+
+function launchKey(launch: IServerLaunch | undefined): string {
+    return JSON.stringify(launch ? [launch.command, ...launch.args, launch.cwd, launch.env] : null);
+}
+
+function discard(folderKey: string): void {
+    const entry = _prelaunched.get(folderKey);
+    if (entry) {
+        _prelaunched.delete(folderKey);
+        clearTimeout(entry.timer);
+        entry.child.kill();
+    }
+}
+
+export function spawnServer(launch: IServerLaunch): ChildProcess {
+    return spawn(launch.command, launch.args, { cwd: launch.cwd, env: { ...process.env, ...launch.env } });
+}
+
+export function initializePrelaunch(memento: Memento): Disposable {
+    _memento = memento;
+    return new Disposable(() => discardPrelaunched());
+}
+
+/**
+ * Starts the server `folder` last ran successfully, so it can import and load the project
+ * while the Python extension, the interpreter and the settings are still being resolved.
+ */
+export function prelaunchServer(folder: WorkspaceFolder): void {
+    const folderKey = folder.uri.toString();
+    const launch = _memento?.get<Record<string, IServerLaunch>>(LAUNCH_KEY)?.[folderKey];
+    if (!launch || _prelaunched.has(folderKey)) {
+        return;
+    }
+    const child = spawnServer(launch);
+    child.on('error', (ex) => {
+        traceVerbose(`Server: Prelaunch failed for ${folder.uri.fsPath}: ${ex}`);
+        if (_prelaunched.get(folderKey)?.child === child) {
+            discard(folderKey);
+        }
+    });
+    const timer = setTimeout(() => {
+        traceInfo(`Server: Stopping the prelaunched server for ${folder.uri.fsPath}, it was not claimed`);
+        discard(folderKey);
+    }, PRELAUNCH_TIMEOUT);
+    _prelaunched.set(folderKey, { key: launchKey(launch), child, timer });
+    traceInfo(`Server: Prelaunched ${[launch.command, ...launch.args].join(' ')} for ${folder.uri.fsPath}`);
+    markPhase('prelaunched');
+}
+
+/** Stops the prelaunched servers, e.g. when the interpreter turns out to be unusable. */
+export function discardPrelaunched(): void {
+    [..._prelaunched.keys()].forEach(discard);
+}
+
+/**
+ * Returns the prelaunched server of `folder` when it was started with the same `launch`
+ * the resolved settings ask for. A server started with anything else is stopped.
+ */
+export function claimPrelaunched(folder: WorkspaceFolder, launch: IServerLaunch): ChildProcess | undefined {
+    const folderKey = folder.uri.toString();
+    const entry = _prelaunched.get(folderKey);
+    if (!entry) {
+        return undefined;
+    }
+    _prelaunched.delete(folderKey);
+    clearTimeout(entry.timer);
+    if (entry.key !== launchKey(launch) || entry.child.exitCode !== null || entry.child.signalCode !== null) {
+        traceInfo(`Server: The prelaunched server for ${folder.uri.fsPath} is out of date, stopping it`);
+        entry.child.kill();
+        return undefined;
+    }
+    traceVerbose(`Server: Using the prelaunched server for ${folder.uri.fsPath}`);
+    return entry.child;
+}
+
+/** Saves `launch` as the one to prelaunch for `folder` next time. */
+export async function rememberLaunch(folder: WorkspaceFolder, launch: IServerLaunch): Promise<void> {
+    const folderKey = folder.uri.toString();
+    const saved = _memento?.get<Record<string, IServerLaunch>>(LAUNCH_KEY) ?? {};
+    if (launchKey(saved[folderKey]) !== launchKey(launch)) {
+        await _memento?.update(LAUNCH_KEY, { ...saved, [folderKey]: launch });
+    }
+}
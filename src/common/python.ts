@@ -4,7 +4,7 @@
 /* eslint-disable @typescript-eslint/naming-convention */
 import { commands, Disposable, Event, EventEmitter, Uri } from 'vscode';
 import { traceError, traceLog } from './log/logging';
-import { PythonExtension, ResolvedEnvironment } from '@vscode/python-extension';
+import { EnvironmentPath, PythonExtension, ResolvedEnvironment } from '@vscode/python-extension';
 
 export interface IInterpreterDetails {
     path?: string[];
@@ -23,6 +23,24 @@ async function getPythonExtensionAPI(): Promise<PythonExtension | undefined> {
     return _api;
 }
 
+// Resolving an environment can spawn the interpreter, so results are kept until the
+// active interpreter or the extension settings change.
+const _resolved = new Map<string, Promise<ResolvedEnvironment | undefined>>();
+function resolveEnvironment(api: PythonExtension, environment: EnvironmentPath | string) {
+    const key = typeof environment === 'string' ? environment : environment.path;
+    let resolved = _resolved.get(key);
+    if (!resolved) {
+        resolved = api.environments.resolveEnvironment(environment);
+        resolved.catch(() => _resolved.delete(key));
+        _resolved.set(key, resolved);
+    }
+    return resolved;
+}
+
+export function clearInterpreterCache(): void {
+    _resolved.clear();
+}
+
 export async function initializePython(disposables: Disposable[]): Promise<void> {
     try {
         const api = await getPythonExtensionAPI();
@@ -30,6 +48,7 @@ export async function initializePython(disposables: Disposable[]): Promise<void>
         if (api) {
             disposables.push(
                 api.environments.onDidChangeActiveEnvironmentPath((e) => {
+                    clearInterpreterCache();
                     onDidChangePythonInterpreterEvent.fire({ path: [e.path], resource: e.resource?.uri });
                 }),
             );
@@ -44,14 +63,14 @@ export async function initializePython(disposables: Disposable[]): Promise<void>
 
 export async function resolveInterpreter(interpreter: string[]): Promise<ResolvedEnvironment | undefined> {
     const api = await getPythonExtensionAPI();
-    return api?.environments.resolveEnvironment(interpreter[0]);
+    return api ? resolveEnvironment(api, interpreter[0]) : undefined;
 }
 
 export async function getInterpreterDetails(resource?: Uri): Promise<IInterpreterDetails> {
     const api = await getPythonExtensionAPI();
-    const environment = await api?.environments.resolveEnvironment(
-        api?.environments.getActiveEnvironmentPath(resource),
-    );
+    const environment = api
+        ? await resolveEnvironment(api, api.environments.getActiveEnvironmentPath(resource))
+        : undefined;
     if (environment?.executable.uri && checkVersion(environment)) {
         return { path: [environment?.executable.uri.fsPath], resource };
     }
@@ -0,0 +1,95 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { ChildProcess } from 'child_process';
+import * as fs from 'fs-extra';
+import * as os from 'os';
+import * as path from 'path';
+import { Transform, TransformCallback } from 'stream';
+import { Uri } from 'vscode';
+import { StreamInfo } from 'vscode-languageclient/node';
+import * as zlib from 'zlib';
+import { traceInfo, traceLog } from './log/logging';
+
+// Bump when the trace layout changes; lsp_test_client.replay checks it.
+const TRACE_FORMAT = 1;
+
+type Direction = 'c' | 's';
+
+let _traceDir: string | undefined;
+
+export function initializeRecorder(logUri: Uri): void {
+    _traceDir = logUri.fsPath;
+}
+
+/** Passes a JSON-RPC stream through unchanged, reporting the body of each message. */
+class MessageTap extends Transform {
+    private buffer = Buffer.alloc(0);
+
+    constructor(private readonly onMessage: (body: string) => void) {
+        super();
+    }
+
+    public _transform(chunk: Buffer, _encoding: BufferEncoding, callback: TransformCallback): void {
+        this.buffer = Buffer.concat([this.buffer, chunk]);
+        for (;;) {
+            const headerEnd = this.buffer.indexOf('\r\n\r\n');
+            if (headerEnd < 0) {
+                break;
+            }
+            const match = /Content-Length:\s*(\d+)/i.exec(this.buffer.subarray(0, headerEnd).toString('ascii'));
+            const start = headerEnd + 4;
+            const end = start + (match ? parseInt(match[1], 10) : 0);
+            if (this.buffer.length < end) {
+                break;
+            }
+            this.onMessage(this.buffer.subarray(start, end).toString('utf8'));
+            this.buffer = this.buffer.subarray(end);
+        }
+        callback(null, chunk);
+    }
+}
+
+/**
+ * Writes a gzipped JSON lines trace: a header line, then one line per message with its
+ * direction (`c` client to server, `s` server to client) and milliseconds since start.
+ */
+class TraceWriter {
+    private readonly gzip = zlib.createGzip();
+    private readonly start = process.hrtime.bigint();
+
+    constructor(file: string, root: Uri, command: string[]) {
+        this.gzip.pipe(fs.createWriteStream(file));
+        const header = { format: TRACE_FORMAT, root: root.toString(), command, started: new Date().toISOString() };
+        this.gzip.write(`${JSON.stringify(header)}\n`);
+    }
+
+    public write(direction: Direction, body: string): void {
+        const t = (Number(process.hrtime.bigint() - this.start) / 1e6).toFixed(3);
+        // Newlines in a JSON body can only be whitespace, so the message stays on one line.
+        this.gzip.write(`{"t":${t},"d":"${direction}","m":${body.replace(/\r?\n/g, ' ')}}\n`);
+    }
+
+    public end(): void {
+        this.gzip.end();
+    }
+}
+
+/** Records every message exchanged with a spawned server to the extension's log directory. */
+export async function recordServer(child: ChildProcess, command: string[], root: Uri): Promise<StreamInfo> {
+    const dir = _traceDir ?? os.tmpdir();
+    await fs.ensureDir(dir);
+    const file = path.join(dir, `tach-trace-${new Date().toISOString().replace(/[:.]/g, '-')}.jsonl.gz`);
+    const trace = new TraceWriter(file, root, command);
+
+    if (!child.stdin || !child.stdout) {
+        throw new Error('Server process has no stdio pipes');
+    }
+    child.stderr?.on('data', (data: Buffer) => traceLog(data.toString().trimEnd()));
+    child.on('exit', () => trace.end());
+    traceInfo(`Server: Recording LSP trace to ${file}`);
+
+    const writer = new MessageTap((body) => trace.write('c', body));
+    writer.pipe(child.stdin);
+    return { reader: child.stdout.pipe(new MessageTap((body) => trace.write('s', body))), writer };
+}
@@ -0,0 +1,163 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import * as fs from 'fs-extra';
+import * as path from 'path';
+import { Disposable, Event, EventEmitter, Memento, RelativePattern, Uri, workspace, WorkspaceFolder } from 'vscode';
+import { traceError, traceInfo, traceVerbose } from './log/logging';
+import { getWorkspaceFolders } from './vscodeapi';
+
+const INDEX_KEY = 'tach.rootIndex';
+
+const CONFIG_GLOB = '**/{tach.toml,tach.domain.toml,pyproject.toml}';
+
+// Environments and tool caches that can sit inside a project but never hold its files.
+export const SKIPPED_DIRS = '**/{.git,.venv,venv,.tox,.nox,.mypy_cache,__pycache__,node_modules,site-packages}/**';
+
+// Files that make their directory the root of a tach project.
+const PROJECT_FILES = new Set(['tach.toml', 'pyproject.toml']);
+
+async function isTachConfig(file: string): Promise<boolean> {
+    if (path.basename(file) !== 'pyproject.toml') {
+        return true;
+    }
+    try {
+        return /^\[tool\.tach\]/m.test(await fs.readFile(file, 'utf-8'));
+    } catch {
+        return false;
+    }
+}
+
+/** Returns whether `file` is `dir` or inside it. */
+export function isUnder(file: string, dir: string): boolean {
+    const relative = path.relative(dir, file);
+    return relative === '' || (!relative.startsWith('..') && !path.isAbsolute(relative));
+}
+
+/**
+ * Locations of tach config files in each workspace folder. The index is saved in the
+ * workspace state so it is available as soon as the extension activates, then verified
+ * against the file system and kept up to date from file events.
+ */
+class TachRootIndex implements Disposable {
+    // Config file paths per workspace folder uri.
+    private index = new Map<string, Set<string>>();
+    private readonly changed = new EventEmitter<void>();
+    private readonly disposables: Disposable[] = [];
+
+    public readonly onDidChange: Event<void> = this.changed.event;
+
+    constructor(private readonly memento: Memento) {
+        const saved = memento.get<Record<string, string[]>>(INDEX_KEY) ?? {};
+        for (const [folder, files] of Object.entries(saved)) {
+            this.index.set(folder, new Set(files));
+        }
+        const watcher = workspace.createFileSystemWatcher(CONFIG_GLOB);
+        this.disposables.push(
+            watcher,
+            watcher.onDidCreate((uri) => void this.update(uri)),
+            watcher.onDidChange((uri) => void this.update(uri)),
+            watcher.onDidDelete((uri) => void this.update(uri, false)),
+            workspace.onDidChangeWorkspaceFolders(() => void this.refresh()),
+            this.changed,
+        );
+    }
+
+    /** Directories holding a tach.toml, or a pyproject.toml with a [tool.tach] section. */
+    public get projectRoots(): string[] {
+        const roots = new Set<string>();
+        for (const files of this.index.values()) {
+            for (const file of files) {
+                if (PROJECT_FILES.has(path.basename(file))) {
+                    roots.add(path.dirname(file));
+                }
+            }
+        }
+        return [...roots];
+    }
+
+    public contains(uri: Uri): boolean {
+        return uri.scheme === 'file' && this.projectRoots.some((root) => isUnder(uri.fsPath, root));
+    }
+
+    public hasProject(folder: WorkspaceFolder): boolean {
+        return this.projectRoots.some((root) => isUnder(root, folder.uri.fsPath));
+    }
+
+    /** Rebuilds the index from a search of every workspace folder. */
+    public async refresh(): Promise<void> {
+        const start = Date.now();
+        const index = new Map<string, Set<string>>();
+        for (const folder of getWorkspaceFolders()) {
+            const uris = await workspace.findFiles(new RelativePattern(folder, CONFIG_GLOB), SKIPPED_DIRS);
+            const files = new Set<string>();
+            for (const uri of uris) {
+                if (await isTachConfig(uri.fsPath)) {
+                    files.add(uri.fsPath);
+                }
+            }
+            index.set(folder.uri.toString(), files);
+        }
+        traceVerbose(`Root index: Indexed ${getWorkspaceFolders().length} folder(s) in ${Date.now() - start}ms`);
+        const before = this.projectRoots.sort().join('\n');
+        this.index = index;
+        await this.save(before);
+    }
+
+    public dispose(): void {
+        this.disposables.forEach((d) => d.dispose());
+    }
+
+    private async update(uri: Uri, exists = true): Promise<void> {
+        const folder = workspace.getWorkspaceFolder(uri);
+        if (!folder) {
+            return;
+        }
+        const key = folder.uri.toString();
+        const files = this.index.get(key) ?? new Set<string>();
+        const before = this.projectRoots.sort().join('\n');
+        if (exists && (await isTachConfig(uri.fsPath))) {
+            files.add(uri.fsPath);
+        } else {
+            files.delete(uri.fsPath);
+        }
+        this.index.set(key, files);
+        await this.save(before);
+    }
+
+    private async save(before: string): Promise<void> {
+        const saved: Record<string, string[]> = {};
+        this.index.forEach((files, folder) => (saved[folder] = [...files]));
+        try {
+            await this.memento.update(INDEX_KEY, saved);
+        } catch (ex) {
+            traceError(`Root index: Failed to save: ${ex}`);
+        }
+        if (this.projectRoots.sort().join('\n') !== before) {
+            traceInfo(`Root index: tach projects are now ${this.projectRoots.join(', ') || 'none'}`);
+            this.changed.fire();
+        }
+    }
+}
+
+let _index: TachRootIndex | undefined;
+
+export function initializeRootIndex(memento: Memento): Disposable {
+    _index = new TachRootIndex(memento);
+    void _index.refresh();
+    return _index;
+}
+
+/** Whether `uri` is inside an indexed tach project. */
+export function isInTachProject(uri: Uri): boolean {
+    return _index?.contains(uri) ?? false;
+}
+
+/** Whether a tach project is indexed anywhere inside `folder`. */
+export function hasTachProject(folder: WorkspaceFolder): boolean {
+    return _index?.hasProject(folder) ?? false;
+}
+
+export function onDidChangeTachProjects(listener: () => void): Disposable {
+    return _index?.onDidChange(listener) ?? new Disposable(() => undefined);
+}
@@ -0,0 +1,73 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { Disposable } from 'vscode';
+import { traceError, traceInfo, traceVerbose } from './log/logging';
+
+// Bursts of events closer together than this are merged into a single restart.
+const DEFAULT_RESTART_DELAY = 250;
+
+export type RestartTask = (isStale: () => boolean) => Promise<void>;
+
+/**
+ * Serializes server restarts. Requests arriving within `delay` of each other are merged,
+ * only one restart runs at a time, and a restart that is superseded by a newer request
+ * is told it is stale so it can bail out instead of starting a server nobody wants.
+ */
+export class RestartScheduler implements Disposable {
+    private timer: NodeJS.Timeout | undefined;
+    private reasons: string[] = [];
+    private running: Promise<void> = Promise.resolve();
+    private generation = 0;
+
+    constructor(
+        private readonly task: RestartTask,
+        private readonly delay: number = DEFAULT_RESTART_DELAY,
+    ) {}
+
+    public schedule(reason: string): void {
+        this.reasons.push(reason);
+        this.generation += 1;
+        if (this.timer) {
+            clearTimeout(this.timer);
+        }
+        this.timer = setTimeout(() => this.flush(), this.delay);
+    }
+
+    /** Resolves once every restart scheduled so far has finished. */
+    public async whenIdle(): Promise<void> {
+        while (this.timer || this.reasons.length > 0) {
+            await new Promise((resolve) => setTimeout(resolve, this.delay));
+        }
+        await this.running;
+    }
+
+    public dispose(): void {
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = undefined;
+        }
+        this.reasons = [];
+        this.generation += 1;
+    }
+
+    private flush(): void {
+        this.timer = undefined;
+        const generation = this.generation;
+        this.running = this.running.then(async () => {
+            if (generation !== this.generation || this.reasons.length === 0) {
+                traceVerbose(`Server: Skipping superseded restart`);
+                return;
+            }
+            const reasons = this.reasons;
+            this.reasons = [];
+            const unique = [...new Set(reasons)];
+            traceInfo(`Server: Restarting for ${reasons.length} merged event(s): ${unique.join(', ')}`);
+            try {
+                await this.task(() => generation !== this.generation);
+            } catch (ex) {
+                traceError(`Server: Restart failed: ${ex}`);
+            }
+        });
+    }
+}
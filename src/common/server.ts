@@ -1,24 +1,75 @@
 // Copyright (c) Microsoft Corporation. All rights reserved.
 // Licensed under the MIT License.
 
-import { Disposable, env, LogOutputChannel, workspace } from 'vscode';
-import { State } from 'vscode-languageclient';
+import * as fs from 'fs-extra';
+import {
+    CancellationTokenSource,
+    Disposable,
+    env,
+    languages,
+    LogOutputChannel,
+    Uri,
+    workspace,
+    WorkspaceFolder,
+} from 'vscode';
+import {
+    DidChangeConfigurationNotification,
+    DidChangeWatchedFilesNotification,
+    DocumentDiagnosticReportKind,
+    DocumentDiagnosticRequest,
+    FileChangeType,
+    State,
+} from 'vscode-languageclient';
 import {
     LanguageClient,
     LanguageClientOptions,
+    Middleware,
     RevealOutputChannelOn,
     ServerOptions,
 } from 'vscode-languageclient/node';
+import { getCachedTachVersion } from './cache';
 import { BUNDLED_PYTHON_LIBS_DIR } from './constants';
-import { traceError, traceInfo, traceVerbose } from './log/logging';
+import { ConfigWatcher } from './configWatcher';
+import { connectToDaemon, getDaemonSocket } from './daemon';
+import { CachedDiagnostics, getConfigHash } from './diagnosticsCache';
+import { traceError, traceInfo, traceVerbose, traceWarn } from './log/logging';
+import { getMetricsMiddleware, recordRestart } from './metrics';
+import { composeMiddleware, DiagnosticsGate, DiagnosticsPull, DiagnosticsSink } from './middleware';
 import { getExtensionSettings, getGlobalSettings, getWorkspaceSettings, ISettings } from './settings';
-import { getLSClientTraceLevel, getProjectRoot } from './utilities';
-import { isVirtualWorkspace } from './vscodeapi';
-import { execFile } from 'child_process';
+import { getLSClientTraceLevel } from './utilities';
+import { recordServer } from './recorder';
+import { claimPrelaunched, IServerLaunch, rememberLaunch, spawnServer } from './prelaunch';
+import { markPhase, startupMiddleware } from './startup';
+import { RestartScheduler } from './scheduler';
+import { ChangeThrottle } from './throttle';
+import { ServerWatchdog } from './watchdog';
+import { WorkspaceCheck } from './workspaceCheck';
+import { getConfiguration, isVirtualWorkspace } from './vscodeapi';
+import { ChildProcess, execFile } from 'child_process';
 import { supportsCustomConfig, VersionInfo } from './version';
 
 export type IInitOptions = { settings: ISettings[]; globalSettings: ISettings };
 
+export type RestartStrategy = 'restart' | 'swap';
+
+// How long a replacement server may take to publish diagnostics before it is swapped in anyway.
+const SWAP_TIMEOUT = 30000;
+
+// Milliseconds to wait for typing to pause before forwarding document changes.
+const DEFAULT_CHANGE_DEBOUNCE = 500;
+
+// Seconds between samples of the server's memory and CPU use.
+const DEFAULT_WATCHDOG_INTERVAL = 30;
+
+// Seconds a shared server keeps running without a window connected.
+const DEFAULT_DAEMON_IDLE_TIMEOUT = 300;
+
+export interface IServerRoot {
+    folder: WorkspaceFolder;
+    // When set, the server only receives documents under `folder`.
+    scoped: boolean;
+}
+
 function executeCommand(file: string, args: string[] = []): Promise<string> {
     return new Promise((resolve, reject) => {
       execFile(file, args, (error, stdout, stderr) => {
@@ -31,35 +82,77 @@ function executeCommand(file: string, args: string[] = []): Promise<string> {
     });
 }
 
-async function getTachVersion(pythonExecutable: string): Promise<VersionInfo> {
+async function probeTachVersion(pythonExecutable: string): Promise<VersionInfo> {
     const stdout = await executeCommand(pythonExecutable, ["-m", "tach", "--version"]);
-    const version = stdout.trim().split(" ")[1];
-    const [major, minor, patch] = version.split(".").map((x) => parseInt(x, 10));
-    return new VersionInfo(major, minor, patch);
-  }
+    return VersionInfo.parse(stdout.trim().split(" ")[1]);
+}
 
-async function createServer(
-    settings: ISettings,
-    serverId: string,
-    serverName: string,
-    outputChannel: LogOutputChannel,
-    initializationOptions: IInitOptions,
-): Promise<LanguageClient> {
-    const command = settings.interpreter[0];
-    const cwd = settings.cwd;
-    const newEnv = { ...process.env };
+// Version lookups in flight, shared so that concurrent restarts probe each interpreter once.
+const _versions = new Map<string, Promise<VersionInfo>>();
 
-    newEnv.LS_IMPORT_STRATEGY = settings.importStrategy;
+function getTachVersion(pythonExecutable: string): Promise<VersionInfo> {
+    let version = _versions.get(pythonExecutable);
+    if (!version) {
+        version = getCachedTachVersion(pythonExecutable, probeTachVersion);
+        const forget = () => _versions.delete(pythonExecutable);
+        version.then(forget, forget);
+        _versions.set(pythonExecutable, version);
+    }
+    return version;
+}
 
-    if (settings.importStrategy === 'useBundled') {
-        newEnv.PYTHONPATH = BUNDLED_PYTHON_LIBS_DIR;
+type DocumentFilter = { scheme?: string; language: string; pattern?: string };
+
+function getDocumentSelector(root: IServerRoot): DocumentFilter[] {
+    if (root.scoped) {
+        const folderPath = root.folder.uri.fsPath.replace(/\\/g, '/');
+        return [{ scheme: 'file', language: 'python', pattern: `${folderPath}/**/*` }];
     }
+    return isVirtualWorkspace()
+        ? [{ language: 'python' }]
+        : [
+              { scheme: 'file', language: 'python' },
+              { scheme: 'untitled', language: 'python' },
+          ];
+}
 
+// The bundled tach's version is in the name of its dist-info directory, so no Python needs to start.
+async function getBundledTachVersion(): Promise<VersionInfo> {
+    const distInfo = (await fs.readdir(BUNDLED_PYTHON_LIBS_DIR)).find((f) => /^tach-.*\.dist-info$/.test(f));
+    if (!distInfo) {
+        throw new Error(`tach is not bundled in ${BUNDLED_PYTHON_LIBS_DIR}`);
+    }
+    return VersionInfo.parse(distInfo.slice('tach-'.length, -'.dist-info'.length));
+}
+
+/** Returns the version of the tach the server runs with `settings`. */
+function getServerTachVersion(settings: ISettings): Promise<VersionInfo> {
+    return settings.importStrategy === 'useBundled'
+        ? getBundledTachVersion()
+        : getTachVersion(settings.interpreter[0]);
+}
+
+async function getDiagnosticsConfigHash(settings: ISettings, root: IServerRoot): Promise<string | undefined> {
+    try {
+        const version = await getServerTachVersion(settings);
+        return await getConfigHash(root.folder, version.toString(), settings.configuration);
+    } catch (ex) {
+        traceVerbose(`Server: Not using cached diagnostics, tach version is unknown: ${ex}`);
+        return undefined;
+    }
+}
+
+async function getServerLaunch(settings: ISettings): Promise<IServerLaunch> {
+    const env: Record<string, string> = { LS_IMPORT_STRATEGY: settings.importStrategy };
+    if (settings.importStrategy === 'useBundled') {
+        env.PYTHONPATH = BUNDLED_PYTHON_LIBS_DIR;
+    }
 
+    const command = settings.interpreter[0];
     const args = settings.interpreter.slice(1).concat(["-m", "tach", "server"]);
 
     if (settings.configuration) {
-        const version = await getTachVersion(command);
+        const version = await getServerTachVersion(settings);
         if (!supportsCustomConfig(version)) {
             traceError(`Server: Tach version ${version.toString()} does not support custom configuration files.`);
         } else {
@@ -67,73 +160,305 @@ async function createServer(
             args.push("-c", settings.configuration);
         }
     }
+    return { command, args, cwd: settings.cwd, env };
+}
+
+async function createServer(
+    launch: IServerLaunch,
+    settings: ISettings,
+    serverId: string,
+    serverName: string,
+    outputChannel: LogOutputChannel,
+    initializationOptions: IInitOptions,
+    root: IServerRoot,
+    middleware: Middleware,
+    onSpawn: (child: ChildProcess) => void,
+): Promise<LanguageClient> {
+    const { command, args, cwd } = launch;
+    const newEnv = { ...process.env, ...launch.env };
 
     traceInfo(`Server run command: ${[command, ...args].join(' ')}`);
 
-    const serverOptions: ServerOptions = {
-        command,
-        args,
-        options: { cwd, env: newEnv },
+    // The server is spawned here rather than by the client so its pid can be watched.
+    let daemon = false;
+    let serverOptions: ServerOptions = async () => {
+        const child = claimPrelaunched(root.folder, launch) ?? spawnServer(launch);
+        onSpawn(child);
+        return getConfiguration(serverId).get<boolean>('recordTrace')
+            ? recordServer(child, [command, ...args], root.folder.uri)
+            : child;
     };
+    if (getConfiguration(serverId).get<boolean>('daemon')) {
+        if (process.platform === 'win32') {
+            traceWarn(`Server: A shared server is not supported on Windows, starting one for this window`);
+        } else {
+            // Windows open on the same project, command and configuration share a daemon.
+            const key = await getConfigHash(
+                root.folder,
+                JSON.stringify([cwd, command, ...args, newEnv.PYTHONPATH ?? '']),
+                settings.configuration,
+            );
+            const idleTimeout =
+                getConfiguration(serverId).get<number>('daemonIdleTimeout') ?? DEFAULT_DAEMON_IDLE_TIMEOUT;
+            daemon = true;
+            serverOptions = async () =>
+                connectToDaemon(
+                    await getDaemonSocket(key),
+                    settings.interpreter,
+                    command,
+                    args,
+                    { cwd, env: newEnv },
+                    idleTimeout,
+                );
+        }
+    }
 
     // Options to control the language client
     const clientOptions: LanguageClientOptions = {
         // Register the server for python documents
-        documentSelector: isVirtualWorkspace()
-            ? [{ language: 'python' }]
-            : [
-                  { scheme: 'file', language: 'python' },
-                  { scheme: 'untitled', language: 'python' },
-              ],
+        documentSelector: getDocumentSelector(root),
+        workspaceFolder: root.scoped ? root.folder : undefined,
         outputChannel: outputChannel,
         traceOutputChannel: outputChannel,
         revealOutputChannelOn: RevealOutputChannelOn.Never,
         initializationOptions,
+        middleware,
+        // The server rechecks a document when it is saved rather than while it is edited. Only
+        // the daemon answers pulls, a server on its own publishes its diagnostics instead.
+        diagnosticPullOptions: { onChange: false, onSave: daemon },
     };
 
     return new LanguageClient(serverId, serverName, serverOptions, clientOptions);
 }
 
-let _disposables: Disposable[] = [];
+// Disposables belonging to each running client.
+const _disposables = new Map<LanguageClient, Disposable[]>();
+
+// Clients over their memory limit, replaced with a swap whatever the restart strategy.
+const _recycle = new Set<LanguageClient>();
+
+function disposeClient(lsClient: LanguageClient): void {
+    _disposables.get(lsClient)?.forEach((d) => d.dispose());
+    _disposables.delete(lsClient);
+    _recycle.delete(lsClient);
+}
+
+// How long to wait for a reply to a diagnostics re-request before giving up on it.
+const DIAGNOSTIC_REQUEST_TIMEOUT = 5000;
+
+function supportsConfigReload(lsClient: LanguageClient): boolean {
+    const experimental = lsClient.initializeResult?.capabilities.experimental as
+        | { configReload?: boolean }
+        | undefined;
+    return experimental?.configReload === true;
+}
+
+// The daemon answers diagnostic pulls with result ids, so unchanged diagnostics aren't resent.
+function supportsPullDiagnostics(lsClient: LanguageClient): boolean {
+    const experimental = lsClient.initializeResult?.capabilities.experimental as
+        | { pullDiagnostics?: boolean }
+        | undefined;
+    return experimental?.pullDiagnostics === true;
+}
+
+async function refreshOpenDocuments(lsClient: LanguageClient): Promise<void> {
+    const documents = workspace.textDocuments.filter((d) => d.languageId === 'python' && !d.isClosed);
+    await Promise.all(
+        documents.map(async (document) => {
+            const tokenSource = new CancellationTokenSource();
+            const timer = setTimeout(() => tokenSource.cancel(), DIAGNOSTIC_REQUEST_TIMEOUT);
+            try {
+                // The server may answer with a report, or by publishing diagnostics for the document.
+                const report = await lsClient.sendRequest(
+                    DocumentDiagnosticRequest.type,
+                    { textDocument: { uri: lsClient.code2ProtocolConverter.asUri(document.uri) } },
+                    tokenSource.token,
+                );
+                if (report?.kind === DocumentDiagnosticReportKind.Full) {
+                    lsClient.diagnostics?.set(
+                        document.uri,
+                        await lsClient.protocol2CodeConverter.asDiagnostics(report.items),
+                    );
+                }
+            } catch (ex) {
+                traceVerbose(`Server: Diagnostics re-request for ${document.uri.fsPath} failed: ${ex}`);
+            } finally {
+                clearTimeout(timer);
+                tokenSource.dispose();
+            }
+        }),
+    );
+}
+
+/**
+ * Forwards a configuration file change to a running server so it can reload in place.
+ * Returns false when the server does not advertise support for reloading.
+ */
+async function reloadServer(serverId: string, lsClient: LanguageClient, uri: Uri): Promise<boolean> {
+    if (!lsClient.isRunning() || !supportsConfigReload(lsClient)) {
+        return false;
+    }
+    const start = Date.now();
+    await lsClient.sendNotification(DidChangeWatchedFilesNotification.type, {
+        changes: [{ uri: lsClient.code2ProtocolConverter.asUri(uri), type: FileChangeType.Changed }],
+    });
+    await lsClient.sendNotification(DidChangeConfigurationNotification.type, {
+        settings: await getExtensionSettings(serverId),
+    });
+    await refreshOpenDocuments(lsClient);
+    traceInfo(`Server: Reloaded configuration in ${Date.now() - start}ms`);
+    return true;
+}
 
 function createConfigWatcher(
-    pattern: string,
+    folder: WorkspaceFolder,
     serverId: string,
-    serverName: string,
-    outputChannel: LogOutputChannel,
-    lsClient: LanguageClient
+    lsClient: LanguageClient,
+    scheduler: RestartScheduler,
 ): Disposable {
-    return workspace.createFileSystemWatcher(pattern).onDidChange(async () => {
-        traceInfo(`Configuration file changed, restarting server...`);
-        await restartServer(serverId, serverName, outputChannel, lsClient);
+    const watcher = new ConfigWatcher(folder, async (uri) => {
+        traceInfo(`Configuration file changed: ${uri.fsPath}`);
+        if (await reloadServer(serverId, lsClient, uri)) {
+            return;
+        }
+        traceInfo(`Server does not support reloading configuration, restarting server...`);
+        scheduler.schedule(`${workspace.asRelativePath(uri)} changed`);
     });
+    void watcher.start();
+    return watcher;
+}
+
+export async function stopServer(root: IServerRoot, lsClient: LanguageClient): Promise<void> {
+    traceInfo(`Server: Stop requested for ${root.folder.uri.fsPath}`);
+    await lsClient.stop();
+    disposeClient(lsClient);
 }
 
 export async function restartServer(
     serverId: string,
     serverName: string,
     outputChannel: LogOutputChannel,
+    // Restarts `root` alone, for changes that only concern its server.
+    scheduler: RestartScheduler,
+    root: IServerRoot,
     lsClient?: LanguageClient,
+    isStale: () => boolean = () => false,
 ): Promise<LanguageClient | undefined> {
-    if (lsClient) {
-        traceInfo(`Server: Stop requested`);
-        await lsClient.stop();
-        _disposables.forEach((d) => d.dispose());
-        _disposables = [];
+    // With the swap strategy the current server keeps running until its replacement has
+    // diagnostics for every open document, and stays in place if the replacement fails.
+    const swap =
+        lsClient?.isRunning() === true &&
+        (_recycle.has(lsClient) || getConfiguration(serverId).get<RestartStrategy>('restartStrategy') === 'swap');
+    const previous = swap ? lsClient : undefined;
+    if (lsClient && !swap) {
+        await stopServer(root, lsClient);
+    }
+    const requested = Date.now();
+    const documentSelector = getDocumentSelector(root);
+    const gate = new DiagnosticsGate(
+        previous
+            ? workspace.textDocuments
+                  .filter((d) => !d.isClosed && languages.match(documentSelector, d) > 0)
+                  .map((d) => d.uri)
+            : [],
+    );
+    if (!previous) {
+        gate.open();
+    }
+    const throttle = new ChangeThrottle(
+        () => getConfiguration(serverId).get<number>('didChangeDebounce') ?? DEFAULT_CHANGE_DEBOUNCE,
+        () => getConfiguration(serverId).get<boolean>('didChangeImportsOnly') ?? true,
+    );
+    const check = getConfiguration(serverId).get<boolean>('checkWorkspace') ? new WorkspaceCheck(root) : undefined;
+    const sink = new DiagnosticsSink();
+    const settingsStart = Date.now();
+    const pendingSetting = getWorkspaceSettings(serverId, root.folder, true);
+    // The version probe may spawn Python, so the cache is attached when it resolves rather
+    // than holding up the server.
+    const cached = new CachedDiagnostics(pendingSetting.then((s) => getDiagnosticsConfigHash(s, root)));
+    const pendingLaunch = pendingSetting.then((s) => getServerLaunch(s));
+    const pendingOptions = Promise.all([getExtensionSettings(serverId, true), getGlobalSettings(serverId, false)]).then(
+        ([settings, globalSettings]) => {
+            traceVerbose(`Server: Settings resolved in ${Date.now() - settingsStart}ms`);
+            markPhase('settingsResolved');
+            return { settings, globalSettings };
+        },
+    );
+    const [workspaceSetting, initializationOptions, launch] = await Promise.all([
+        pendingSetting,
+        pendingOptions,
+        pendingLaunch,
+    ]);
+    markPhase('launchResolved');
+    if (!previous) {
+        void cached.publish(
+            workspace.textDocuments
+                .filter((d) => !d.isClosed && languages.match(documentSelector, d) > 0)
+                .map((d) => d.uri),
+        );
     }
-    const projectRoot = await getProjectRoot();
-    const workspaceSetting = await getWorkspaceSettings(serverId, projectRoot, true);
 
-    const newLSClient = await createServer(workspaceSetting, serverId, serverName, outputChannel, {
-        settings: await getExtensionSettings(serverId, true),
-        globalSettings: await getGlobalSettings(serverId, false),
-    });
-    traceInfo(`Server: Start requested.`);
-    _disposables.push(
+    let watchdog: ServerWatchdog | undefined;
+    const pull = new DiagnosticsPull(
+        (uri, diagnostics) =>
+            middleware.handleDiagnostics?.(uri, diagnostics, (u, d) => newLSClient.diagnostics?.set(u, d)),
+        () => supportsPullDiagnostics(newLSClient),
+    );
+    const middleware = composeMiddleware(
+        getMetricsMiddleware(),
+        pull.middleware,
+        gate.middleware,
+        startupMiddleware,
+        cached.middleware,
+        throttle.middleware,
+        check?.middleware ?? {},
+        sink.middleware,
+    );
+    const newLSClient: LanguageClient = await createServer(
+        launch,
+        workspaceSetting,
+        serverId,
+        serverName,
+        outputChannel,
+        initializationOptions,
+        root,
+        middleware,
+        (child) => {
+            // The client spawns a new process when it restarts a crashed server.
+            watchdog?.dispose();
+            watchdog = child.pid
+                ? new ServerWatchdog(
+                      child.pid,
+                      () => getConfiguration(serverId).get<number>('watchdogInterval') ?? DEFAULT_WATCHDOG_INTERVAL,
+                      () => getConfiguration(serverId).get<number>('maxMemoryMB') ?? 0,
+                      (rssMB) => {
+                          _recycle.add(newLSClient);
+                          scheduler.schedule(`server memory at ${rssMB.toFixed(0)}MB`);
+                      },
+                  )
+                : undefined;
+        },
+    );
+    const disposables: Disposable[] = [
+        throttle,
+        sink,
+        cached,
+        ...(check ? [check] : []),
+        new Disposable(() => watchdog?.dispose()),
+    ];
+    if (isStale()) {
+        traceInfo(`Server: Start cancelled, a newer restart is pending`);
+        disposables.forEach((d) => d.dispose());
+        return previous;
+    }
+    traceInfo(`Server: Start requested for ${root.folder.uri.fsPath}`);
+    _disposables.set(newLSClient, disposables);
+    disposables.push(
         newLSClient.onDidChangeState((e) => {
             switch (e.newState) {
                 case State.Stopped:
                     traceVerbose(`Server State: Stopped`);
+                    sink.reset();
                     break;
                 case State.Starting:
                     traceVerbose(`Server State: Starting`);
@@ -144,23 +469,47 @@ export async function restartServer(
             }
         }),
     );
+    markPhase('clientCreated');
     try {
         await newLSClient.start();
-        _disposables.push(
-            createConfigWatcher(
-                '**/{tach.toml,tach.domain.toml,pyproject.toml,requirements.txt}',
-                serverId,
-                serverName,
-                outputChannel,
-                newLSClient
-            )
+        markPhase('serverStarted');
+        if (isStale()) {
+            traceInfo(`Server: Stopping stale server, a newer restart is pending`);
+            await stopServer(root, newLSClient);
+            return previous;
+        }
+        disposables.push(
+            createConfigWatcher(root.folder, serverId, newLSClient, scheduler),
         );
+        void rememberLaunch(root.folder, launch);
     } catch (ex) {
         traceError(`Server: Start failed: ${ex}`);
-        return undefined;
+        disposeClient(newLSClient);
+        return previous;
+    }
+
+    if (previous) {
+        let timer: NodeJS.Timeout | undefined;
+        const timedOut = await Promise.race([
+            gate.ready.then(() => false),
+            new Promise<boolean>((resolve) => {
+                timer = setTimeout(() => resolve(true), SWAP_TIMEOUT);
+            }),
+        ]);
+        clearTimeout(timer);
+        if (timedOut) {
+            traceWarn(`Server: Replacement server has no diagnostics after ${SWAP_TIMEOUT}ms, swapping anyway`);
+        }
+        previous.diagnostics?.clear();
+        gate.open();
+        await stopServer(root, previous);
+        traceInfo(`Server: Swapped servers for ${root.folder.uri.fsPath} in ${Date.now() - requested}ms`);
     }
 
     const level = getLSClientTraceLevel(outputChannel.logLevel, env.logLevel);
     await newLSClient.setTrace(level);
+    markPhase('traceSet');
+    recordRestart(Date.now() - requested);
+    void check?.run(newLSClient);
     return newLSClient;
 }
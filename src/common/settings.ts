@@ -2,6 +2,7 @@
 // Licensed under the MIT License.
 
 import { ConfigurationChangeEvent, ConfigurationScope, WorkspaceConfiguration, WorkspaceFolder } from 'vscode';
+import { traceVerbose } from './log/logging';
 import { getInterpreterDetails } from './python';
 import { getConfiguration, getWorkspaceFolders } from './vscodeapi';
 
@@ -15,6 +16,28 @@ export interface ISettings {
     configuration: string | null;
 }
 
+// Resolved settings shared by every caller until `invalidateSettings` is called for a
+// change to the extension's settings or the active interpreter.
+const _snapshot = new Map<string, Promise<ISettings>>();
+
+function memoize(key: string, resolve: () => Promise<ISettings>): Promise<ISettings> {
+    let settings = _snapshot.get(key);
+    if (!settings) {
+        const start = Date.now();
+        settings = resolve();
+        settings.then(
+            () => traceVerbose(`Settings: Resolved ${key} in ${Date.now() - start}ms`),
+            () => _snapshot.delete(key),
+        );
+        _snapshot.set(key, settings);
+    }
+    return settings;
+}
+
+export function invalidateSettings(): void {
+    _snapshot.clear();
+}
+
 export function getExtensionSettings(namespace: string, includeInterpreter?: boolean): Promise<ISettings[]> {
     return Promise.all(getWorkspaceFolders().map((w) => getWorkspaceSettings(namespace, w, includeInterpreter)));
 }
@@ -46,7 +69,17 @@ export function getInterpreterFromSetting(namespace: string, scope?: Configurati
     return config.get<string[]>('interpreter');
 }
 
-export async function getWorkspaceSettings(
+export function getWorkspaceSettings(
+    namespace: string,
+    workspace: WorkspaceFolder,
+    includeInterpreter?: boolean,
+): Promise<ISettings> {
+    return memoize(`${namespace}:${workspace.uri.toString()}:${!!includeInterpreter}`, () =>
+        resolveWorkspaceSettings(namespace, workspace, includeInterpreter),
+    );
+}
+
+async function resolveWorkspaceSettings(
     namespace: string,
     workspace: WorkspaceFolder,
     includeInterpreter?: boolean,
@@ -77,7 +110,13 @@ function getGlobalValue<T>(config: WorkspaceConfiguration, key: string, defaultV
     return inspect?.globalValue ?? inspect?.defaultValue ?? defaultValue;
 }
 
-export async function getGlobalSettings(namespace: string, includeInterpreter?: boolean): Promise<ISettings> {
+export function getGlobalSettings(namespace: string, includeInterpreter?: boolean): Promise<ISettings> {
+    return memoize(`${namespace}:global:${!!includeInterpreter}`, () =>
+        resolveGlobalSettings(namespace, includeInterpreter),
+    );
+}
+
+async function resolveGlobalSettings(namespace: string, includeInterpreter?: boolean): Promise<ISettings> {
     const config = getConfiguration(namespace);
 
     let interpreter: string[] = [];
@@ -103,6 +142,8 @@ export function checkIfConfigurationChanged(e: ConfigurationChangeEvent, namespa
         `${namespace}.interpreter`,
         `${namespace}.importStrategy`,
         `${namespace}.configuration`,
+        `${namespace}.recordTrace`,
+        `${namespace}.daemon`,
     ];
     const changed = settings.map((s) => e.affectsConfiguration(s));
     return changed.includes(true);
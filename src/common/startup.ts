@@ -0,0 +1,76 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { Memento, window, workspace } from 'vscode';
+import { Middleware } from 'vscode-languageclient/node';
+import { traceInfo } from './log/logging';
+
+const HISTORY_KEY = 'tach.startupHistory';
+
+// Number of past startups kept in the history.
+const MAX_HISTORY = 20;
+
+export interface IStartupRecord {
+    started: string;
+    // Milliseconds from activation to the end of each phase, in the order they ended.
+    phases: { name: string; ms: number }[];
+}
+
+let _memento: Memento | undefined;
+let _start = Date.now();
+let _current: IStartupRecord | undefined;
+
+/** Starts timing a new startup; call first thing in `activate`. */
+export function beginStartup(memento: Memento): void {
+    _memento = memento;
+    _start = Date.now();
+    _current = { started: new Date(_start).toISOString(), phases: [] };
+}
+
+/** Records the end of a startup phase. Only the first occurrence of each phase counts. */
+export function markPhase(name: string): void {
+    if (_current && !_current.phases.some((p) => p.name === name)) {
+        _current.phases.push({ name, ms: Date.now() - _start });
+    }
+}
+
+async function endStartup(): Promise<void> {
+    const record = _current;
+    if (!record) {
+        return;
+    }
+    _current = undefined;
+    let previous = 0;
+    const lines = record.phases.map(({ name, ms }) => {
+        const line = `  ${name.padEnd(20)} ${String(ms - previous).padStart(6)}ms (at ${ms}ms)`;
+        previous = ms;
+        return line;
+    });
+    traceInfo(`Startup: First diagnostics after ${previous}ms\n${lines.join('\n')}`);
+    const history = _memento?.get<IStartupRecord[]>(HISTORY_KEY) ?? [];
+    await _memento?.update(HISTORY_KEY, [...history, record].slice(-MAX_HISTORY));
+}
+
+/** Ends the startup timeline when the first diagnostics arrive. */
+export const startupMiddleware: Middleware = {
+    handleDiagnostics: (uri, diagnostics, next) => {
+        if (_current) {
+            markPhase('firstDiagnostics');
+            void endStartup();
+        }
+        next(uri, diagnostics);
+    },
+};
+
+export async function showStartupHistory(): Promise<void> {
+    const history = _memento?.get<IStartupRecord[]>(HISTORY_KEY) ?? [];
+    if (history.length === 0) {
+        window.showInformationMessage('No tach startups have been recorded yet.');
+        return;
+    }
+    const document = await workspace.openTextDocument({
+        language: 'json',
+        content: JSON.stringify(history, null, 4),
+    });
+    await window.showTextDocument(document);
+}
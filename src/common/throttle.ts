@@ -0,0 +1,167 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import { Disposable, Position, Range, TextDocumentChangeEvent } from 'vscode';
+import { Middleware } from 'vscode-languageclient/node';
+import { traceVerbose } from './log/logging';
+
+type ChangeSignature = (event: TextDocumentChangeEvent) => Promise<void>;
+
+export interface IThrottleStats {
+    received: number;
+    forwarded: number;
+    // Changes folded into a later notification by the debounce window.
+    merged: number;
+    // Changes that were not forwarded because they could not affect imports.
+    skipped: number;
+}
+
+const IMPORT_PATTERN = /^\s*(import\s|from\s+\S+\s+import\b)/;
+
+function splitLines(text: string): string[] {
+    return text.split(/\r\n|\r|\n/);
+}
+
+function endOf(text: string): Position {
+    const lines = splitLines(text);
+    return new Position(lines.length - 1, lines[lines.length - 1].length);
+}
+
+/** Returns the line numbers covered by import statements, including continuation lines. */
+function getImportLines(text: string): Set<number> {
+    const result = new Set<number>();
+    let open = 0;
+    let continued = false;
+    splitLines(text).forEach((line, index) => {
+        if (open > 0 || continued || IMPORT_PATTERN.test(line)) {
+            result.add(index);
+            open = Math.max(open + (line.match(/\(/g)?.length ?? 0) - (line.match(/\)/g)?.length ?? 0), 0);
+            continued = line.trimEnd().endsWith('\\');
+        }
+    });
+    return result;
+}
+
+function touchesImports(event: TextDocumentChangeEvent, previous: string): boolean {
+    const importLines = getImportLines(previous);
+    return event.contentChanges.some((change) => {
+        const { start, end } = change.range;
+        // Anything that moves lines around shifts diagnostic positions.
+        if (splitLines(change.text).length - 1 !== end.line - start.line) {
+            return true;
+        }
+        if (splitLines(change.text).some((line) => IMPORT_PATTERN.test(line))) {
+            return true;
+        }
+        for (let line = start.line; line <= end.line; line++) {
+            if (importLines.has(line)) {
+                return true;
+            }
+        }
+        return false;
+    });
+}
+
+/**
+ * Debounces didChange notifications per document and forwards the full text once the
+ * user pauses. Optionally drops changes that leave import statements untouched; the
+ * server is brought back in sync before the document is saved or closed.
+ */
+export class ChangeThrottle implements Disposable {
+    public readonly stats: IThrottleStats = { received: 0, forwarded: 0, merged: 0, skipped: 0 };
+    // Text of each document as the server last saw it.
+    private readonly synced = new Map<string, string>();
+    // Text of each document before the change being handled.
+    private readonly shadow = new Map<string, string>();
+    private readonly pending = new Map<string, NodeJS.Timeout>();
+    private readonly latest = new Map<string, { event: TextDocumentChangeEvent; next: ChangeSignature }>();
+
+    constructor(
+        private readonly getDelay: () => number,
+        private readonly importsOnly: () => boolean,
+    ) {}
+
+    public readonly middleware: Middleware = {
+        didOpen: (document, next) => {
+            const key = document.uri.toString();
+            this.synced.set(key, document.getText());
+            this.shadow.set(key, document.getText());
+            return next(document);
+        },
+        didChange: (event, next) => this.onDidChange(event, next),
+        didSave: async (document, next) => {
+            await this.flush(document.uri.toString());
+            return next(document);
+        },
+        didClose: async (document, next) => {
+            const key = document.uri.toString();
+            await this.flush(key);
+            this.synced.delete(key);
+            this.shadow.delete(key);
+            this.latest.delete(key);
+            traceVerbose(
+                `Throttle: ${this.stats.forwarded} of ${this.stats.received} changes forwarded ` +
+                    `(${this.stats.merged} merged, ${this.stats.skipped} skipped)`,
+            );
+            return next(document);
+        },
+    };
+
+    public dispose(): void {
+        this.pending.forEach((timer) => clearTimeout(timer));
+        this.pending.clear();
+    }
+
+    private async onDidChange(event: TextDocumentChangeEvent, next: ChangeSignature): Promise<void> {
+        const key = event.document.uri.toString();
+        const previous = this.shadow.get(key);
+        this.stats.received += 1;
+        this.shadow.set(key, event.document.getText());
+        const delay = this.getDelay();
+        if (delay <= 0 || previous === undefined || !this.synced.has(key)) {
+            this.stats.forwarded += 1;
+            this.synced.set(key, event.document.getText());
+            return next(event);
+        }
+
+        this.latest.set(key, { event, next });
+        if (!this.pending.has(key) && this.importsOnly() && !touchesImports(event, previous)) {
+            this.stats.skipped += 1;
+            return;
+        }
+        if (this.pending.has(key)) {
+            this.stats.merged += 1;
+            clearTimeout(this.pending.get(key));
+        }
+        this.pending.set(key, setTimeout(() => void this.flush(key), delay));
+    }
+
+    /** Sends the document's current text if the server's copy is behind. */
+    private async flush(key: string): Promise<void> {
+        clearTimeout(this.pending.get(key));
+        this.pending.delete(key);
+        const latest = this.latest.get(key);
+        const previous = this.synced.get(key);
+        if (!latest || previous === undefined) {
+            return;
+        }
+        const text = latest.event.document.getText();
+        if (text === previous) {
+            return;
+        }
+        this.synced.set(key, text);
+        this.stats.forwarded += 1;
+        await latest.next({
+            document: latest.event.document,
+            contentChanges: [
+                {
+                    range: new Range(new Position(0, 0), endOf(previous)),
+                    rangeOffset: 0,
+                    rangeLength: previous.length,
+                    text,
+                },
+            ],
+            reason: undefined,
+        });
+    }
+}
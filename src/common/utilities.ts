@@ -1,10 +1,9 @@
 // Copyright (c) Microsoft Corporation. All rights reserved.
 // Licensed under the MIT License.
 
-import * as fs from 'fs-extra';
-import * as path from 'path';
-import { LogLevel, Uri, WorkspaceFolder } from 'vscode';
+import { LogLevel, WorkspaceFolder } from 'vscode';
 import { Trace } from 'vscode-jsonrpc/node';
+import { hasTachProject } from './rootIndex';
 import { getWorkspaceFolders } from './vscodeapi';
 
 function logLevelToTrace(logLevel: LogLevel): Trace {
@@ -35,33 +34,7 @@ export function getLSClientTraceLevel(channelLogLevel: LogLevel, globalLogLevel:
     return level;
 }
 
-export async function getProjectRoot(): Promise<WorkspaceFolder> {
-    const workspaces: readonly WorkspaceFolder[] = getWorkspaceFolders();
-    if (workspaces.length === 0) {
-        return {
-            uri: Uri.file(process.cwd()),
-            name: path.basename(process.cwd()),
-            index: 0,
-        };
-    } else if (workspaces.length === 1) {
-        return workspaces[0];
-    } else {
-        let rootWorkspace = workspaces[0];
-        let root = undefined;
-        for (const w of workspaces) {
-            if (await fs.pathExists(w.uri.fsPath)) {
-                root = w.uri.fsPath;
-                rootWorkspace = w;
-                break;
-            }
-        }
-
-        for (const w of workspaces) {
-            if (root && root.length > w.uri.fsPath.length && (await fs.pathExists(w.uri.fsPath))) {
-                root = w.uri.fsPath;
-                rootWorkspace = w;
-            }
-        }
-        return rootWorkspace;
-    }
+/** Returns the workspace folders that need their own server: every folder with an indexed tach project. */
+export async function getServerRoots(): Promise<WorkspaceFolder[]> {
+    return getWorkspaceFolders().filter((folder) => hasTachProject(folder));
 }
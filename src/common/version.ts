@@ -8,6 +8,11 @@ export class VersionInfo {
     toString(): string {
         return `${this.major}.${this.minor}.${this.patch}`;
     }
+
+    static parse(version: string): VersionInfo {
+        const [major, minor, patch] = version.split(".").map((x) => parseInt(x, 10));
+        return new VersionInfo(major, minor, patch);
+    }
 }
 
 function versionGte(a: VersionInfo, b: VersionInfo): boolean {
@@ -0,0 +1,102 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import * as fs from 'fs-extra';
+import { Disposable } from 'vscode';
+import { traceInfo, traceVerbose, traceWarn } from './log/logging';
+
+// Clock ticks per second in /proc/<pid>/stat; 100 on every mainstream Linux build.
+const CLOCK_TICKS = 100;
+
+interface IProcessSample {
+    rssMB: number;
+    // User plus system CPU time, in clock ticks.
+    cpuTicks: number;
+    time: number;
+}
+
+async function sampleProcess(pid: number): Promise<IProcessSample | undefined> {
+    try {
+        const [status, stat] = await Promise.all([
+            fs.readFile(`/proc/${pid}/status`, 'utf8'),
+            fs.readFile(`/proc/${pid}/stat`, 'utf8'),
+        ]);
+        const rss = /^VmRSS:\s+(\d+)\s+kB/m.exec(status);
+        // The command name may contain spaces, so fields are counted from the end of it.
+        const fields = stat.slice(stat.lastIndexOf(')') + 2).split(' ');
+        return {
+            rssMB: rss ? Number(rss[1]) / 1024 : 0,
+            cpuTicks: Number(fields[11]) + Number(fields[12]),
+            time: Date.now(),
+        };
+    } catch {
+        // The process has exited.
+        return undefined;
+    }
+}
+
+/**
+ * Samples the memory and CPU use of a server process from /proc, and calls `onExceeded`
+ * once when its resident memory goes above the configured limit.
+ */
+export class ServerWatchdog implements Disposable {
+    private timer: NodeJS.Timeout | undefined;
+    private last: IProcessSample | undefined;
+    private exceeded = false;
+    private disposed = false;
+
+    constructor(
+        private readonly pid: number,
+        // Seconds between samples; 0 stops sampling.
+        private readonly getInterval: () => number,
+        // Resident memory limit; 0 means no limit.
+        private readonly getMaxMemoryMB: () => number,
+        private readonly onExceeded: (rssMB: number) => void,
+    ) {
+        if (process.platform !== 'linux') {
+            traceVerbose(`Server: Memory watchdog needs /proc, not watching pid ${pid}`);
+            return;
+        }
+        this.schedule();
+    }
+
+    public dispose(): void {
+        this.disposed = true;
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = undefined;
+        }
+    }
+
+    private schedule(): void {
+        const interval = this.getInterval();
+        if (interval > 0) {
+            this.timer = setTimeout(() => void this.sample(), interval * 1000);
+        }
+    }
+
+    private async sample(): Promise<void> {
+        this.timer = undefined;
+        const sample = await sampleProcess(this.pid);
+        if (!sample || this.disposed) {
+            return;
+        }
+        const previous = this.last;
+        this.last = sample;
+        const cpu = previous
+            ? ((sample.cpuTicks - previous.cpuTicks) / CLOCK_TICKS / ((sample.time - previous.time) / 1000)) * 100
+            : undefined;
+        traceInfo(
+            `Server: pid ${this.pid} using ${sample.rssMB.toFixed(0)}MB` +
+                (cpu === undefined ? '' : `, ${cpu.toFixed(1)}% CPU`),
+        );
+        const maxMemoryMB = this.getMaxMemoryMB();
+        if (!this.exceeded && maxMemoryMB > 0 && sample.rssMB > maxMemoryMB) {
+            // Only once: a second restart would cancel the replacement that is starting.
+            this.exceeded = true;
+            traceWarn(`Server: pid ${this.pid} is above the ${maxMemoryMB}MB memory limit, recycling it`);
+            this.onExceeded(sample.rssMB);
+        }
+        this.schedule();
+    }
+}
@@ -0,0 +1,159 @@
+// Copyright (c) Microsoft Corporation. All rights reserved.
+// Licensed under the MIT License.
+
+import * as path from 'path';
+import {
+    CancellationToken,
+    CancellationTokenSource,
+    Disposable,
+    ProgressLocation,
+    RelativePattern,
+    Uri,
+    window,
+    workspace,
+} from 'vscode';
+import { DocumentDiagnosticReportKind, DocumentDiagnosticRequest } from 'vscode-languageclient';
+import { LanguageClient, Middleware } from 'vscode-languageclient/node';
+import { isExcluded, readProjectScope } from './configWatcher';
+import { traceInfo, traceVerbose } from './log/logging';
+import { SKIPPED_DIRS } from './rootIndex';
+import { IServerRoot } from './server';
+
+// How long to wait for the diagnostics of a single file before moving on.
+const FILE_TIMEOUT = 5000;
+
+// Background work pauses until the user has not opened or edited a document for this long.
+const INTERACTIVE_GRACE = 1000;
+
+function sleep(ms: number): Promise<void> {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+/** Groups files by their top-level directory under `root`, which is how tach projects lay out modules. */
+function groupByModule(root: Uri, files: Uri[]): Map<string, Uri[]> {
+    const groups = new Map<string, Uri[]>();
+    for (const file of files.sort((a, b) => a.fsPath.localeCompare(b.fsPath))) {
+        const segments = path.relative(root.fsPath, file.fsPath).split(path.sep);
+        const module = segments.length > 1 ? segments[0] : '.';
+        groups.set(module, [...(groups.get(module) ?? []), file]);
+    }
+    return groups;
+}
+
+/**
+ * Checks every Python file under a server root in the background, one module at a time,
+ * so diagnostics show up in the Problems panel for files that were never opened. The
+ * check waits while the user is opening or editing documents.
+ */
+export class WorkspaceCheck implements Disposable {
+    private readonly tokenSource = new CancellationTokenSource();
+    private readonly waiting = new Map<string, () => void>();
+    private lastInteractive = 0;
+
+    constructor(private readonly root: IServerRoot) {}
+
+    public readonly middleware: Middleware = {
+        didOpen: (document, next) => {
+            this.lastInteractive = Date.now();
+            return next(document);
+        },
+        didChange: (event, next) => {
+            this.lastInteractive = Date.now();
+            return next(event);
+        },
+        handleDiagnostics: (uri, diagnostics, next) => {
+            this.waiting.get(uri.toString())?.();
+            next(uri, diagnostics);
+        },
+    };
+
+    public dispose(): void {
+        this.tokenSource.cancel();
+        this.tokenSource.dispose();
+    }
+
+    public async run(lsClient: LanguageClient): Promise<void> {
+        const token = this.tokenSource.token;
+        const files = await this.findFiles();
+        const groups = groupByModule(this.root.folder.uri, files);
+        const start = Date.now();
+        let checked = 0;
+        await window.withProgress(
+            { location: ProgressLocation.Window, title: 'tach: Checking workspace' },
+            async (progress) => {
+                for (const [module, moduleFiles] of groups) {
+                    progress.report({ message: module, increment: 100 / groups.size });
+                    for (const file of moduleFiles) {
+                        await this.waitForIdle(token);
+                        if (token.isCancellationRequested || !lsClient.isRunning()) {
+                            traceInfo(`Workspace check: Stopped after ${checked} of ${files.length} files`);
+                            return;
+                        }
+                        await this.checkFile(lsClient, file, token);
+                        checked += 1;
+                    }
+                    traceVerbose(`Workspace check: Finished ${module} (${moduleFiles.length} files)`);
+                }
+                traceInfo(`Workspace check: Checked ${checked} files in ${Date.now() - start}ms`);
+            },
+        );
+    }
+
+    /** Returns the Python files in the project's source roots that tach doesn't exclude. */
+    private async findFiles(): Promise<Uri[]> {
+        const folder = this.root.folder.uri;
+        const scope = await readProjectScope(folder.fsPath);
+        const sourceRoots = [...new Set(scope.sourceRoots.map((r) => path.normalize(r)))];
+        const found = await Promise.all(
+            sourceRoots.map((r) =>
+                workspace.findFiles(new RelativePattern(Uri.joinPath(folder, r), '**/*.py'), SKIPPED_DIRS),
+            ),
+        );
+        // Source roots may be nested.
+        const files = new Map(found.flat().map((uri) => [uri.fsPath, uri]));
+        return [...files.values()].filter(
+            (uri) => !isExcluded(path.relative(folder.fsPath, uri.fsPath), scope.exclude),
+        );
+    }
+
+    private async waitForIdle(token: CancellationToken): Promise<void> {
+        let remaining = this.lastInteractive + INTERACTIVE_GRACE - Date.now();
+        while (remaining > 0 && !token.isCancellationRequested) {
+            await sleep(remaining);
+            remaining = this.lastInteractive + INTERACTIVE_GRACE - Date.now();
+        }
+    }
+
+    private async checkFile(lsClient: LanguageClient, file: Uri, token: CancellationToken): Promise<void> {
+        const key = file.toString();
+        const request = new CancellationTokenSource();
+        const parent = token.onCancellationRequested(() => request.cancel());
+        // The server may answer with a report, or by publishing diagnostics for the file.
+        const published = new Promise<void>((resolve) => this.waiting.set(key, resolve));
+        const timer = setTimeout(() => request.cancel(), FILE_TIMEOUT);
+        const cancelled = new Promise<void>((resolve) => request.token.onCancellationRequested(() => resolve()));
+        try {
+            const report = await Promise.race([
+                lsClient.sendRequest(
+                    DocumentDiagnosticRequest.type,
+                    { textDocument: { uri: lsClient.code2ProtocolConverter.asUri(file) } },
+                    request.token,
+                ),
+                published.then(() => undefined),
+                cancelled.then(() => undefined),
+            ]);
+            if (report?.kind === DocumentDiagnosticReportKind.Full) {
+                lsClient.diagnostics?.set(file, await lsClient.protocol2CodeConverter.asDiagnostics(report.items));
+            }
+        } catch (ex) {
+            traceVerbose(`Workspace check: ${file.fsPath} failed: ${ex}`);
+        } finally {
+            // Cancel the request in case it is still pending after diagnostics were published.
+            request.cancel();
+            clearTimeout(timer);
+            parent.dispose();
+            request.dispose();
+            this.waiting.delete(key);
+        }
+    }
+}
@@ -2,36 +2,53 @@
 // Licensed under the MIT License.
 
 import * as vscode from 'vscode';
-import { LanguageClient } from 'vscode-languageclient/node';
 import { registerLogger, traceError, traceLog, traceVerbose } from './common/log/logging';
+import { initializeCache } from './common/cache';
+import { initializeDiagnosticsCache } from './common/diagnosticsCache';
 import {
     checkVersion,
+    clearInterpreterCache,
     getInterpreterDetails,
     initializePython,
     onDidChangePythonInterpreter,
     resolveInterpreter,
 } from './common/python';
-import { restartServer } from './common/server';
-import { checkIfConfigurationChanged, getInterpreterFromSetting } from './common/settings';
+import { initializeMetrics, showPerformanceReport } from './common/metrics';
+import { ServerPool } from './common/pool';
+import { discardPrelaunched, initializePrelaunch, prelaunchServer } from './common/prelaunch';
+import { initializeRecorder } from './common/recorder';
+import { initializeRootIndex, isInTachProject, onDidChangeTachProjects } from './common/rootIndex';
+import { RestartScheduler } from './common/scheduler';
+import { beginStartup, markPhase, showStartupHistory } from './common/startup';
+import { checkIfConfigurationChanged, getInterpreterFromSetting, invalidateSettings } from './common/settings';
 import { loadServerDefaults } from './common/setup';
 import { getLSClientTraceLevel } from './common/utilities';
-import { createOutputChannel, onDidChangeConfiguration, registerCommand } from './common/vscodeapi';
+import { createOutputChannel, getConfiguration, onDidChangeConfiguration, registerCommand } from './common/vscodeapi';
 
-let lsClient: LanguageClient | undefined;
+let pool: ServerPool | undefined;
 export async function activate(context: vscode.ExtensionContext): Promise<void> {
     // This is required to get server name and module. This should be
     // the first thing that we do in this extension.
     const serverInfo = loadServerDefaults();
     const serverName = serverInfo.name;
     const serverId = serverInfo.module;
+    beginStartup(context.globalState);
 
     // Setup logging
     const outputChannel = createOutputChannel(serverName);
     context.subscriptions.push(outputChannel, registerLogger(outputChannel));
+    initializeCache(context.globalState);
+    initializeRecorder(context.logUri);
+    context.subscriptions.push(
+        initializeDiagnosticsCache(context.globalStorageUri),
+        initializeMetrics(serverId),
+        initializeRootIndex(context.workspaceState),
+        initializePrelaunch(context.workspaceState),
+    );
 
     const changeLogLevel = async (c: vscode.LogLevel, g: vscode.LogLevel) => {
         const level = getLSClientTraceLevel(c, g);
-        await lsClient?.setTrace(level);
+        await Promise.all(pool?.running.map((lsClient) => lsClient.setTrace(level)) ?? []);
     };
 
     context.subscriptions.push(
@@ -48,23 +65,28 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
     traceLog(`Module: ${serverInfo.module}`);
     traceVerbose(`Full Server Info: ${JSON.stringify(serverInfo)}`);
 
-    const runServer = async () => {
+    const runServer = async (isStale: () => boolean) => {
         const interpreter = getInterpreterFromSetting(serverId);
         if (interpreter && interpreter.length > 0) {
             if (checkVersion(await resolveInterpreter(interpreter))) {
+                markPhase('interpreterResolved');
                 traceVerbose(`Using interpreter from ${serverInfo.module}.interpreter: ${interpreter.join(' ')}`);
-                lsClient = await restartServer(serverId, serverName, outputChannel, lsClient);
+                await pool?.restart(isStale);
+            } else {
+                discardPrelaunched();
             }
             return;
         }
 
         const interpreterDetails = await getInterpreterDetails();
         if (interpreterDetails.path) {
+            markPhase('interpreterResolved');
             traceVerbose(`Using interpreter from Python extension: ${interpreterDetails.path.join(' ')}`);
-            lsClient = await restartServer(serverId, serverName, outputChannel, lsClient);
+            await pool?.restart(isStale);
             return;
         }
 
+        discardPrelaunched();
         traceError(
             'Python interpreter missing:\r\n' +
                 '[Option 1] Select python interpreter using the ms-python.python.\r\n' +
@@ -73,34 +95,91 @@ export async function activate(context: vscode.ExtensionContext): Promise<void>
         );
     };
 
+    const scheduler = new RestartScheduler(runServer);
+    pool = new ServerPool(serverId, serverName, outputChannel, scheduler);
+
+    // Python and the servers only start once a document inside a tach project is open.
+    let started = false;
+    function start(): void {
+        if (started) {
+            return;
+        }
+        started = true;
+        // Time the startup from here, not from an activation that may have been long before.
+        beginStartup(context.globalState);
+        // Servers that started before are spawned again right away, while the Python
+        // extension and the settings load; they are dropped if the settings turn out different.
+        // Only folders with an open document start a server, the others wait for one to open.
+        if (!getConfiguration(serverId).get<boolean>('daemon')) {
+            void pool?.getActiveFolders().then((folders) => folders.forEach(prelaunchServer));
+        }
+        setImmediate(async () => {
+            const interpreter = getInterpreterFromSetting(serverId);
+            if (interpreter === undefined || interpreter.length === 0) {
+                traceLog(`Python extension loading`);
+                await initializePython(context.subscriptions);
+                markPhase('pythonExtension');
+                traceLog(`Python extension loaded`);
+            } else {
+                scheduler.schedule('activation');
+            }
+        });
+    }
+
     context.subscriptions.push(
-        onDidChangePythonInterpreter(async () => {
-            await runServer();
+        scheduler,
+        pool,
+        onDidChangePythonInterpreter(() => {
+            invalidateSettings();
+            scheduler.schedule('interpreter changed');
         }),
-        onDidChangeConfiguration(async (e: vscode.ConfigurationChangeEvent) => {
-            if (checkIfConfigurationChanged(e, serverId)) {
-                await runServer();
+        onDidChangeConfiguration((e: vscode.ConfigurationChangeEvent) => {
+            if (e.affectsConfiguration(serverId)) {
+                invalidateSettings();
+            }
+            if (started && checkIfConfigurationChanged(e, serverId)) {
+                clearInterpreterCache();
+                scheduler.schedule('settings changed');
             }
         }),
         registerCommand(`${serverId}.restart`, async () => {
-            await runServer();
+            if (!started) {
+                start();
+                return;
+            }
+            scheduler.schedule('restart command');
+            await scheduler.whenIdle();
         }),
+        registerCommand(`${serverId}.showPerformanceReport`, showPerformanceReport),
+        registerCommand(`${serverId}.showStartupHistory`, showStartupHistory),
     );
 
-    setImmediate(async () => {
-        const interpreter = getInterpreterFromSetting(serverId);
-        if (interpreter === undefined || interpreter.length === 0) {
-            traceLog(`Python extension loading`);
-            await initializePython(context.subscriptions);
-            traceLog(`Python extension loaded`);
-        } else {
-            await runServer();
+    const isTachDocument = (d: vscode.TextDocument) => d.languageId === 'python' && isInTachProject(d.uri);
+    const startIfNeeded = () => {
+        if (vscode.workspace.textDocuments.some(isTachDocument)) {
+            start();
         }
-    });
+    };
+    context.subscriptions.push(
+        vscode.workspace.onDidOpenTextDocument((d) => {
+            if (isTachDocument(d)) {
+                start();
+            }
+        }),
+        onDidChangeTachProjects(() => {
+            if (started) {
+                scheduler.schedule('tach projects changed');
+            } else {
+                startIfNeeded();
+            }
+        }),
+    );
+    startIfNeeded();
+    if (!started) {
+        traceVerbose('No open document in a tach project, waiting to start');
+    }
 }
 
 export async function deactivate(): Promise<void> {
-    if (lsClient) {
-        await lsClient.stop();
-    }
+    await pool?.stopAll();
 }
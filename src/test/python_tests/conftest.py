@@ -0,0 +1,32 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Shared fixtures for the LSP tests.
+
+Servers are pooled per test process, so the suite also runs in parallel with
+pytest-xdist (`pytest -n auto`), each worker keeping its own pool.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from .lsp_test_client import constants
+from .lsp_test_client.pool import SessionPool
+
+
+@pytest.fixture(scope="session")
+def session_pool():
+    """Warm servers reused by every test in this process."""
+    pool = SessionPool()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def ls_session(session_pool, request):
+    """An initialized session for `constants.TEST_DATA`, or the root given by
+    indirect parametrization."""
+    ls_session = session_pool.acquire(getattr(request, "param", constants.TEST_DATA))
+    yield ls_session
+    session_pool.release(ls_session)
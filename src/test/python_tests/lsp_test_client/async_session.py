@@ -0,0 +1,264 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Asyncio LSP session client for load testing.
+
+Mirrors the surface of `session.LspSession`, but runs on an event loop so many
+sessions and documents can be driven concurrently from a single thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import os
+import sys
+
+from .constants import BUNDLED_PYTHON_LIBS_DIR, CONTENT_LENGTH, PUBLISH_DIAGNOSTICS
+from .defaults import VSCODE_DEFAULT_INITIALIZE
+from .utils import server_env
+
+# Measured in seconds
+# Generous, since many servers may be starting at once.
+LSP_INIT_TIMEOUT = 30
+LSP_EXIT_TIMEOUT = 5
+
+# Largest message the reader buffers, and how much may wait unsent in the writer.
+READ_LIMIT = 16 * 1024 * 1024
+WRITE_HIGH_WATER = 1024 * 1024
+
+METHOD_NOT_FOUND = -32601
+
+
+def _message(method, params=None, request_id=None):
+    message = {"jsonrpc": "2.0", "method": method}
+    if request_id is not None:
+        message["id"] = request_id
+    if params is not None:
+        message["params"] = params
+    return message
+
+
+class AsyncLspSession:
+    """Send and Receive messages over LSP as an asyncio test LS Client."""
+
+    def __init__(self, cwd=None, python=None, stderr=None, socket_path=None):
+        self.cwd = cwd if cwd else os.getcwd()
+        self.python = python if python else sys.executable
+        # Another interpreter imports its own tach rather than the bundled one.
+        self.bundled = None if python else BUNDLED_PYTHON_LIBS_DIR
+        self.stderr = stderr
+        # Unix socket of a running server to connect to, instead of starting one.
+        self.socket_path = socket_path
+        self._process: asyncio.subprocess.Process | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._next_id = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        self._notification_callbacks = {}
+        self._diagnostic_waiters: dict[str, list[asyncio.Future]] = {}
+
+    async def __aenter__(self):
+        if self.socket_path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                str(self.socket_path), limit=READ_LIMIT
+            )
+        else:
+            self._process = await asyncio.create_subprocess_exec(
+                self.python,
+                "-m",
+                "tach",
+                "server",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=self.stderr,
+                cwd=self.cwd,
+                env=server_env(self.bundled),
+                limit=READ_LIMIT,
+            )
+            self._reader = self._process.stdout
+            self._writer = self._process.stdin
+        self._writer.transport.set_write_buffer_limits(  # pyright: ignore
+            high=WRITE_HIGH_WATER
+        )
+        self._reader_task = asyncio.create_task(self._read_messages())
+        return self
+
+    async def __aexit__(self, typ, value, _tb):
+        if self._process is None:
+            if not self._writer.is_closing():  # pyright: ignore
+                try:
+                    await asyncio.wait_for(self.shutdown(), LSP_EXIT_TIMEOUT)
+                    await self.exit_lsp()
+                except (asyncio.TimeoutError, ConnectionError):
+                    pass
+                self._writer.close()  # pyright: ignore
+        elif self._process.returncode is None:
+            try:
+                await asyncio.wait_for(self.shutdown(), LSP_EXIT_TIMEOUT)
+                await self.exit_lsp()
+            except (asyncio.TimeoutError, ConnectionError):
+                if self._process.returncode is None:
+                    self._process.kill()
+                await self._process.wait()
+        self._reader_task.cancel()  # pyright: ignore
+        for future in self._pending.values():
+            future.cancel()
+
+    @property
+    def pid(self):
+        """Process id of the LSP server, unless connected to a shared one."""
+        return self._process.pid if self._process else None
+
+    async def initialize(self, initialize_params=None):
+        """Sends the initialize request and the initialized notification."""
+        result = await asyncio.wait_for(
+            self.send_request(
+                "initialize", initialize_params or VSCODE_DEFAULT_INITIALIZE
+            ),
+            LSP_INIT_TIMEOUT,
+        )
+        await self.send_notification("initialized", {})
+        return result
+
+    async def shutdown(self):
+        """Sends the shutdown request to LSP server."""
+        return await self.send_request("shutdown")
+
+    async def exit_lsp(self, exit_timeout=LSP_EXIT_TIMEOUT):
+        """Handles LSP server process exit."""
+        await self.send_notification("exit")
+        if self._process is None:
+            # A shared server stays up and only closes this connection.
+            await asyncio.wait_for(self._reader_task, exit_timeout)  # pyright: ignore
+            return
+        assert (
+            await asyncio.wait_for(self._process.wait(), exit_timeout) == 0
+        )  # pyright: ignore
+
+    async def abort(self, exit_timeout=LSP_EXIT_TIMEOUT):
+        """Drops the connection without shutting down, as a crashed client would.
+
+        Returns whether the server exited by itself; it is killed otherwise. A
+        shared server stays up for its other clients.
+        """
+        self._writer.close()  # pyright: ignore
+        if self._process is None:
+            return True
+        try:
+            await asyncio.wait_for(
+                self._process.wait(), exit_timeout
+            )  # pyright: ignore
+            return True
+        except asyncio.TimeoutError:
+            self._process.kill()  # pyright: ignore
+            await self._process.wait()  # pyright: ignore
+            return False
+
+    async def notify_did_change(self, did_change_params):
+        """Sends did change notification to LSP Server."""
+        await self.send_notification("textDocument/didChange", did_change_params)
+
+    async def notify_did_save(self, did_save_params):
+        """Sends did save notification to LSP Server."""
+        await self.send_notification("textDocument/didSave", did_save_params)
+
+    async def notify_did_open(self, did_open_params):
+        """Sends did open notification to LSP Server."""
+        await self.send_notification("textDocument/didOpen", did_open_params)
+
+    async def notify_did_close(self, did_close_params):
+        """Sends did close notification to LSP Server."""
+        await self.send_notification("textDocument/didClose", did_close_params)
+
+    def text_document_diagnostic(self, diagnostic_params):
+        """Sends text document diagnostic request to LSP server.
+
+        Returns the pending future, since the server may answer by publishing
+        diagnostics instead of replying to the request.
+        """
+        return asyncio.ensure_future(
+            self.send_request("textDocument/diagnostic", diagnostic_params)
+        )
+
+    def set_notification_callback(self, notification_name, callback):
+        """Set custom LS notification handler; coroutine functions are awaited."""
+        self._notification_callbacks[notification_name] = callback
+
+    def expect_diagnostics(self, uri):
+        """Returns a future for the next diagnostics published for `uri`.
+
+        Call before sending the notification that triggers them.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._diagnostic_waiters.setdefault(uri, []).append(future)
+        return future
+
+    async def send_request(self, name, params=None):
+        """Sends {name} request to the LSP server and waits for its result."""
+        request_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._write(_message(name, params, request_id))
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def send_notification(self, name, params=None):
+        """Sends {name} notification to the LSP server."""
+        await self._write(_message(name, params))
+
+    async def _write(self, message):
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        writer = self._writer  # pyright: ignore
+        writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        # Blocks while the server is behind on reading, keeping the buffer bounded.
+        await writer.drain()
+
+    async def _read_messages(self):
+        reader = self._reader  # pyright: ignore
+        while True:
+            try:
+                header = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            # The server may print plain text before a header; only the length matters.
+            match = CONTENT_LENGTH.search(header)
+            if match is None:
+                continue
+            length = int(match.group(1))
+            await self._dispatch(json.loads(await reader.readexactly(length)))
+
+    async def _dispatch(self, message):
+        if "method" not in message:
+            future = self._pending.get(message.get("id"))
+            if future is None or future.done():
+                return
+            if "error" in message:
+                future.set_exception(RuntimeError(message["error"]))
+            else:
+                future.set_result(message.get("result"))
+        elif "id" in message:
+            # Requests from the server, e.g. client/registerCapability.
+            await self._write(
+                {
+                    "jsonrpc": "2.0",
+                    "id": message["id"],
+                    "error": {"code": METHOD_NOT_FOUND, "message": message["method"]},
+                }
+            )
+        else:
+            if message["method"] == PUBLISH_DIAGNOSTICS:
+                uri = message["params"]["uri"]
+                for future in self._diagnostic_waiters.pop(uri, []):
+                    if not future.done():
+                        future.set_result(message["params"])
+            callback = self._notification_callbacks.get(message["method"])
+            if callback is not None:
+                result = callback(message.get("params"))
+                if inspect.isawaitable(result):
+                    await result
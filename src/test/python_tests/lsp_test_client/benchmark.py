@@ -0,0 +1,374 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Diagnostic latency benchmarks for the tach language server.
+
+Run from `src/test`:
+    python -m python_tests.lsp_test_client.benchmark --iterations 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Event
+
+from . import session
+from .constants import TEST_DATA
+from .defaults import VSCODE_DEFAULT_INITIALIZE, VSCODE_PULL_INITIALIZE
+from .generator import generate_project
+from .utils import as_uri, get_rss_kb, start_daemon
+
+# Measured in seconds
+DIAGNOSTICS_TIMEOUT = 10
+DAEMON_IDLE_TIMEOUT = 1
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_THRESHOLD = 0.2
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Returns the nearest-rank percentile of the samples."""
+    if not samples:
+        raise ValueError("percentile of an empty sample")
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summarizes latencies (in seconds) as milliseconds per percentile."""
+    summary = {f"p{p}": round(percentile(samples, p) * 1000, 3) for p in PERCENTILES}
+    summary["iterations"] = len(samples)
+    return summary
+
+
+class DiagnosticsWaiter:
+    """Waits for the next publishDiagnostics of a given document."""
+
+    def __init__(self, ls_session: session.LspSession):
+        self._uri = None
+        self._done = Event()
+        self.params = None
+        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, self._handler)
+
+    def _handler(self, params):
+        if params["uri"] == self._uri:
+            self.params = params
+            self._done.set()
+
+    def expect(self, uri: str) -> None:
+        """Starts waiting for diagnostics of `uri`; call before sending the trigger."""
+        self._uri = uri
+        self.params = None
+        self._done.clear()
+
+    def wait(self, timeout: float = DIAGNOSTICS_TIMEOUT) -> dict:
+        """Blocks until the expected diagnostics arrive."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"no diagnostics for {self._uri} within {timeout}s")
+        return self.params  # pyright: ignore
+
+
+def _text_document(path: pathlib.Path, version: int, text: str) -> dict:
+    return {
+        "uri": as_uri(str(path)),
+        "languageId": "python",
+        "version": version,
+        "text": text,
+    }
+
+
+def measure_initialize(root: pathlib.Path, iterations: int) -> list[float]:
+    """Times the initialize round trip of a freshly spawned server."""
+    samples = []
+    for _ in range(iterations):
+        with session.LspSession(cwd=root) as ls_session:
+            start = time.perf_counter()
+            ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _time_did_open(
+    ls_session: session.LspSession, files: list[pathlib.Path], iterations: int
+) -> list[float]:
+    samples = []
+    waiter = DiagnosticsWaiter(ls_session)
+    for i in range(iterations):
+        path = files[i % len(files)]
+        document = _text_document(path, 1, path.read_text())
+        waiter.expect(document["uri"])
+        start = time.perf_counter()
+        ls_session.notify_did_open({"textDocument": document})
+        waiter.wait()
+        samples.append(time.perf_counter() - start)
+        ls_session.notify_did_close({"textDocument": {"uri": document["uri"]}})
+    return samples
+
+
+def measure_did_open(
+    root: pathlib.Path, files: list[pathlib.Path], iterations: int
+) -> list[float]:
+    """Times didOpen until the server publishes diagnostics for the document."""
+    with session.LspSession(cwd=root) as ls_session:
+        ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+        return _time_did_open(ls_session, files, iterations)
+
+
+def measure_did_change(
+    root: pathlib.Path, files: list[pathlib.Path], iterations: int
+) -> list[float]:
+    """Times didChange until the server publishes diagnostics for the document.
+
+    tach checks files when they are saved, so each change is followed by a
+    didSave and the latency covers both notifications.
+    """
+    samples = []
+    with session.LspSession(cwd=root) as ls_session:
+        ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+        waiter = DiagnosticsWaiter(ls_session)
+        versions = {}
+        for path in files:
+            document = _text_document(path, 1, path.read_text())
+            waiter.expect(document["uri"])
+            ls_session.notify_did_open({"textDocument": document})
+            waiter.wait()
+            versions[document["uri"]] = 1
+
+        for i in range(iterations):
+            path = files[i % len(files)]
+            uri = as_uri(str(path))
+            versions[uri] += 1
+            waiter.expect(uri)
+            start = time.perf_counter()
+            ls_session.notify_did_change(
+                {
+                    "textDocument": {"uri": uri, "version": versions[uri]},
+                    "contentChanges": [{"text": path.read_text()}],
+                }
+            )
+            ls_session.notify_did_save({"textDocument": {"uri": uri}})
+            waiter.wait()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _size(message: dict) -> int:
+    return len(json.dumps(message, separators=(",", ":")).encode("utf-8"))
+
+
+def _open_all(ls_session: session.LspSession, files: list[pathlib.Path]) -> None:
+    waiter = DiagnosticsWaiter(ls_session)
+    for path in files:
+        document = _text_document(path, 1, path.read_text())
+        waiter.expect(document["uri"])
+        ls_session.notify_did_open({"textDocument": document})
+        waiter.wait()
+
+
+def measure_pull_diagnostics(
+    root: pathlib.Path, files: list[pathlib.Path], iterations: int
+) -> dict:
+    """Compares pushed and pulled diagnostics through the daemon.
+
+    Each sample saves a document and times how long its diagnostics take to be
+    pushed, pulled in full, or pulled with the previous result id, which reports
+    them unchanged. `pullCached` pulls with the previous result id without saving
+    first. `bytes` is the mean size of what the client received per document.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = pathlib.Path(tmp) / "tach.sock"
+        daemon = start_daemon(socket_path, root, DAEMON_IDLE_TIMEOUT)
+        try:
+            with session.LspSession(socket_path=socket_path) as ls_session:
+                ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+                _open_all(ls_session, files)
+                waiter = DiagnosticsWaiter(ls_session)
+                samples, sizes = [], []
+                for i in range(iterations):
+                    uri = as_uri(str(files[i % len(files)]))
+                    waiter.expect(uri)
+                    start = time.perf_counter()
+                    ls_session.notify_did_save({"textDocument": {"uri": uri}})
+                    sizes.append(_size(waiter.wait()))
+                    samples.append(time.perf_counter() - start)
+                results["push"] = {
+                    **summarize(samples),
+                    "bytes": sum(sizes) // len(sizes),
+                }
+
+            with session.LspSession(socket_path=socket_path) as ls_session:
+                ls_session.initialize(VSCODE_PULL_INITIALIZE)
+                _open_all(ls_session, files)
+                result_ids = {}
+                for path in files:
+                    uri = as_uri(str(path))
+                    report = ls_session.pull_diagnostics(uri).result(
+                        DIAGNOSTICS_TIMEOUT
+                    )
+                    result_ids[uri] = report["resultId"]
+                for name, save, previous in (
+                    ("pullFull", True, False),
+                    ("pullUnchanged", True, True),
+                    ("pullCached", False, True),
+                ):
+                    samples, sizes = [], []
+                    for i in range(iterations):
+                        uri = as_uri(str(files[i % len(files)]))
+                        start = time.perf_counter()
+                        if save:
+                            ls_session.notify_did_save({"textDocument": {"uri": uri}})
+                        report = ls_session.pull_diagnostics(
+                            uri, result_ids[uri] if previous else None
+                        ).result(DIAGNOSTICS_TIMEOUT)
+                        samples.append(time.perf_counter() - start)
+                        sizes.append(_size(report))
+                    results[name] = {
+                        **summarize(samples),
+                        "bytes": sum(sizes) // len(sizes),
+                    }
+        finally:
+            try:
+                daemon.wait(DAEMON_IDLE_TIMEOUT + DIAGNOSTICS_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                daemon.kill()
+    return results
+
+
+def run_benchmarks(
+    root: pathlib.Path = TEST_DATA, iterations: int = DEFAULT_ITERATIONS
+) -> dict:
+    """Runs every benchmark against the project at `root`."""
+    files = sorted(p for p in root.rglob("*.py") if p.name != "__init__.py")
+    return {
+        "initialize": summarize(measure_initialize(root, iterations)),
+        "didOpen": summarize(measure_did_open(root, files, iterations)),
+        "didChange": summarize(measure_did_change(root, files, iterations)),
+    }
+
+
+def measure_scaling(
+    module_counts: list[int],
+    files_per_module: int = 5,
+    iterations: int = DEFAULT_ITERATIONS,
+) -> list[dict]:
+    """Measures didOpen latency and server RSS on generated projects of growing size."""
+    curve = []
+    for modules in module_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            project = generate_project(
+                pathlib.Path(tmp), modules=modules, files_per_module=files_per_module
+            )
+            with session.LspSession(cwd=project.root) as ls_session:
+                ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+                samples = _time_did_open(ls_session, project.files, iterations)
+                rss_kb = get_rss_kb(ls_session.pid)
+            curve.append(
+                {
+                    "modules": modules,
+                    "files": len(project.files),
+                    "didOpen": summarize(samples),
+                    "rss_kb": rss_kb,
+                }
+            )
+    return curve
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[str]:
+    """Returns a description of every percentile that regressed past `threshold`."""
+    regressions = []
+    for name, summary in results.items():
+        for key, expected in baseline.get(name, {}).items():
+            if key == "iterations" or key not in summary:
+                continue
+            if summary[key] > expected * (1 + threshold):
+                regressions.append(
+                    f"{name} {key}: {summary[key]:.1f}ms vs baseline {expected:.1f}ms"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", type=pathlib.Path, default=TEST_DATA)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    parser.add_argument("--baseline", type=pathlib.Path, default=None)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--scaling",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=None,
+        help="Comma separated module counts to measure a scaling curve for.",
+    )
+    parser.add_argument(
+        "--pull",
+        action="store_true",
+        help="Compare pushed and pulled diagnostics through the daemon.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write the results to --baseline instead of comparing against it.",
+    )
+    args = parser.parse_args(argv)
+    if args.save_baseline and args.baseline is None:
+        parser.error("--save-baseline requires --baseline")
+
+    if args.scaling:
+        print(
+            json.dumps(
+                measure_scaling(args.scaling, iterations=args.iterations), indent=4
+            )
+        )
+        return 0
+
+    if args.pull:
+        files = sorted(p for p in args.root.rglob("*.py") if p.name != "__init__.py")
+        print(
+            json.dumps(
+                measure_pull_diagnostics(args.root, files, args.iterations), indent=4
+            )
+        )
+        return 0
+
+    results = run_benchmarks(args.root, args.iterations)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+
+    if args.baseline is None:
+        return 0
+    if args.save_baseline:
+        args.baseline.write_text(output + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}, record one with --save-baseline",
+            file=sys.stderr,
+        )
+        return 1
+
+    regressions = compare(
+        results, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold
+    )
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
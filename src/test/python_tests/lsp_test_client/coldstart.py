@@ -0,0 +1,214 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Compares server cold starts from the bundled libs and from the environment.
+
+Each run spawns `python -X importtime -m tach server`, times it up to the
+initialize response and adds up the time spent importing modules.
+
+Run from `src/test`:
+    python -m python_tests.lsp_test_client.coldstart --iterations 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+# Only the standard library: the bundle build traces imports with interpreters that
+# don't have the test requirements installed.
+from .constants import (
+    BUNDLED_PYTHON_LIBS_DIR,
+    CONTENT_LENGTH,
+    PUBLISH_DIAGNOSTICS,
+    TEST_DATA,
+)
+from .defaults import VSCODE_DEFAULT_INITIALIZE
+from .utils import as_uri, server_env
+
+# Measured in seconds
+LSP_EXIT_TIMEOUT = 5
+
+DEFAULT_ITERATIONS = 10
+SOURCES = ("bundled", "environment")
+
+
+def parse_importtime(output: str) -> dict[str, int]:
+    """Maps each module in `-X importtime` output to its own import time, in us."""
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The column header.
+            continue
+        imports[fields[2].strip()] = int(fields[0])
+    return imports
+
+
+def top_level_modules(imports: dict[str, int]) -> set[str]:
+    """Returns the top-level packages of the imported modules."""
+    return {name.split(".")[0] for name in imports}
+
+
+def _send(process: subprocess.Popen, message: dict) -> None:
+    body = json.dumps(message).encode("utf-8")
+    process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)  # type: ignore
+    process.stdin.flush()  # type: ignore
+
+
+def _receive(process: subprocess.Popen) -> dict:
+    header = b""
+    while not header.endswith(b"\r\n\r\n"):
+        line = process.stdout.readline()  # type: ignore
+        if not line:
+            raise RuntimeError("server exited before answering")
+        header += line
+    # The server may print plain text before a header; only the length matters.
+    match = CONTENT_LENGTH.search(header)
+    if match is None:
+        return _receive(process)
+    return json.loads(process.stdout.read(int(match.group(1))))  # type: ignore
+
+
+def _wait_for(process: subprocess.Popen, predicate) -> dict:
+    while True:
+        message = _receive(process)
+        if predicate(message):
+            return message
+
+
+def cold_start(
+    python: str,
+    root: pathlib.Path,
+    bundled: pathlib.Path | None,
+    document: pathlib.Path | None = None,
+) -> dict:
+    """Starts a server and returns its initialize latency and import time, in seconds.
+
+    With a `document`, the server also lints it before shutting down, so the
+    reported modules cover everything imported up to the first diagnostics.
+    """
+    # importtime writes a line per module; a file keeps a full pipe from stalling the server.
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [python, "-X", "importtime", "-m", "tach", "server"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            cwd=root,
+            env=server_env(bundled),
+        )
+        try:
+            _send(
+                process,
+                {
+                    "jsonrpc": "2.0",
+                    "id": 0,
+                    "method": "initialize",
+                    "params": VSCODE_DEFAULT_INITIALIZE,
+                },
+            )
+            _wait_for(process, lambda m: m.get("id") == 0)
+            initialized = time.perf_counter()
+            _send(process, {"jsonrpc": "2.0", "method": "initialized", "params": {}})
+            if document is not None:
+                uri = as_uri(str(document))
+                _send(
+                    process,
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "textDocument/didOpen",
+                        "params": {
+                            "textDocument": {
+                                "uri": uri,
+                                "languageId": "python",
+                                "version": 1,
+                                "text": document.read_text(),
+                            }
+                        },
+                    },
+                )
+                _wait_for(
+                    process,
+                    lambda m: m.get("method") == PUBLISH_DIAGNOSTICS
+                    and m["params"]["uri"] == uri,
+                )
+            _send(process, {"jsonrpc": "2.0", "id": 1, "method": "shutdown"})
+            _wait_for(process, lambda m: m.get("id") == 1)
+            _send(process, {"jsonrpc": "2.0", "method": "exit"})
+            process.wait(LSP_EXIT_TIMEOUT)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        stderr.seek(0)
+        imports = parse_importtime(stderr.read().decode("utf-8", "replace"))
+    return {
+        "initialize": initialized - start,
+        "imports": sum(imports.values()) / 1_000_000,
+        "modules": sorted(top_level_modules(imports)),
+    }
+
+
+def has_tach(python: str, bundled: pathlib.Path | None) -> bool:
+    """Whether `python` can import tach from the given source."""
+    result = subprocess.run(
+        [python, "-c", "import tach"],
+        env=server_env(bundled),
+        capture_output=True,
+        check=False,
+    )
+    return result.returncode == 0
+
+
+def run_coldstart(
+    python: str = sys.executable,
+    root: pathlib.Path = TEST_DATA,
+    bundled: pathlib.Path = BUNDLED_PYTHON_LIBS_DIR,
+    iterations: int = DEFAULT_ITERATIONS,
+) -> dict:
+    """Summarizes cold starts of every source of tach that `python` can import."""
+    from .benchmark import summarize
+
+    sources = {"bundled": bundled, "environment": None}
+    results = {}
+    for name in SOURCES:
+        path = sources[name]
+        if path is not None and not path.is_dir():
+            continue
+        if not has_tach(python, path):
+            continue
+        runs = [cold_start(python, root, path) for _ in range(iterations)]
+        results[name] = {
+            "initialize": summarize([run["initialize"] for run in runs]),
+            "imports": summarize([run["imports"] for run in runs]),
+        }
+    if len(results) == len(SOURCES):
+        bundled_p50 = results["bundled"]["initialize"]["p50"]
+        environment_p50 = results["environment"]["initialize"]["p50"]
+        results["initializeRatio"] = round(bundled_p50 / environment_p50, 3)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--root", type=pathlib.Path, default=TEST_DATA)
+    parser.add_argument("--bundled", type=pathlib.Path, default=BUNDLED_PYTHON_LIBS_DIR)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    args = parser.parse_args(argv)
+    results = run_coldstart(args.python, args.root, args.bundled, args.iterations)
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
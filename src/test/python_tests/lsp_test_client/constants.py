@@ -7,9 +7,15 @@ Constants for use with tests.
 from __future__ import annotations
 
 import pathlib
+import re
 
 TEST_ROOT = pathlib.Path(__file__).parent.parent
 PROJECT_ROOT = TEST_ROOT.parent.parent.parent
 TEST_DATA = TEST_ROOT / "test_data"
 
 BUNDLED_PYTHON_LIBS_DIR = PROJECT_ROOT / "bundled" / "libs"
+BUNDLED_DAEMON_SCRIPT = PROJECT_ROOT / "bundled" / "tool" / "lsp_daemon.py"
+
+PUBLISH_DIAGNOSTICS = "textDocument/publishDiagnostics"
+
+CONTENT_LENGTH = re.compile(rb"Content-Length:\s*(\d+)", re.IGNORECASE)
@@ -6,6 +6,7 @@ Default initialize request params.
 
 from __future__ import annotations
 
+import copy
 import os
 
 from .constants import PROJECT_ROOT
@@ -219,3 +220,13 @@ VSCODE_DEFAULT_INITIALIZE = {
     "workspaceFolders": [{"uri": as_uri(str(PROJECT_ROOT)), "name": "my_project"}],
     "initializationOptions": get_initialization_options(),
 }
+
+# The same client, pulling diagnostics (LSP 3.17) instead of having them pushed.
+VSCODE_PULL_INITIALIZE = copy.deepcopy(VSCODE_DEFAULT_INITIALIZE)
+VSCODE_PULL_INITIALIZE["capabilities"]["textDocument"]["diagnostic"] = {
+    "dynamicRegistration": True,
+    "relatedDocumentSupport": False,
+}
+VSCODE_PULL_INITIALIZE["capabilities"]["workspace"]["diagnostics"] = {
+    "refreshSupport": True
+}
@@ -0,0 +1,148 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Synthetic tach project generator for scaling and correctness tests.
+"""
+
+from __future__ import annotations
+
+import pathlib
+import random
+
+from .utils import as_uri
+
+# Every module exposes the members of this file through [[interfaces]].
+INTERFACE_FILE = "api"
+
+
+class GeneratedProject:
+    """A generated project and the diagnostics tach should report for it."""
+
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.modules: list[str] = []
+        self.depends_on: dict[str, list[str]] = {}
+        self.files: list[pathlib.Path] = []
+        # publishDiagnostics params keyed by document uri
+        self.expected: dict[str, dict] = {}
+
+    @property
+    def violation_count(self) -> int:
+        return sum(len(e["diagnostics"]) for e in self.expected.values())
+
+
+def normalize(publish_diagnostics_params: dict) -> dict:
+    """Orders diagnostics by position, since tach groups them by kind."""
+    diagnostics = sorted(
+        publish_diagnostics_params["diagnostics"],
+        key=lambda d: (d["range"]["start"]["line"], d["message"]),
+    )
+    return {**publish_diagnostics_params, "diagnostics": diagnostics}
+
+
+def _diagnostic(line: int, message: str) -> dict:
+    return {
+        "range": {
+            "start": {"line": line, "character": 0},
+            "end": {"line": line, "character": 99999},
+        },
+        "message": message,
+        "severity": 1,
+        "source": "tach",
+    }
+
+
+def _write_config(project: GeneratedProject, interfaces: bool) -> None:
+    lines = ['exclude = ["docs", "tests"]', 'source_roots = ["."]', ""]
+    for module in project.modules:
+        deps = ", ".join(f'{{ path = "{d}" }}' for d in project.depends_on[module])
+        lines += ["[[modules]]", f'path = "{module}"', f"depends_on = [{deps}]", ""]
+    if interfaces:
+        members = ", ".join(f'"{m}"' for m in project.modules)
+        lines += [
+            "[[interfaces]]",
+            f'expose = ["{INTERFACE_FILE}.*"]',
+            f"from = [{members}]",
+            "",
+        ]
+    (project.root / "tach.toml").write_text("\n".join(lines), encoding="utf-8")
+
+
+def generate_project(
+    root: pathlib.Path,
+    modules: int = 10,
+    files_per_module: int = 5,
+    fan_out: int = 3,
+    depends_on_density: float = 0.5,
+    interfaces: bool = True,
+    violation_rate: float = 0.1,
+    seed: int = 0,
+) -> GeneratedProject:
+    """Writes a tach project under `root`.
+
+    Each module gets an interface file plus `files_per_module` files, each of which
+    imports from up to `fan_out` other modules. A module declares a dependency on
+    each other module with probability `depends_on_density`. Each import is turned
+    into a violation with probability `violation_rate`: an import of an undeclared
+    dependency, or (with `interfaces`) of a member outside the public interface.
+    """
+    rng = random.Random(seed)
+    project = GeneratedProject(root)
+    project.modules = [f"mod_{i:04d}" for i in range(modules)]
+    for module in project.modules:
+        others = [m for m in project.modules if m != module]
+        project.depends_on[module] = [
+            m for m in others if rng.random() < depends_on_density
+        ]
+
+    root.mkdir(parents=True, exist_ok=True)
+    _write_config(project, interfaces)
+
+    for module in project.modules:
+        package = root / module
+        package.mkdir(exist_ok=True)
+        (package / "__init__.py").write_text("", encoding="utf-8")
+        (package / f"{INTERFACE_FILE}.py").write_text("VALUE = 0\n", encoding="utf-8")
+
+        allowed = project.depends_on[module]
+        forbidden = [m for m in project.modules if m != module and m not in allowed]
+        for index in range(files_per_module):
+            path = package / f"file_{index}.py"
+            lines = [
+                "# Generated by lsp_test_client.generator",
+                "from __future__ import annotations",
+                "",
+            ]
+            diagnostics = []
+            for _ in range(fan_out):
+                violate = rng.random() < violation_rate
+                if (
+                    violate
+                    and forbidden
+                    and (not interfaces or not allowed or rng.random() < 0.5)
+                ):
+                    target = rng.choice(forbidden)
+                    member = f"{target}.{INTERFACE_FILE}.VALUE"
+                    message = f"Cannot use '{member}'. Module '{module}' cannot depend on '{target}'."
+                elif violate and interfaces and allowed:
+                    target = rng.choice(allowed)
+                    member = f"{target}.file_0.VALUE_0"
+                    message = f"The path '{member}' is not part of the public interface for '{target}'."
+                elif allowed:
+                    target = rng.choice(allowed)
+                    member = f"{target}.{INTERFACE_FILE}.VALUE"
+                    message = None
+                else:
+                    continue
+                if message:
+                    diagnostics.append(_diagnostic(len(lines), message))
+                parent, name = member.rsplit(".", 1)
+                lines.append(
+                    f"from {parent} import {name} as {target.upper()}_{len(lines)}"
+                )
+            lines += ["", f"VALUE_{index} = {index}", ""]
+            path.write_text("\n".join(lines), encoding="utf-8")
+            project.files.append(path)
+            uri = as_uri(str(path))
+            project.expected[uri] = {"uri": uri, "diagnostics": diagnostics}
+    return project
@@ -0,0 +1,546 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Multi-client load test for the tach language server.
+
+Each client stands for one developer: it opens its documents all at once, then
+changes, saves and closes them at the configured rates, and now and then drops its
+connection without shutting down before reconnecting. Saves flip a file between
+its generated content and a copy with every import commented out, so the
+diagnostics each save should produce are known and stale ones can be told apart.
+
+By default each client runs its own server on its own generated project, so a run
+measures how many servers one machine can host: its per-machine throughput. With
+`--shared`, every client connects to one server through the daemon, on one
+project holding every client's modules, which measures the capacity of a server.
+
+Run from `src/test`:
+    python -m python_tests.lsp_test_client.loadtest --clients 8 --duration 60
+    python -m python_tests.lsp_test_client.loadtest --capacity --slo-ms 500
+    python -m python_tests.lsp_test_client.loadtest --shared --capacity
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import pathlib
+import random
+import sys
+import tempfile
+import time
+from subprocess import TimeoutExpired
+
+from .async_session import AsyncLspSession
+from .benchmark import summarize
+from .defaults import VSCODE_DEFAULT_INITIALIZE
+from .generator import GeneratedProject, generate_project, normalize
+from .session import PUBLISH_DIAGNOSTICS
+from .utils import as_uri, get_rss_kb, start_daemon
+
+# Measured in seconds
+DEFAULT_DURATION = 30
+DRAIN_TIMEOUT = 10
+DRAIN_POLL = 0.05
+RSS_INTERVAL = 1
+# Short, so the shared server stops soon after the last client disconnects.
+DAEMON_IDLE_TIMEOUT = 1
+
+DEFAULT_CLIENTS = 4
+DEFAULT_MAX_CLIENTS = 64
+DEFAULT_MODULES = 10
+DEFAULT_FILES_PER_MODULE = 5
+DEFAULT_SLO_MS = 1000
+
+# Events per second, per client.
+DEFAULT_RATES = {"change": 10.0, "save": 2.0, "close": 0.5, "exit": 0.02}
+
+
+def _edited(text: str) -> str:
+    """Comments out every import, which leaves a generated file without violations."""
+    return "\n".join(
+        f"# {line}" if line.startswith("from ") else line for line in text.split("\n")
+    )
+
+
+class _Stats:
+    """Counters shared by every client of a run."""
+
+    def __init__(self):
+        self.events = {name: 0 for name in ("open", *DEFAULT_RATES)}
+        self.latencies: list[float] = []
+        self.published = 0
+        self.stale = 0
+        # Opens and saves still unanswered when their client dropped its connection.
+        self.lost = 0
+        # Servers that had to be killed after their client dropped its connection.
+        self.orphaned = 0
+        self.rss: list[dict] = []
+
+
+class _Client:
+    """One simulated developer: its connection, its files and the documents it has open."""
+
+    def __init__(
+        self,
+        project: GeneratedProject,
+        files: list[pathlib.Path],
+        stats: _Stats,
+        rates: dict,
+        documents: int | None,
+        rng: random.Random,
+        python: str | None,
+        socket_path: pathlib.Path | None,
+    ):
+        self.project = project
+        self.stats = stats
+        self.rates = rates
+        self.rng = rng
+        self.python = python
+        self.socket_path = socket_path
+        self.session: AsyncLspSession | None = None
+        self.paths = {as_uri(str(path)): path for path in files}
+        self.original = {
+            uri: path.read_text(encoding="utf-8") for uri, path in self.paths.items()
+        }
+        # Documents whose file currently has its imports commented out.
+        self.edited: set[str] = set()
+        self.buffers = dict(self.original)
+        self.versions = {uri: 1 for uri in self.paths}
+        uris = sorted(self.paths)
+        self.open = set(rng.sample(uris, min(documents or len(uris), len(uris))))
+        # Start times of the opens and saves each document is waiting diagnostics for,
+        # with None for publishes to skip: the clearing on close, and answers meant for
+        # a document before it was closed.
+        self.pending: dict[str, list[float | None]] = {}
+        self.published: dict[str, dict] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return sum(
+            start is not None for queue in self.pending.values() for start in queue
+        )
+
+    def expected(self, uri: str) -> dict:
+        if uri in self.edited:
+            return {"uri": uri, "diagnostics": []}
+        return normalize(self.project.expected[uri])
+
+    def _on_diagnostics(self, params):
+        now = time.perf_counter()
+        uri = params["uri"]
+        queue = self.pending.get(uri)
+        if not queue:
+            return
+        # The server answers every open, save and close with one publish, in order.
+        start = queue.pop(0)
+        if start is None:
+            return
+        self.stats.published += 1
+        self.published[uri] = params
+        self.stats.latencies.append(now - start)
+        if all(s is None for s in queue) and normalize(params) != self.expected(uri):
+            self.stats.stale += 1
+
+    def _expect(self, uri: str) -> None:
+        self.pending.setdefault(uri, []).append(time.perf_counter())
+
+    async def connect(self) -> None:
+        """Connects to a server and opens every document the client has open at once."""
+        self.session = AsyncLspSession(
+            cwd=self.project.root,
+            python=self.python,
+            stderr=asyncio.subprocess.DEVNULL,
+            socket_path=self.socket_path,
+        )
+        await self.session.__aenter__()
+        self.session.set_notification_callback(
+            PUBLISH_DIAGNOSTICS, self._on_diagnostics
+        )
+        await self.session.initialize(VSCODE_DEFAULT_INITIALIZE)
+        for uri in sorted(self.open):
+            await self._open(uri)
+
+    async def disconnect(self) -> None:
+        await self.session.__aexit__(None, None, None)  # pyright: ignore
+
+    async def run(self, deadline: float) -> None:
+        """Sends events at the configured rates until `deadline`."""
+        names = [name for name, rate in self.rates.items() if rate > 0]
+        weights = [self.rates[name] for name in names]
+        total = sum(weights)
+        while total > 0:
+            delay = self.rng.expovariate(total)
+            if time.perf_counter() + delay > deadline:
+                break
+            await asyncio.sleep(delay)
+            event = self.rng.choices(names, weights)[0]
+            self.stats.events[event] += 1
+            await getattr(self, f"_{event}")()
+
+    async def _open(self, uri: str) -> None:
+        self.open.add(uri)
+        self.stats.events["open"] += 1
+        self._expect(uri)
+        await self.session.notify_did_open(  # pyright: ignore
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": self.versions[uri],
+                    "text": self.buffers[uri],
+                }
+            }
+        )
+
+    async def _replace(self, uri: str, text: str) -> None:
+        self.buffers[uri] = text
+        self.versions[uri] += 1
+        await self.session.notify_did_change(  # pyright: ignore
+            {
+                "textDocument": {"uri": uri, "version": self.versions[uri]},
+                "contentChanges": [{"text": text}],
+            }
+        )
+
+    async def _change(self) -> None:
+        uri = self.rng.choice(sorted(self.open))
+        await self._replace(uri, f"{self.buffers[uri]}# {self.versions[uri]}\n")
+
+    async def _save(self) -> None:
+        uri = self.rng.choice(sorted(self.open))
+        self.edited ^= {uri}
+        text = self.original[uri]
+        if uri in self.edited:
+            text = _edited(text)
+        self.paths[uri].write_text(text, encoding="utf-8")
+        await self._replace(uri, text)
+        self._expect(uri)
+        await self.session.notify_did_save(  # pyright: ignore
+            {"textDocument": {"uri": uri}}
+        )
+
+    async def _close(self) -> None:
+        uri = self.rng.choice(sorted(self.open))
+        self.open.discard(uri)
+        self.pending[uri] = [None] * (len(self.pending.get(uri, [])) + 1)
+        self.published.pop(uri, None)
+        await self.session.notify_did_close(  # pyright: ignore
+            {"textDocument": {"uri": uri}}
+        )
+        closed = sorted(set(self.paths) - self.open - {uri})
+        await self._open(self.rng.choice(closed) if closed else uri)
+
+    async def _exit(self) -> None:
+        self.stats.lost += self.pending_count
+        self.pending.clear()
+        if not await self.session.abort():  # pyright: ignore
+            self.stats.orphaned += 1
+        await self.disconnect()
+        await self.connect()
+
+
+def _children(pid: int) -> list[int]:
+    """Child process ids, on Linux only."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="utf8") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+async def _sample_rss(
+    clients: list[_Client], stats: _Stats, start: float, daemon_pid: int | None
+) -> None:
+    while True:
+        if daemon_pid is None:
+            pids = [c.session.pid for c in clients if c.session]
+        else:
+            pids = [daemon_pid, *_children(daemon_pid)]
+        samples = [get_rss_kb(pid) for pid in pids]
+        samples = [s for s in samples if s is not None]
+        if samples:
+            stats.rss.append(
+                {
+                    "t": round(time.perf_counter() - start, 1),
+                    "totalKb": sum(samples),
+                    "maxKb": max(samples),
+                }
+            )
+        await asyncio.sleep(RSS_INTERVAL)
+
+
+async def _run(
+    projects: list[tuple[GeneratedProject, list[pathlib.Path]]],
+    duration: float,
+    rates: dict,
+    documents: int | None,
+    seed: int,
+    python: str | None,
+    socket_path: pathlib.Path | None,
+    daemon_pid: int | None,
+) -> dict:
+    stats = _Stats()
+    clients = [
+        _Client(
+            project,
+            files,
+            stats,
+            rates,
+            documents,
+            random.Random(seed + i),
+            python,
+            socket_path,
+        )
+        for i, (project, files) in enumerate(projects)
+    ]
+    start = time.perf_counter()
+    sampler = asyncio.create_task(_sample_rss(clients, stats, start, daemon_pid))
+    try:
+        await asyncio.gather(*(client.connect() for client in clients))
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client.run(deadline) for client in clients))
+
+        drain = time.perf_counter() + DRAIN_TIMEOUT
+        while any(c.pending_count for c in clients) and time.perf_counter() < drain:
+            await asyncio.sleep(DRAIN_POLL)
+        elapsed = time.perf_counter() - start
+    finally:
+        sampler.cancel()
+        await asyncio.gather(
+            *(client.disconnect() for client in clients if client.session)
+        )
+
+    stale_at_end = sum(
+        1
+        for client in clients
+        for uri in client.open
+        if uri not in client.published
+        or normalize(client.published[uri]) != client.expected(uri)
+    )
+    return {
+        "clients": len(clients),
+        "servers": 1 if socket_path else len(clients),
+        "documents": sum(len(client.open) for client in clients),
+        "durationSeconds": round(elapsed, 3),
+        "events": stats.events,
+        "diagnostics": stats.published,
+        "diagnosticsPerSecond": round(stats.published / elapsed, 3),
+        "latency": summarize(stats.latencies) if stats.latencies else {},
+        "dropped": sum(client.pending_count for client in clients),
+        "stale": stats.stale,
+        "staleAtEnd": stale_at_end,
+        "lost": stats.lost,
+        "orphanedServers": stats.orphaned,
+        "peakRssKb": max((s["totalKb"] for s in stats.rss), default=None),
+        "rss": stats.rss,
+    }
+
+
+def run_load_test(
+    clients: int = DEFAULT_CLIENTS,
+    duration: float = DEFAULT_DURATION,
+    rates: dict | None = None,
+    documents: int | None = None,
+    modules: int = DEFAULT_MODULES,
+    files_per_module: int = DEFAULT_FILES_PER_MODULE,
+    seed: int = 0,
+    python: str | None = None,
+    shared: bool = False,
+) -> dict:
+    """Runs `clients` simulated developers for `duration` seconds and reports on the servers.
+
+    Each client opens `documents` of its `modules` modules' files (all by default).
+    With `shared`, every client connects to one server through the daemon and the
+    clients' modules make up one project; otherwise each client runs its own server
+    on its own project. `rates` overrides the events per second of `DEFAULT_RATES`.
+    Diagnostics still missing once the traffic stops and the servers had
+    `DRAIN_TIMEOUT` to catch up are reported as dropped; stale ones did not match
+    the file on disk when they were the answer to a document's latest open or save.
+    """
+    rates = {**DEFAULT_RATES, **(rates or {})}
+    with tempfile.TemporaryDirectory() as tmp:
+        if not shared:
+            projects = [
+                generate_project(
+                    pathlib.Path(tmp) / f"client_{i}",
+                    modules=modules,
+                    files_per_module=files_per_module,
+                    seed=seed + i,
+                )
+                for i in range(clients)
+            ]
+            return asyncio.run(
+                _run(
+                    [(project, project.files) for project in projects],
+                    duration,
+                    rates,
+                    documents,
+                    seed,
+                    python,
+                    None,
+                    None,
+                )
+            )
+
+        project = generate_project(
+            pathlib.Path(tmp) / "project",
+            modules=modules * clients,
+            files_per_module=files_per_module,
+            seed=seed,
+        )
+        # Clients edit disjoint files, so each knows what its saves should produce.
+        per_client = modules * files_per_module
+        files = [
+            project.files[i * per_client : (i + 1) * per_client] for i in range(clients)
+        ]
+        socket_path = pathlib.Path(tmp) / "tach.sock"
+        daemon = start_daemon(socket_path, project.root, DAEMON_IDLE_TIMEOUT, python)
+        try:
+            return asyncio.run(
+                _run(
+                    [(project, f) for f in files],
+                    duration,
+                    rates,
+                    documents,
+                    seed,
+                    python,
+                    socket_path,
+                    daemon.pid,
+                )
+            )
+        finally:
+            try:
+                daemon.wait(DRAIN_TIMEOUT)
+            except TimeoutExpired:
+                daemon.kill()
+                daemon.wait()
+
+
+def within_slo(report: dict, slo_ms: float) -> bool:
+    """Whether a run dropped nothing, ended up current and kept p95 latency under `slo_ms`."""
+    return (
+        report["dropped"] == 0
+        and report["staleAtEnd"] == 0
+        and bool(report["latency"])
+        and report["latency"]["p95"] <= slo_ms
+    )
+
+
+def find_capacity(
+    slo_ms: float = DEFAULT_SLO_MS, max_clients: int = DEFAULT_MAX_CLIENTS, **options
+) -> dict:
+    """Doubles the number of clients until a run misses the service level objective.
+
+    The capacity is the largest number of clients that stayed within it.
+    """
+    runs = []
+    capacity = 0
+    clients = 1
+    while clients <= max_clients:
+        report = run_load_test(clients, **options)
+        runs.append(report)
+        if not within_slo(report, slo_ms):
+            break
+        capacity = clients
+        clients *= 2
+    return {"sloMs": slo_ms, "capacity": capacity, "runs": runs}
+
+
+def describe(report: dict) -> str:
+    """One line summary of a run."""
+    latency = report["latency"]
+    peak = report["peakRssKb"]
+    return (
+        f"{report['clients']} client(s) on {report['servers']} server(s), "
+        f"{report['documents']} documents: "
+        f"{report['diagnosticsPerSecond']:.1f} diagnostics/s, "
+        f"p50 {latency.get('p50', float('nan')):.1f}ms, "
+        f"p95 {latency.get('p95', float('nan')):.1f}ms, "
+        f"p99 {latency.get('p99', float('nan')):.1f}ms, "
+        f"{report['dropped']} dropped, {report['stale']} stale, "
+        f"{report['staleAtEnd']} stale at end, "
+        f"peak RSS {peak / 1024 if peak else float('nan'):.1f}MB"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=None,
+        help="Documents each client keeps open; all of its project by default.",
+    )
+    parser.add_argument("--modules", type=int, default=DEFAULT_MODULES)
+    parser.add_argument(
+        "--files-per-module", type=int, default=DEFAULT_FILES_PER_MODULE
+    )
+    for name, rate in DEFAULT_RATES.items():
+        parser.add_argument(
+            f"--{name}-rate",
+            type=float,
+            default=rate,
+            help=f"{name} events per second, per client.",
+        )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--python", default=None)
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    parser.add_argument(
+        "--capacity",
+        action="store_true",
+        help="Double the clients from 1 until a run misses --slo-ms.",
+    )
+    parser.add_argument("--slo-ms", type=float, default=DEFAULT_SLO_MS)
+    parser.add_argument("--max-clients", type=int, default=DEFAULT_MAX_CLIENTS)
+    parser.add_argument(
+        "--shared",
+        action="store_true",
+        help="Connect every client to one server through the daemon.",
+    )
+    args = parser.parse_args(argv)
+
+    options = {
+        "duration": args.duration,
+        "rates": {name: getattr(args, f"{name}_rate") for name in DEFAULT_RATES},
+        "documents": args.documents,
+        "modules": args.modules,
+        "files_per_module": args.files_per_module,
+        "seed": args.seed,
+        "python": args.python,
+        "shared": args.shared,
+    }
+    if args.capacity:
+        results = find_capacity(args.slo_ms, args.max_clients, **options)
+        reports = results["runs"]
+    else:
+        results = run_load_test(args.clients, **options)
+        reports = [results]
+
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    for report in reports:
+        print(describe(report), file=sys.stderr)
+    if args.capacity:
+        scope = "one shared server" if args.shared else "one server per client"
+        print(
+            f"Capacity: {results['capacity']} client(s) within a p95 of {args.slo_ms:g}ms, "
+            f"with {scope}",
+            file=sys.stderr,
+        )
+    if not args.shared:
+        print(
+            "Each client ran its own server: this is per-machine throughput, "
+            "pass --shared for the capacity of one server.",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Pool of warm, initialized LSP sessions shared between tests.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import pathlib
+from threading import Event, Lock
+
+from . import session
+from .defaults import VSCODE_DEFAULT_INITIALIZE
+
+# Measured in seconds
+RESET_TIMEOUT = 2
+
+CONFIG_FILES = ("tach.toml", "pyproject.toml")
+
+
+def config_fingerprint(root: pathlib.Path) -> str:
+    """Hashes the tach config files of a project."""
+    digest = hashlib.sha256()
+    paths = [root / name for name in CONFIG_FILES]
+    paths += sorted(root.rglob("tach.domain.toml"))
+    for path in paths:
+        digest.update(str(path).encode())
+        digest.update(path.read_bytes() if path.exists() else b"")
+    return digest.hexdigest()
+
+
+class SessionPool:
+    """Hands out initialized sessions per project root and takes them back for reuse.
+
+    A released session has its documents closed and its notification callbacks
+    reset. It is only discarded when the server crashed, or when the project's
+    config changed and the server can't reload it in place.
+    """
+
+    def __init__(self, initialize_params=None):
+        self._initialize_params = initialize_params or VSCODE_DEFAULT_INITIALIZE
+        self._lock = Lock()
+        self._idle: dict[pathlib.Path, list[session.LspSession]] = {}
+        self._info: dict[session.LspSession, dict] = {}
+        self.started = 0
+
+    def acquire(self, root: pathlib.Path) -> session.LspSession:
+        """Returns an idle session for `root`, starting one if there is none."""
+        root = pathlib.Path(root).resolve()
+        with self._lock:
+            idle = self._idle.get(root, [])
+            while idle:
+                ls_session = idle.pop()
+                if ls_session.running:
+                    return ls_session
+                self._discard(ls_session)
+        return self._start(root)
+
+    def release(self, ls_session: session.LspSession) -> None:
+        """Resets a session and makes it available to the next test."""
+        info = self._info[ls_session]
+        if not ls_session.running or not self._reset(ls_session, info):
+            self._discard(ls_session)
+            return
+        with self._lock:
+            self._idle.setdefault(info["root"], []).append(ls_session)
+
+    def close(self) -> None:
+        """Shuts down every idle session."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for ls_session in sessions:
+            self._discard(ls_session)
+
+    def _start(self, root: pathlib.Path) -> session.LspSession:
+        ls_session = session.LspSession(cwd=root).__enter__()
+        capabilities = {}
+        ls_session.initialize(
+            self._initialize_params, process_server_capabilities=capabilities.update
+        )
+        experimental = capabilities["capabilities"].get("experimental") or {}
+        self._info[ls_session] = {
+            "root": root,
+            "fingerprint": config_fingerprint(root),
+            "config_reload": bool(experimental.get("configReload")),
+        }
+        self.started += 1
+        return ls_session
+
+    def _discard(self, ls_session: session.LspSession) -> None:
+        self._info.pop(ls_session, None)
+        try:
+            ls_session.__exit__(None, None, None)
+        except Exception:
+            # The server may already be gone after a crash.
+            pass
+
+    def _reset(self, ls_session: session.LspSession, info: dict) -> bool:
+        """Closes open documents and reloads changed config; False if it can't."""
+        closed = {uri: Event() for uri in ls_session.open_documents}
+
+        def _handler(params):
+            if params["uri"] in closed:
+                closed[params["uri"]].set()
+
+        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+        for uri in list(closed):
+            ls_session.notify_did_close({"textDocument": {"uri": uri}})
+        # tach publishes empty diagnostics for a closed document; waiting for them
+        # keeps them from reaching the next test's callbacks.
+        for event in closed.values():
+            event.wait(RESET_TIMEOUT)
+        ls_session.clear_notification_callbacks()
+
+        fingerprint = config_fingerprint(info["root"])
+        if fingerprint == info["fingerprint"]:
+            return True
+        if not info["config_reload"]:
+            return False
+        ls_session.notify_did_change_watched_files(
+            {
+                "changes": [
+                    {"uri": (info["root"] / name).as_uri(), "type": 2}
+                    for name in CONFIG_FILES
+                ]
+            }
+        )
+        ls_session.notify_did_change_configuration({"settings": {}})
+        info["fingerprint"] = fingerprint
+        return True
@@ -0,0 +1,214 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Replays LSP traces recorded by the extension (`tach.recordTrace`) against tach.
+
+Run from `src/test`:
+    python -m python_tests.lsp_test_client.replay trace.jsonl.gz --root path/to/project
+    python -m python_tests.lsp_test_client.replay trace.jsonl.gz --root path/to/project \\
+        --asap --python old-venv/bin/python --python new-venv/bin/python
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import pathlib
+import re
+import sys
+import time
+from concurrent.futures import wait
+from threading import Event, Lock
+from urllib.parse import unquote, urlparse
+
+from . import session
+from .benchmark import DIAGNOSTICS_TIMEOUT, summarize
+from .utils import as_uri
+
+TRACE_FORMAT = 1
+
+# Client messages the server answers by publishing diagnostics for the document.
+DIAGNOSTIC_TRIGGERS = (
+    "textDocument/didOpen",
+    "textDocument/didChange",
+    "textDocument/didSave",
+    "textDocument/diagnostic",
+)
+
+# Sent by LspSession itself when the session starts and ends.
+SESSION_MESSAGES = ("initialized", "shutdown", "exit")
+
+# Measured in seconds
+DRAIN_GRACE = 1
+
+
+def load_trace(path: pathlib.Path) -> tuple[dict, list[dict]]:
+    """Returns the header and messages of a trace, gzipped or not."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as trace:
+        lines = [json.loads(line) for line in trace if line.strip()]
+    if not lines or lines[0].get("format") != TRACE_FORMAT:
+        raise ValueError(f"{path} is not a version {TRACE_FORMAT} trace")
+    return lines[0], lines[1:]
+
+
+def rewrite_paths(message: dict, recorded_root: str, root: pathlib.Path) -> dict:
+    """Points uris and paths under the recorded workspace at `root` instead."""
+    recorded_path = unquote(urlparse(recorded_root).path)
+    replacements = {recorded_root: as_uri(str(root)), recorded_path: str(root)}
+    pattern = "|".join(re.escape(k) for k in replacements)
+    text = re.sub(pattern, lambda m: replacements[m.group()], json.dumps(message))
+    return json.loads(text)
+
+
+def replay(
+    trace: tuple[dict, list[dict]],
+    root: pathlib.Path,
+    speed: float | None = 1.0,
+    python: str | None = None,
+    timeout: float = DIAGNOSTICS_TIMEOUT,
+) -> dict:
+    """Sends the client messages of a trace to a new server and measures its replies.
+
+    With `speed` messages keep their recorded spacing, divided by `speed`; with
+    None they are sent as fast as possible.
+    """
+    header, messages = trace
+    client_messages = [
+        (m["t"], rewrite_paths(m["m"], header["root"], root))
+        for m in messages
+        if m["d"] == "c" and "method" in m["m"]
+    ]
+    lock = Lock()
+    settled = Event()
+    # Send time of the earliest trigger not yet followed by diagnostics, per uri.
+    awaiting: dict[str, float] = {}
+    diagnostics: list[float] = []
+    requests: dict[str, list[float]] = {}
+    futures = []
+
+    def _on_diagnostics(params):
+        with lock:
+            start = awaiting.pop(params["uri"], None)
+            if start is not None:
+                diagnostics.append(time.perf_counter() - start)
+            if not awaiting:
+                settled.set()
+
+    def _record_request(method, sent):
+        with lock:
+            requests.setdefault(method, []).append(time.perf_counter() - sent)
+
+    with session.LspSession(cwd=root, python=python) as ls_session:
+        ls_session.set_notification_callback(
+            session.PUBLISH_DIAGNOSTICS, _on_diagnostics
+        )
+        start = time.perf_counter()
+        for t, message in client_messages:
+            method, params = message["method"], message.get("params")
+            if method in SESSION_MESSAGES:
+                continue
+            if speed:
+                delay = start + t / 1000 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            sent = time.perf_counter()
+            if method == "initialize":
+                # The recorded editor process is gone; don't let the server watch for it.
+                ls_session.initialize({**params, "processId": os.getpid()})
+                _record_request(method, sent)
+                continue
+            if method in DIAGNOSTIC_TRIGGERS:
+                with lock:
+                    awaiting.setdefault(params["textDocument"]["uri"], sent)
+                    settled.clear()
+            if "id" in message:
+                future = ls_session.send_request(method, params)
+                future.add_done_callback(
+                    lambda _f, m=method, s=sent: _record_request(m, s)
+                )
+                futures.append(future)
+            else:
+                ls_session.send_notification(method, params)
+
+        with lock:
+            if not awaiting:
+                settled.set()
+        settled.wait(timeout)
+        # tach may answer diagnostic requests by publishing instead of replying.
+        _, unanswered = wait(futures, timeout=DRAIN_GRACE)
+        wall = time.perf_counter() - start
+
+    sent_count = sum(
+        1 for _, m in client_messages if m["method"] not in SESSION_MESSAGES
+    )
+    return {
+        "messages": sent_count,
+        "wallSeconds": round(wall, 3),
+        "throughput": round(sent_count / wall, 3),
+        "unansweredRequests": len(unanswered),
+        "missingDiagnostics": len(awaiting),
+        "diagnostics": summarize(diagnostics) if diagnostics else {"iterations": 0},
+        "requests": {method: summarize(s) for method, s in sorted(requests.items())},
+    }
+
+
+def compare_runs(baseline: dict, candidate: dict) -> dict:
+    """Returns the change from `baseline` to `candidate` for every shared measurement."""
+
+    def _diff(before: dict, after: dict) -> dict:
+        return {
+            key: round(after[key] - before[key], 3)
+            for key in before
+            if key.startswith("p") and key in after
+        }
+
+    shared = sorted(set(baseline["requests"]) & set(candidate["requests"]))
+    return {
+        "throughputRatio": round(candidate["throughput"] / baseline["throughput"], 3),
+        "diagnostics": _diff(baseline["diagnostics"], candidate["diagnostics"]),
+        "requests": {
+            method: _diff(baseline["requests"][method], candidate["requests"][method])
+            for method in shared
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", type=pathlib.Path)
+    parser.add_argument(
+        "--root",
+        type=pathlib.Path,
+        required=True,
+        help="Checkout of the recorded project to replay against.",
+    )
+    timing = parser.add_mutually_exclusive_group()
+    timing.add_argument("--speed", type=float, default=1.0)
+    timing.add_argument("--asap", action="store_true")
+    parser.add_argument(
+        "--python",
+        action="append",
+        default=None,
+        help="Interpreter with tach installed. Pass twice to compare two installs.",
+    )
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace)
+    speed = None if args.asap else args.speed
+    results = [
+        replay(trace, args.root.resolve(), speed, python)
+        for python in (args.python or [None])
+    ]
+    output = {"runs": results}
+    if len(results) == 2:
+        output["comparison"] = compare_runs(*results)
+    print(json.dumps(output, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
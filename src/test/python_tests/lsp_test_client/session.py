@@ -7,6 +7,7 @@ LSP session client for testing.
 from __future__ import annotations
 
 import os
+import socket
 import subprocess
 import sys
 from concurrent.futures import Future, ThreadPoolExecutor
@@ -16,47 +17,57 @@ from pyls_jsonrpc.dispatchers import MethodDispatcher
 from pyls_jsonrpc.endpoint import Endpoint
 from pyls_jsonrpc.streams import JsonRpcStreamReader, JsonRpcStreamWriter
 
-from .constants import BUNDLED_PYTHON_LIBS_DIR
+from .constants import BUNDLED_PYTHON_LIBS_DIR, PUBLISH_DIAGNOSTICS
 from .defaults import VSCODE_DEFAULT_INITIALIZE
+from .utils import server_env
 
 # Measured in seconds
 LSP_INIT_TIMEOUT = 1
 LSP_EXIT_TIMEOUT = 5
 
 
-PUBLISH_DIAGNOSTICS = "textDocument/publishDiagnostics"
 WINDOW_LOG_MESSAGE = "window/logMessage"
 WINDOW_SHOW_MESSAGE = "window/showMessage"
+WORKSPACE_DIAGNOSTIC_REFRESH = "workspace/diagnostic/refresh"
 
 
 class LspSession(MethodDispatcher):
     """Send and Receive messages over LSP as a test LS Client."""
 
-    def __init__(self, cwd=None):
+    def __init__(self, cwd=None, python=None, socket_path=None):
         self.cwd = cwd if cwd else os.getcwd()
+        # Interpreter to run `tach server` with, to compare tach installations. It
+        # imports its own tach; the bundled one is only used with the default.
+        self.python = python if python else sys.executable
+        self.bundled = None if python else BUNDLED_PYTHON_LIBS_DIR
+        # Unix socket of a running server to connect to, instead of starting one.
+        self.socket_path = socket_path
 
         self._thread_pool = ThreadPoolExecutor()
         self._sub = None
+        self._socket = None
         self._writer = None
         self._reader = None
         self._endpoint = None
         self._notification_callbacks = {}
+        # Uris of documents opened and not yet closed through this session.
+        self.open_documents = set()
 
     def __enter__(self):
         """Context manager entrypoint.
 
         shell=True needed for pytest-cov to work in subprocess.
         """
+        if self.socket_path is not None:
+            return self._connect()
 
-        env_copy = os.environ.copy()
-        env_copy["PYTHONPATH"] = str(BUNDLED_PYTHON_LIBS_DIR)
         self._sub = subprocess.Popen(
-            [sys.executable, "-m", "tach", "server"],
+            [self.python, "-m", "tach", "server"],
             stdout=subprocess.PIPE,
             stdin=subprocess.PIPE,
             bufsize=0,
             cwd=self.cwd,
-            env=env_copy,
+            env=server_env(self.bundled),
             shell="WITH_COVERAGE" in os.environ,
         )
         if self._sub.stdin is not None and self._sub.stdout is not None:
@@ -68,18 +79,32 @@ class LspSession(MethodDispatcher):
             )
         else:
             raise RuntimeError("stdin and/or stdout is None")
+        self._start_endpoint()
+        self._monitoring_future = self._thread_pool.submit(self._monitor_subprocess)
+        return self
 
+    def _connect(self):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(str(self.socket_path))
+        self._writer = JsonRpcStreamWriter(self._socket.makefile("wb"))
+        self._reader = JsonRpcStreamReader(self._socket.makefile("rb"))
+        self._start_endpoint()
+        return self
+
+    def _start_endpoint(self):
         dispatcher = {
             PUBLISH_DIAGNOSTICS: self._publish_diagnostics,
             WINDOW_SHOW_MESSAGE: self._window_show_message,
             WINDOW_LOG_MESSAGE: self._window_log_message,
+            WORKSPACE_DIAGNOSTIC_REFRESH: self._workspace_diagnostic_refresh,
         }
         self._endpoint = Endpoint(dispatcher, self._writer.write)
         self._thread_pool.submit(self._reader.listen, self._endpoint.consume)
-        self._monitoring_future = self._thread_pool.submit(self._monitor_subprocess)
-        return self
 
     def __exit__(self, typ, value, _tb):
+        if self._socket is not None:
+            self._disconnect()
+            return
         if self._sub.returncode is None:  # pyright: ignore
             self.shutdown(True)
         try:
@@ -91,6 +116,35 @@ class LspSession(MethodDispatcher):
         self._endpoint.shutdown()
         self._thread_pool.shutdown()
 
+    def _disconnect(self):
+        try:
+            self._send_request("shutdown").result(LSP_EXIT_TIMEOUT)
+            self._endpoint.notify("exit")  # pyright: ignore
+        except Exception:
+            # The server may already be gone.
+            pass
+        try:
+            # Unblocks the reader thread.
+            self._socket.shutdown(socket.SHUT_RDWR)  # pyright: ignore
+        except OSError:
+            pass
+        self._socket.close()  # pyright: ignore
+        self._socket = None
+        self._endpoint.shutdown()  # pyright: ignore
+        self._thread_pool.shutdown()
+
+    @property
+    def running(self):
+        """Whether the LSP server process is still alive."""
+        if self.socket_path is not None:
+            return self._socket is not None
+        return self._sub is not None and self._sub.poll() is None
+
+    @property
+    def pid(self):
+        """Process id of the LSP server."""
+        return self._sub.pid if self._sub else None
+
     def _monitor_subprocess(self):
         self._sub.wait()  # pyright: ignore
         if self._sub.returncode != 0:  # pyright: ignore
@@ -157,12 +211,59 @@ class LspSession(MethodDispatcher):
 
     def notify_did_open(self, did_open_params):
         """Sends did open notification to LSP Server."""
+        self.open_documents.add(did_open_params["textDocument"]["uri"])
         self._send_notification("textDocument/didOpen", params=did_open_params)
 
     def notify_did_close(self, did_close_params):
         """Sends did close notification to LSP Server."""
+        self.open_documents.discard(did_close_params["textDocument"]["uri"])
         self._send_notification("textDocument/didClose", params=did_close_params)
 
+    def notify_did_change_watched_files(self, did_change_watched_files_params):
+        """Sends did change watched files notification to LSP Server."""
+        self._send_notification(
+            "workspace/didChangeWatchedFiles", params=did_change_watched_files_params
+        )
+
+    def notify_did_change_configuration(self, did_change_configuration_params):
+        """Sends did change configuration notification to LSP Server."""
+        self._send_notification(
+            "workspace/didChangeConfiguration", params=did_change_configuration_params
+        )
+
+    def text_document_diagnostic(self, diagnostic_params):
+        """Sends text document diagnostic request to LSP server.
+
+        Returns the pending future, since the server may answer by publishing
+        diagnostics instead of replying to the request.
+        """
+        return self._send_request("textDocument/diagnostic", params=diagnostic_params)
+
+    def pull_diagnostics(self, uri, previous_result_id=None):
+        """Pulls the diagnostics of a document and returns the future of its report.
+
+        With `previous_result_id`, an unchanged report has no items.
+        """
+        params = {"textDocument": {"uri": uri}}
+        if previous_result_id is not None:
+            params["previousResultId"] = previous_result_id
+        return self.text_document_diagnostic(params)
+
+    def workspace_diagnostic(self, previous_result_ids=None):
+        """Pulls the diagnostics of the workspace and returns the future of the report.
+
+        `previous_result_ids` maps uris to the result ids of their last reports.
+        """
+        return self._send_request(
+            "workspace/diagnostic",
+            params={
+                "previousResultIds": [
+                    {"uri": uri, "value": value}
+                    for uri, value in (previous_result_ids or {}).items()
+                ]
+            },
+        )
+
     def text_document_formatting(self, formatting_params):
         """Sends text document references request to LSP server."""
         fut = self._send_request("textDocument/formatting", params=formatting_params)
@@ -180,10 +281,22 @@ class LspSession(MethodDispatcher):
         )
         return fut.result()
 
+    def send_request(self, name, params=None):
+        """Sends an arbitrary request to the LSP server and returns its future."""
+        return self._send_request(name, params=params)
+
+    def send_notification(self, name, params=None):
+        """Sends an arbitrary notification to the LSP server."""
+        self._send_notification(name, params=params)
+
     def set_notification_callback(self, notification_name, callback):
         """Set custom LS notification handler."""
         self._notification_callbacks[notification_name] = callback
 
+    def clear_notification_callbacks(self):
+        """Restores the default handler for every LS notification."""
+        self._notification_callbacks.clear()
+
     def get_notification_callback(self, notification_name):
         """Gets callback if set or default callback for a given LS
         notification."""
@@ -212,6 +325,10 @@ class LspSession(MethodDispatcher):
             WINDOW_SHOW_MESSAGE, window_show_message_params
         )
 
+    def _workspace_diagnostic_refresh(self, params):
+        """Internal handler for the server asking to pull diagnostics again."""
+        return self._handle_notification(WORKSPACE_DIAGNOSTIC_REFRESH, params)
+
     def _handle_notification(self, notification_name, params):
         """Internal handler for notifications."""
         fut = Future()
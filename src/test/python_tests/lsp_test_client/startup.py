@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Times the server-side startup phases: spawn, initialize and first diagnostics.
+
+Run from `src/test`:
+    python -m python_tests.lsp_test_client.startup --iterations 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+from . import session
+from .benchmark import DiagnosticsWaiter, summarize
+from .constants import TEST_DATA
+from .defaults import VSCODE_DEFAULT_INITIALIZE
+from .utils import as_uri
+
+DEFAULT_ITERATIONS = 10
+PHASES = ("spawn", "initialize", "firstDiagnostics", "total")
+
+
+def measure_startup(root: pathlib.Path, document: pathlib.Path) -> dict[str, float]:
+    """Starts a server and returns the duration of each phase, in seconds.
+
+    `spawn` only covers creating the process; the interpreter importing tach is
+    part of `initialize`, since the server can't answer before that.
+    """
+    start = time.perf_counter()
+    with session.LspSession(cwd=root) as ls_session:
+        spawned = time.perf_counter()
+        ls_session.initialize(VSCODE_DEFAULT_INITIALIZE)
+        initialized = time.perf_counter()
+        waiter = DiagnosticsWaiter(ls_session)
+        uri = as_uri(str(document))
+        waiter.expect(uri)
+        ls_session.notify_did_open(
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": document.read_text(),
+                }
+            }
+        )
+        waiter.wait()
+        diagnosed = time.perf_counter()
+    return {
+        "spawn": spawned - start,
+        "initialize": initialized - spawned,
+        "firstDiagnostics": diagnosed - initialized,
+        "total": diagnosed - start,
+    }
+
+
+def run_startup(
+    root: pathlib.Path = TEST_DATA,
+    document: pathlib.Path | None = None,
+    iterations: int = DEFAULT_ITERATIONS,
+) -> dict:
+    """Summarizes each startup phase over `iterations` fresh servers."""
+    if document is None:
+        document = next(
+            p for p in sorted(root.rglob("*.py")) if p.name != "__init__.py"
+        )
+    runs = [measure_startup(root, document) for _ in range(iterations)]
+    return {phase: summarize([run[phase] for run in runs]) for phase in PHASES}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", type=pathlib.Path, default=TEST_DATA)
+    parser.add_argument("--document", type=pathlib.Path, default=None)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    args = parser.parse_args(argv)
+    print(json.dumps(run_startup(args.root, args.document, args.iterations), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,9 +10,15 @@ import json
 import os
 import pathlib
 import platform
+import subprocess
+import sys
+import time
 from random import choice
 
-from .constants import PROJECT_ROOT
+from .constants import BUNDLED_DAEMON_SCRIPT, BUNDLED_PYTHON_LIBS_DIR, PROJECT_ROOT
+
+# Measured in seconds
+DAEMON_LISTEN_TIMEOUT = 10
 
 
 def normalizecase(path: str) -> str:
@@ -48,6 +54,64 @@ class PythonFile:
         os.unlink(self.fullpath)
 
 
+def get_rss_kb(pid: int) -> int | None:
+    """Returns the resident set size of a process in KiB, on Linux only."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def server_env(bundled: pathlib.Path | None) -> dict[str, str]:
+    """Environment importing tach from `bundled`, or from site-packages if None."""
+    env = os.environ.copy()
+    if bundled is None:
+        env.pop("PYTHONPATH", None)
+    else:
+        env["PYTHONPATH"] = str(bundled)
+    return env
+
+
+def start_daemon(
+    socket_path: pathlib.Path,
+    cwd: pathlib.Path,
+    idle_timeout: float,
+    python: str | None = None,
+) -> subprocess.Popen:
+    """Starts a daemon sharing `tach server` on `socket_path`, once it listens.
+
+    The server runs with `python` and its own tach if given, with the bundled tach otherwise.
+    """
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            str(BUNDLED_DAEMON_SCRIPT),
+            "--socket",
+            str(socket_path),
+            "--idle-timeout",
+            str(idle_timeout),
+            "--",
+            python or sys.executable,
+            "-m",
+            "tach",
+            "server",
+        ],
+        cwd=cwd,
+        env=server_env(None if python else BUNDLED_PYTHON_LIBS_DIR),
+    )
+    deadline = time.monotonic() + DAEMON_LISTEN_TIMEOUT
+    while not socket_path.exists():
+        if time.monotonic() > deadline:
+            daemon.kill()
+            raise TimeoutError("daemon did not listen in time")
+        time.sleep(0.05)
+    return daemon
+
+
 def get_server_info_defaults():
     """Returns server info from package.json"""
     package_json_path = PROJECT_ROOT / "package.json"
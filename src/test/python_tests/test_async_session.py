@@ -0,0 +1,55 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the asyncio LSP session client.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from hamcrest import assert_that, is_
+
+from .lsp_test_client import async_session, defaults, utils
+from .lsp_test_client.generator import generate_project, normalize
+
+SESSIONS = 4
+TIMEOUT = 10  # seconds
+
+
+async def _check_project(project):
+    async with async_session.AsyncLspSession(cwd=project.root) as ls_session:
+        await ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        futures = []
+        for path in project.files:
+            uri = utils.as_uri(str(path))
+            futures.append(ls_session.expect_diagnostics(uri))
+            await ls_session.notify_did_open(
+                {
+                    "textDocument": {
+                        "uri": uri,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": path.read_text(),
+                    }
+                }
+            )
+        return await asyncio.wait_for(asyncio.gather(*futures), TIMEOUT)
+
+
+def test_concurrent_sessions(tmp_path):
+    """Test several sessions share one event loop and all get their diagnostics."""
+    projects = [
+        generate_project(tmp_path / f"project_{i}", modules=5, seed=i)
+        for i in range(SESSIONS)
+    ]
+
+    async def _run():
+        return await asyncio.gather(*(_check_project(p) for p in projects))
+
+    results = asyncio.run(_run())
+
+    for project, published in zip(projects, results):
+        actual = {params["uri"]: normalize(params) for params in published}
+        expected = {uri: normalize(e) for uri, e in project.expected.items()}
+        assert_that(actual, is_(expected))
@@ -0,0 +1,46 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for the diagnostic latency benchmarks.
+"""
+
+from __future__ import annotations
+
+from hamcrest import assert_that, contains_exactly, has_entries, is_
+
+from .lsp_test_client import benchmark
+
+
+def test_percentile():
+    """Test nearest-rank percentiles."""
+    samples = [float(i) for i in range(1, 101)]
+    assert_that(benchmark.percentile(samples, 50), is_(50.0))
+    assert_that(benchmark.percentile(samples, 95), is_(95.0))
+    assert_that(benchmark.percentile(samples, 99), is_(99.0))
+    assert_that(benchmark.percentile([3.0], 99), is_(3.0))
+
+
+def test_compare_flags_regressions_past_threshold():
+    """Test only percentiles slower than the threshold are reported."""
+    baseline = {"didOpen": {"p50": 10.0, "p95": 20.0, "iterations": 5}}
+    results = {"didOpen": {"p50": 11.0, "p95": 30.0, "iterations": 50}}
+    assert_that(
+        benchmark.compare(results, baseline, threshold=0.2),
+        contains_exactly("didOpen p95: 30.0ms vs baseline 20.0ms"),
+    )
+
+
+def test_run_benchmarks():
+    """Test every benchmark produces a summary."""
+    results = benchmark.run_benchmarks(iterations=2)
+    for name in ("initialize", "didOpen", "didChange"):
+        assert_that(results[name], has_entries(iterations=2))
+
+
+def test_missing_baseline_fails(tmp_path):
+    """Test a run against a missing baseline fails instead of recording one."""
+    baseline = tmp_path / "baseline.json"
+    assert_that(
+        benchmark.main(["--iterations", "1", "--baseline", str(baseline)]), is_(1)
+    )
+    assert_that(baseline.exists(), is_(False))
@@ -0,0 +1,43 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the server cold-start benchmark.
+"""
+
+from __future__ import annotations
+
+import sys
+
+from hamcrest import assert_that, greater_than, has_item, is_
+
+from .lsp_test_client import coldstart, constants
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |       2000 | tach
+import time:       300 |        300 |     tach.extension
+Content-Length: 12
+"""
+
+
+def test_parse_importtime():
+    """Test importtime lines are parsed and other output is ignored."""
+    imports = coldstart.parse_importtime(IMPORTTIME)
+    assert_that(imports, is_({"_io": 120, "tach": 1500, "tach.extension": 300}))
+    assert_that(coldstart.top_level_modules(imports), is_({"_io", "tach"}))
+
+
+def test_cold_start():
+    """Test a cold start is timed and reports the modules imported up to diagnostics."""
+    document = constants.TEST_DATA / "sample1" / "sample.py"
+    bundled = constants.BUNDLED_PYTHON_LIBS_DIR
+    result = coldstart.cold_start(
+        sys.executable,
+        constants.TEST_DATA,
+        bundled if bundled.is_dir() else None,
+        document=document,
+    )
+    assert_that(result["initialize"], is_(greater_than(0)))
+    assert_that(result["imports"], is_(greater_than(0)))
+    assert_that(result["modules"], has_item("tach"))
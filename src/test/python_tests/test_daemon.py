@@ -0,0 +1,167 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for sharing one server between clients through the daemon.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from threading import Event
+
+import pytest
+from hamcrest import assert_that, greater_than, has_length, is_
+
+from .lsp_test_client import constants, defaults, session, utils
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="the daemon listens on a Unix socket"
+)
+
+TEST_FILE = constants.TEST_DATA / "sample1" / "sample.py"
+TEST_FILE_URI = utils.as_uri(str(TEST_FILE))
+
+# Measured in seconds
+IDLE_TIMEOUT = 1
+TIMEOUT = 10
+
+
+def _open(ls_session, text):
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": TEST_FILE_URI,
+                "languageId": "python",
+                "version": 1,
+                "text": text,
+            }
+        }
+    )
+
+
+def _expect_diagnostics(ls_session):
+    received = Event()
+    published = {}
+
+    def _handler(params):
+        if params["uri"] == TEST_FILE_URI:
+            published.update(params)
+            received.set()
+
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+    return received, published
+
+
+def test_daemon_shares_server(tmp_path):
+    """Test two clients share one server, each seeing the diagnostics of its documents."""
+    socket_path = tmp_path / "tach.sock"
+    daemon = utils.start_daemon(socket_path, constants.TEST_DATA, IDLE_TIMEOUT)
+    text = TEST_FILE.read_text()
+    try:
+        with session.LspSession(socket_path=socket_path) as first:
+            first.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+            received, published = _expect_diagnostics(first)
+            _open(first, text)
+            assert_that(received.wait(TIMEOUT), is_(True))
+            assert_that(published["diagnostics"], has_length(greater_than(0)))
+
+            with session.LspSession(socket_path=socket_path) as second:
+                capabilities = {}
+                second.initialize(
+                    defaults.VSCODE_DEFAULT_INITIALIZE,
+                    process_server_capabilities=capabilities.update,
+                )
+                assert_that("diagnosticProvider" in capabilities["capabilities"])
+
+                # Already open in the first client: replayed without asking the server.
+                received, replayed = _expect_diagnostics(second)
+                _open(second, text)
+                assert_that(received.wait(TIMEOUT), is_(True))
+                assert_that(replayed, is_(published))
+
+                # Still open in the first client: only cleared for the second.
+                received, cleared = _expect_diagnostics(second)
+                second.notify_did_close({"textDocument": {"uri": TEST_FILE_URI}})
+                assert_that(received.wait(TIMEOUT), is_(True))
+                assert_that(cleared["diagnostics"], is_([]))
+
+        # With no client left, the daemon stops the server and exits.
+        assert_that(daemon.wait(IDLE_TIMEOUT + TIMEOUT), is_(0))
+        assert_that(socket_path.exists(), is_(False))
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+
+
+def test_daemon_pull_diagnostics(tmp_path):
+    """Test pulled diagnostics are reported unchanged until they change, and not pushed."""
+    socket_path = tmp_path / "tach.sock"
+    daemon = utils.start_daemon(socket_path, constants.TEST_DATA, IDLE_TIMEOUT)
+    pushed = []
+    try:
+        with session.LspSession(socket_path=socket_path) as ls_session:
+            capabilities = {}
+            ls_session.initialize(
+                defaults.VSCODE_PULL_INITIALIZE,
+                process_server_capabilities=capabilities.update,
+            )
+            provider = capabilities["capabilities"]["diagnosticProvider"]
+            assert_that(provider["workspaceDiagnostics"], is_(True))
+
+            received, published = _expect_diagnostics(ls_session)
+            _open(ls_session, TEST_FILE.read_text())
+            assert_that(received.wait(TIMEOUT), is_(True))
+            pushed.append(published)
+            ls_session.set_notification_callback(
+                session.PUBLISH_DIAGNOSTICS, pushed.append
+            )
+            full = ls_session.pull_diagnostics(TEST_FILE_URI).result(TIMEOUT)
+            assert_that(full["kind"], is_("full"))
+            assert_that(full["items"], has_length(greater_than(0)))
+
+            # A recheck that finds the same diagnostics is reported unchanged.
+            ls_session.notify_did_save({"textDocument": {"uri": TEST_FILE_URI}})
+            unchanged = ls_session.pull_diagnostics(
+                TEST_FILE_URI, full["resultId"]
+            ).result(TIMEOUT)
+            assert_that(
+                unchanged, is_({"kind": "unchanged", "resultId": full["resultId"]})
+            )
+
+            workspace = ls_session.workspace_diagnostic().result(TIMEOUT)
+            (item,) = [i for i in workspace["items"] if i["uri"] == TEST_FILE_URI]
+            assert_that(item["resultId"], is_(full["resultId"]))
+            assert_that(item["items"], is_(full["items"]))
+
+        # Only the diagnostics published before the document was first pulled.
+        assert_that(pushed, has_length(1))
+        assert_that(daemon.wait(IDLE_TIMEOUT + TIMEOUT), is_(0))
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+
+
+def test_daemon_refuses_shared_directory(tmp_path):
+    """Test the daemon won't listen where other users could replace its socket."""
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    result = subprocess.run(
+        [
+            sys.executable,
+            str(constants.BUNDLED_DAEMON_SCRIPT),
+            "--socket",
+            str(shared / "tach.sock"),
+            "--",
+            sys.executable,
+            "-m",
+            "tach",
+            "server",
+        ],
+        capture_output=True,
+        timeout=TIMEOUT,
+        check=False,
+    )
+    assert_that(result.returncode, is_(2))
+    assert_that((shared / "tach.sock").exists(), is_(False))
@@ -0,0 +1,43 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for the synthetic project generator.
+"""
+
+from __future__ import annotations
+
+from hamcrest import assert_that, greater_than, is_
+
+from .lsp_test_client import defaults, generator, session
+from .lsp_test_client.benchmark import DiagnosticsWaiter
+from .lsp_test_client.utils import as_uri
+
+
+def test_generated_project_diagnostics(tmp_path):
+    """Test the server reports exactly the planted violations."""
+    project = generator.generate_project(
+        tmp_path, modules=8, files_per_module=3, violation_rate=0.3, seed=1
+    )
+    assert_that(project.violation_count, greater_than(0))
+
+    with session.LspSession(cwd=project.root) as ls_session:
+        ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        waiter = DiagnosticsWaiter(ls_session)
+        for path in project.files:
+            uri = as_uri(str(path))
+            waiter.expect(uri)
+            ls_session.notify_did_open(
+                {
+                    "textDocument": {
+                        "uri": uri,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": path.read_text(),
+                    }
+                }
+            )
+            actual = waiter.wait()
+            assert_that(
+                generator.normalize(actual),
+                is_(generator.normalize(project.expected[uri])),
+            )
@@ -0,0 +1,42 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the multi-client load test.
+"""
+
+from __future__ import annotations
+
+import sys
+
+import pytest
+from hamcrest import assert_that, greater_than, is_
+
+from .lsp_test_client import loadtest
+
+# High enough that every kind of event happens in a short run.
+RATES = {"change": 10.0, "save": 5.0, "close": 2.0, "exit": 0.5}
+
+
+@pytest.mark.parametrize("shared", [False, True], ids=["per-client", "shared"])
+def test_load_test(shared):
+    """Test a short run with every kind of event keeps every client's diagnostics current.
+
+    Either with a server per client, or with every client sharing one through the daemon.
+    """
+    if shared and sys.platform == "win32":
+        pytest.skip("the daemon listens on a Unix socket")
+    report = loadtest.run_load_test(
+        clients=2, duration=3, rates=RATES, modules=3, files_per_module=3, shared=shared
+    )
+    assert_that(report["servers"], is_(1 if shared else 2))
+    assert_that(report["documents"], is_(18))
+    for name in ("open", "save", "close", "exit"):
+        assert_that(report["events"][name], greater_than(0))
+    assert_that(report["diagnosticsPerSecond"], greater_than(0))
+    assert_that(report["dropped"], is_(0))
+    assert_that(report["stale"], is_(0))
+    assert_that(report["staleAtEnd"], is_(0))
+    assert_that(report["orphanedServers"], is_(0))
+    assert_that(len(report["rss"]), greater_than(0))
+    assert_that(loadtest.within_slo(report, slo_ms=report["latency"]["p95"]), is_(True))
+    assert_that(loadtest.within_slo({**report, "dropped": 1}, slo_ms=1e9), is_(False))
@@ -0,0 +1,69 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests that the server's memory stays bounded over a long editing session.
+"""
+
+from __future__ import annotations
+
+import pytest
+from hamcrest import assert_that, is_, less_than
+
+from .lsp_test_client import constants, defaults, session, utils
+from .lsp_test_client.benchmark import DiagnosticsWaiter
+
+TEST_FILE = constants.TEST_DATA / "sample1" / "sample.py"
+TEST_FILE_URI = utils.as_uri(str(TEST_FILE))
+
+WARMUP_CYCLES = 20
+CYCLES = 200
+
+# Growth allowed between the end of the warmup and the end of the run.
+MAX_GROWTH_KB = 8 * 1024
+
+
+def _cycle(ls_session: session.LspSession, waiter: DiagnosticsWaiter, text: str):
+    """Opens, edits, saves and closes the test file, waiting for each lint."""
+    waiter.expect(TEST_FILE_URI)
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": TEST_FILE_URI,
+                "languageId": "python",
+                "version": 1,
+                "text": text,
+            }
+        }
+    )
+    waiter.wait()
+    waiter.expect(TEST_FILE_URI)
+    ls_session.notify_did_change(
+        {
+            "textDocument": {"uri": TEST_FILE_URI, "version": 2},
+            "contentChanges": [{"text": text + "\nimport os\n"}],
+        }
+    )
+    ls_session.notify_did_save({"textDocument": {"uri": TEST_FILE_URI}})
+    waiter.wait()
+    waiter.expect(TEST_FILE_URI)
+    ls_session.notify_did_close({"textDocument": {"uri": TEST_FILE_URI}})
+    waiter.wait()
+
+
+def test_memory_bounded_over_edit_cycles():
+    """Test repeated open/change/close cycles don't keep growing the server."""
+    text = TEST_FILE.read_text()
+    with session.LspSession(cwd=constants.TEST_DATA) as ls_session:
+        ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+        if utils.get_rss_kb(ls_session.pid) is None:
+            pytest.skip("process memory is only available on Linux")
+        waiter = DiagnosticsWaiter(ls_session)
+
+        for _ in range(WARMUP_CYCLES):
+            _cycle(ls_session, waiter, text)
+        baseline = utils.get_rss_kb(ls_session.pid)
+        for _ in range(CYCLES):
+            _cycle(ls_session, waiter, text)
+        growth = utils.get_rss_kb(ls_session.pid) - baseline  # type: ignore
+
+    assert_that(growth, is_(less_than(MAX_GROWTH_KB)))
@@ -0,0 +1,103 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for replaying recorded LSP traces.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import shutil
+
+import pytest
+from hamcrest import assert_that, is_
+
+from .lsp_test_client import constants, defaults, replay, utils
+
+RECORDED_ROOT = "file:///home/user/project"
+
+
+def _write_trace(path, messages):
+    header = {"format": replay.TRACE_FORMAT, "root": RECORDED_ROOT, "command": []}
+    with gzip.open(path, "wt", encoding="utf-8") as trace:
+        for line in [header, *messages]:
+            trace.write(json.dumps(line) + "\n")
+
+
+def test_rewrite_paths(tmp_path):
+    """Test recorded uris and paths are mapped onto the replay root."""
+    message = {
+        "rootUri": RECORDED_ROOT,
+        "rootPath": "/home/user/project",
+        "uri": f"{RECORDED_ROOT}/sample1/sample.py",
+    }
+    assert_that(
+        replay.rewrite_paths(message, RECORDED_ROOT, tmp_path),
+        is_(
+            {
+                "rootUri": utils.as_uri(str(tmp_path)),
+                "rootPath": str(tmp_path),
+                "uri": utils.as_uri(str(tmp_path / "sample1" / "sample.py")),
+            }
+        ),
+    )
+
+
+def test_load_trace_rejects_unknown_format(tmp_path):
+    """Test traces of another format are not replayed."""
+    path = tmp_path / "trace.jsonl"
+    path.write_text(json.dumps({"format": 0}) + "\n")
+    with pytest.raises(ValueError):
+        replay.load_trace(path)
+
+
+def test_replay(tmp_path):
+    """Test a trace replays against a copy of the project and reports latency."""
+    root = tmp_path / "project"
+    shutil.copytree(constants.TEST_DATA, root)
+    text = (root / "sample1" / "sample.py").read_text()
+    uri = f"{RECORDED_ROOT}/sample1/sample.py"
+    document = {"uri": uri, "languageId": "python", "version": 1, "text": text}
+    path = tmp_path / "trace.jsonl.gz"
+    _write_trace(
+        path,
+        [
+            {
+                "t": 0.0,
+                "d": "c",
+                "m": {
+                    "jsonrpc": "2.0",
+                    "id": 0,
+                    "method": "initialize",
+                    "params": defaults.VSCODE_DEFAULT_INITIALIZE,
+                },
+            },
+            {"t": 5.0, "d": "c", "m": {"jsonrpc": "2.0", "method": "initialized"}},
+            {
+                "t": 10.0,
+                "d": "c",
+                "m": {
+                    "jsonrpc": "2.0",
+                    "method": "textDocument/didOpen",
+                    "params": {"textDocument": document},
+                },
+            },
+            {
+                "t": 12.0,
+                "d": "s",
+                "m": {"jsonrpc": "2.0", "method": "window/logMessage"},
+            },
+        ],
+    )
+
+    results = replay.replay(replay.load_trace(path), root, speed=None)
+
+    assert_that(results["messages"], is_(2))
+    assert_that(results["missingDiagnostics"], is_(0))
+    assert_that(results["diagnostics"]["iterations"], is_(1))
+    assert_that(results["requests"]["initialize"]["iterations"], is_(1))
+
+    comparison = replay.compare_runs(results, results)
+    assert_that(comparison["throughputRatio"], is_(1.0))
+    assert_that(comparison["diagnostics"]["p50"], is_(0.0))
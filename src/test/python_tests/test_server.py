@@ -6,6 +6,9 @@ Test for linting over LSP.
 
 from __future__ import annotations
 
+import shutil
+import sys
+import time
 from threading import Event
 
 import pytest
@@ -15,6 +18,8 @@ from .lsp_test_client import constants, defaults, session, utils
 
 SERVER_INFO = utils.get_server_info_defaults()
 TIMEOUT = 2  # 2 seconds
+# Starting and initializing a new server behind the daemon
+RELOAD_TIMEOUT = 10
 
 
 @pytest.mark.parametrize(
@@ -58,12 +63,139 @@ TIMEOUT = 2  # 2 seconds
         ),
     ],
 )
-def test_import_example(test_file_path, expected):
+def test_import_example(ls_session, test_file_path, expected):
     """Test to linting on file open."""
     test_file_uri = utils.as_uri(str(test_file_path))
 
     contents = test_file_path.read_text()
 
+    actual = []
+    done = Event()
+
+    def _handler(params):
+        nonlocal actual
+        actual = params
+        done.set()
+
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": test_file_uri,
+                "languageId": "python",
+                "version": 1,
+                "text": contents,
+            }
+        }
+    )
+    # wait for some time to receive all notifications
+    done.wait(TIMEOUT)
+
+    assert_that(actual, is_(expected))
+
+
+def _open_and_wait(ls_session, test_file_path):
+    """Opens a file and returns the first diagnostics published for it."""
+    actual = []
+    done = Event()
+
+    def _handler(params):
+        nonlocal actual
+        actual = params
+        done.set()
+
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": utils.as_uri(str(test_file_path)),
+                "languageId": "python",
+                "version": 1,
+                "text": test_file_path.read_text(),
+            }
+        }
+    )
+    done.wait(TIMEOUT)
+    return actual
+
+
+@pytest.mark.parametrize("shared", [False, True], ids=["server", "daemon"])
+def test_config_change_fresh_diagnostics(tmp_path, record_property, shared):
+    """Test diagnostics are refreshed after tach.toml changes.
+
+    Mirrors the extension: reload in place when the server advertises
+    `experimental.configReload`, as the daemon does, otherwise restart the
+    server. Reports the time from the change to fresh diagnostics as
+    `fresh_diagnostics_ms`.
+    """
+    if shared and sys.platform == "win32":
+        pytest.skip("the daemon listens on a Unix socket")
+    root = tmp_path / "project"
+    shutil.copytree(constants.TEST_DATA, root)
+    test_file_path = root / "sample1" / "sample.py"
+    test_file_uri = utils.as_uri(str(test_file_path))
+    config_path = root / "tach.toml"
+    socket_path = tmp_path / "tach.sock" if shared else None
+    daemon = utils.start_daemon(socket_path, root, TIMEOUT) if shared else None
+
+    capabilities = {}
+    with session.LspSession(cwd=root, socket_path=socket_path) as ls_session:
+        ls_session.initialize(
+            defaults.VSCODE_DEFAULT_INITIALIZE,
+            process_server_capabilities=capabilities.update,
+        )
+        actual = _open_and_wait(ls_session, test_file_path)
+        assert_that(len(actual["diagnostics"]), is_(1))
+
+        config_path.write_text(
+            config_path.read_text().replace(
+                'path = "sample1"\ndepends_on = []',
+                'path = "sample1"\ndepends_on = [{ path = "sample2" }]',
+            )
+        )
+        start = time.perf_counter()
+        experimental = capabilities["capabilities"].get("experimental") or {}
+        if experimental.get("configReload"):
+            done = Event()
+
+            def _handler(params):
+                nonlocal actual
+                actual = params
+                done.set()
+
+            ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+            ls_session.notify_did_change_watched_files(
+                {"changes": [{"uri": utils.as_uri(str(config_path)), "type": 2}]}
+            )
+            ls_session.notify_did_change_configuration({"settings": {}})
+            ls_session.text_document_diagnostic(
+                {"textDocument": {"uri": test_file_uri}}
+            )
+            done.wait(RELOAD_TIMEOUT)
+
+    if not experimental.get("configReload"):
+        with session.LspSession(cwd=root) as ls_session:
+            ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
+            actual = _open_and_wait(ls_session, test_file_path)
+    elapsed = time.perf_counter() - start
+    if daemon is not None:
+        daemon.wait(RELOAD_TIMEOUT)
+
+    assert_that(actual, is_({"uri": test_file_uri, "diagnostics": []}))
+    assert_that(experimental.get("configReload", False), is_(shared))
+    record_property("fresh_diagnostics_ms", round(elapsed * 1000, 1))
+
+
+def test_diagnostic_request_unopened_file():
+    """Test diagnostics can be requested for a file that was never opened.
+
+    The extension's workspace check relies on this to report violations in
+    files outside the editor.
+    """
+    test_file_path = constants.TEST_DATA / "sample1" / "sample.py"
+    test_file_uri = utils.as_uri(str(test_file_path))
+
     actual = []
     with session.LspSession(cwd=constants.TEST_DATA) as ls_session:
         ls_session.initialize(defaults.VSCODE_DEFAULT_INITIALIZE)
@@ -72,22 +204,26 @@ def test_import_example(test_file_path, expected):
 
         def _handler(params):
             nonlocal actual
-            actual = params
-            done.set()
+            if params["uri"] == test_file_uri:
+                actual = params
+                done.set()
 
         ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
-
-        ls_session.notify_did_open(
-            {
-                "textDocument": {
-                    "uri": test_file_uri,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": contents,
-                }
-            }
+        future = ls_session.text_document_diagnostic(
+            {"textDocument": {"uri": test_file_uri}}
+        )
+        # The server may reply with a full report instead of publishing.
+        future.add_done_callback(
+            lambda f: f.cancelled()
+            or f.exception()
+            or _handler({"uri": test_file_uri, "diagnostics": f.result()["items"]})
         )
-        # wait for some time to receive all notifications
         done.wait(TIMEOUT)
 
-    assert_that(actual, is_(expected))
+    assert_that(len(actual["diagnostics"]), is_(1))
+    assert_that(
+        actual["diagnostics"][0]["message"],
+        is_(
+            "Cannot use 'sample2.sample2.SAMPLE2'. Module 'sample1' cannot depend on 'sample2'."
+        ),
+    )
@@ -0,0 +1,56 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the pool of reusable LSP sessions.
+"""
+
+from __future__ import annotations
+
+import shutil
+
+from hamcrest import assert_that, is_
+
+from .lsp_test_client import constants, utils
+from .lsp_test_client.pool import SessionPool
+
+
+def test_pool_reuses_and_recycles(tmp_path):
+    """Test sessions are reused, and replaced after a crash or config change."""
+    root = tmp_path / "project"
+    shutil.copytree(constants.TEST_DATA, root)
+    pool = SessionPool()
+    try:
+        first = pool.acquire(root)
+        pid = first.pid
+        first.notify_did_open(
+            {
+                "textDocument": {
+                    "uri": utils.as_uri(str(root / "sample1" / "sample.py")),
+                    "languageId": "python",
+                    "version": 1,
+                    "text": (root / "sample1" / "sample.py").read_text(),
+                }
+            }
+        )
+        pool.release(first)
+        assert_that(first.open_documents, is_(set()))
+
+        reused = pool.acquire(root)
+        assert_that(reused.pid, is_(pid))
+        assert_that(pool.started, is_(1))
+
+        reused._sub.kill()
+        reused._sub.wait()
+        pool.release(reused)
+        restarted = pool.acquire(root)
+        assert_that(pool.started, is_(2))
+
+        (root / "tach.toml").write_text(
+            (root / "tach.toml").read_text() + "\n# changed\n"
+        )
+        pool.release(restarted)
+        # tach can't reload its config in place, so the session is replaced.
+        pool.release(pool.acquire(root))
+        assert_that(pool.started, is_(3))
+    finally:
+        pool.close()
@@ -0,0 +1,23 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Tests for the startup phase harness.
+"""
+
+from __future__ import annotations
+
+from hamcrest import assert_that, greater_than, is_
+
+from .lsp_test_client import startup
+
+
+def test_run_startup():
+    """Test every phase is measured and the phases add up to the total."""
+    results = startup.run_startup(iterations=1)
+
+    assert_that(set(results), is_(set(startup.PHASES)))
+    parts = sum(
+        results[phase]["p50"] for phase in ("spawn", "initialize", "firstDiagnostics")
+    )
+    assert_that(results["total"]["p50"], greater_than(0))
+    assert abs(parts - results["total"]["p50"]) < 1